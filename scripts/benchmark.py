@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+Script to benchmark the Chirp data model against a Redis server
+Each benchmark runs on its own database, which is flushed before and after
+"""
+
+import os
+import io
+import sys
+import bz2
+import json
+import time
+import random
+import itertools
+import tempfile
+import contextlib
+from pathlib import Path
+import asyncio
+import argparse
+import threading
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ingest.decoders import TweetDecoder, available_backends, project_tweet
+from src.ingest.tweet_files import ChunkedJsonlWriter, iter_directory_records, read_tweets
+from src.models.async_redis_model import AsyncChirpRedisModel
+from src.models.codecs import CODECS
+from src.models.redis_model import ChirpRedisModel
+
+def count_round_trips(model, action):
+    """Run an action and return the number of round trips it needed"""
+    pool = model.redis.connection_pool
+    original = pool.get_connection
+    calls = []
+
+    def counting_get_connection(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    pool.get_connection = counting_get_connection
+    try:
+        action()
+    finally:
+        pool.get_connection = original
+    return len(calls)
+
+def run_concurrently(action, clients, operations):
+    """
+    Run an action from several threads
+
+    Returns:
+        tuple: (total operations, elapsed seconds)
+    """
+    per_client = operations // clients
+
+    def worker():
+        for _ in range(per_client):
+            action()
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return per_client * clients, time.perf_counter() - start
+
+def legacy_like(model, chirp_id):
+    """Like a chirp the way the model did before the Lua write paths"""
+    if not model.redis.exists(f"chirp:{chirp_id}"):
+        raise ValueError(f"Chirp {chirp_id} doesn't exist")
+    new_count = model.redis.hincrby(f"chirp:{chirp_id}", "favorite_count", 1)
+    model.redis.zadd("chirps:top_liked", {chirp_id: new_count})
+    return new_count
+
+def benchmark_writes(model, args):
+    """Compare the scripted like path with the check-then-increment path"""
+    clients, operations = args.clients, args.operations
+    user_id = model.add_user("bench", "Benchmark User")
+    chirp_id = model.post_chirp(user_id, "Benchmark chirp")
+    model.like_chirp(chirp_id)  # Load the script in the server cache
+
+    paths = {
+        "legacy (EXISTS + HINCRBY + ZADD)": lambda: legacy_like(model, chirp_id),
+        "lua script (EVALSHA)": lambda: model.like_chirp(chirp_id),
+    }
+
+    print(f"\n⏱️ like_chirp with {clients} concurrent clients, {operations} operations")
+    print(f"{'path':<36}{'RTT/op':>8}{'ops/s':>12}{'µs/op':>10}")
+    for name, action in paths.items():
+        round_trips = count_round_trips(model, action)
+        done, elapsed = run_concurrently(action, clients, operations)
+        print(f"{name:<36}{round_trips:>8}{done / elapsed:>12.0f}{elapsed / done * 1e6 * clients:>10.1f}")
+
+    expected = 3 + 2 * (operations // clients) * clients
+    actual = int(model.redis.hget(f"chirp:{chirp_id}", "favorite_count"))
+    print(f"\n✅ Final like count: {actual} (expected {expected})")
+
+def benchmark_ids(model, args):
+    """Measure the ID generator throughput and its Redis round trips"""
+    model.next_id()  # Lease the worker ID
+
+    round_trips = count_round_trips(model, lambda: [model.next_id() for _ in range(1000)])
+    print(f"\n🔢 Round trips for 1000 IDs: {round_trips}")
+
+    for threads in sorted({1, args.clients}):
+        done, elapsed = run_concurrently(model.next_id, threads, args.operations)
+        print(f"⏱️ {threads} thread(s): {done / elapsed:,.0f} IDs/s")
+
+def load_tweets(file_path):
+    """Load the English tweets of a line-by-line JSON(.bz2) file"""
+    opener = bz2.open if file_path.endswith('.bz2') else open
+    tweets = []
+    with opener(file_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                tweet = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if tweet.get('lang') == 'en':
+                tweets.append(tweet)
+    return tweets
+
+def benchmark_import(model, args):
+    """Compare per-tweet imports with the pipelined batch import"""
+    tweets = load_tweets(args.file)
+    print(f"\n📥 {len(tweets)} English tweets from {args.file}")
+
+    def per_tweet():
+        for tweet in tweets:
+            try:
+                model.import_chirp(tweet)
+            except KeyError:
+                continue
+
+    paths = {
+        "import_chirp (one tweet at a time)": per_tweet,
+        f"import_chirps (chunks of {args.batch_size})": lambda: model.import_chirps(tweets, args.batch_size),
+    }
+
+    print(f"{'path':<40}{'RTT':>8}{'tweets/s':>12}")
+    for name, action in paths.items():
+        model.redis.flushdb()
+        start = time.perf_counter()
+        round_trips = count_round_trips(model, action)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<40}{round_trips:>8}{len(tweets) / elapsed:>12.0f}")
+
+def synthetic_tweets(count, users=100):
+    """Build English tweets from a number of users, without reading any file"""
+    return [
+        {
+            "id": 1000000 + i,
+            "text": f"Benchmark chirp {i}",
+            "user": {
+                "id": i % users, "name": f"User {i % users}", "screen_name": f"user{i % users}",
+                "followers_count": i, "friends_count": 0, "statuses_count": i,
+                "created_at": "Mon Apr 01 12:00:00 +0000 2025",
+            },
+            "created_at": "Mon Apr 01 12:00:00 +0000 2025",
+            "timestamp_ms": str(1712000000000 + i),
+            "lang": "en",
+        }
+        for i in range(count)
+    ]
+
+async def run_tasks(action, clients, operations):
+    """
+    Run a coroutine function from several concurrent tasks
+
+    Returns:
+        tuple: (total operations, elapsed seconds)
+    """
+    per_client = operations // clients
+
+    async def worker():
+        for _ in range(per_client):
+            await action()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return per_client * clients, time.perf_counter() - start
+
+# Concurrent clients compared by the async benchmark
+CONCURRENCY_LEVELS = (1, 10, 100)
+
+def benchmark_async(model, args):
+    """Compare the sync model on threads with the async model on tasks"""
+    model.import_chirps(synthetic_tweets(1000))
+    read = lambda m: m.get_latest_chirps(20)
+
+    async def async_run(clients):
+        async with AsyncChirpRedisModel(host=args.host, port=args.port, db=args.db) as async_model:
+            await read(async_model)  # Open a first connection
+            return await run_tasks(lambda: read(async_model), clients, args.operations)
+
+    print(f"\n⚡ get_latest_chirps(20), {args.operations} operations")
+    print(f"{'clients':>8}{'sync ops/s':>14}{'async ops/s':>14}")
+    for clients in CONCURRENCY_LEVELS:
+        done, elapsed = run_concurrently(lambda: read(model), clients, args.operations)
+        async_done, async_elapsed = asyncio.run(async_run(clients))
+        print(f"{clients:>8}{done / elapsed:>14.0f}{async_done / async_elapsed:>14.0f}")
+
+def import_concurrently(model, tweets, clients, batch_size):
+    """
+    Import tweets in chunks from several threads
+
+    Returns:
+        float: Imported tweets per second
+    """
+    chunks = [tweets[i:i + batch_size] for i in range(0, len(tweets), batch_size)]
+    calls = -(-len(chunks) // clients) * clients
+    chunks = iter(chunks)
+    imported = []
+    lock = threading.Lock()
+
+    def action():
+        with lock:
+            chunk = next(chunks, [])
+        imported.append(len(model.import_chirps(chunk, batch_size)))
+
+    _, elapsed = run_concurrently(action, clients, calls)
+    return sum(imported) / elapsed
+
+def benchmark_cluster(model, args):
+    """Compare the throughput of a single node with a local Redis Cluster"""
+    cluster = ChirpRedisModel(host=args.host, port=args.cluster_port, cluster=True,
+                              partitions=args.partitions)
+    cluster.reset_db()
+    tweets = synthetic_tweets(args.operations)
+    nodes = len(cluster.redis.get_primaries())
+
+    print(f"\n🧩 Single node vs a cluster of {nodes} primaries ({args.partitions} partitions), "
+          f"{args.clients} concurrent clients")
+    print(f"{'workload':<32}{'single ops/s':>14}{'cluster ops/s':>15}")
+    try:
+        for name in ("import_chirps", "like_chirp", "get_top_liked_chirps(10)"):
+            rates = []
+            for target in (model, cluster):
+                if name == "import_chirps":
+                    rates.append(import_concurrently(target, tweets, args.clients, args.batch_size))
+                    continue
+
+                chirp_ids = [chirp["chirp_id"] for chirp in target.get_latest_chirps(100)]
+                if name == "like_chirp":
+                    ids = iter(chirp_ids * (args.operations // len(chirp_ids) + 1))
+                    action = lambda target=target, ids=ids: target.like_chirp(next(ids))
+                else:
+                    action = lambda target=target: target.get_top_liked_chirps(10)
+                done, elapsed = run_concurrently(action, args.clients, args.operations)
+                rates.append(done / elapsed)
+            print(f"{name:<32}{rates[0]:>14.0f}{rates[1]:>15.0f}")
+    finally:
+        cluster.reset_db()
+
+def benchmark_shards(model, args):
+    """Measure how write throughput scales with the number of shards"""
+    if not args.shards:
+        raise SystemExit("❌ Error: The shards benchmark needs --shard HOST:PORT (repeatable)")
+    tweets = synthetic_tweets(args.operations)
+
+    print(f"\n🔀 Writes over 1 to {len(args.shards)} shard(s), {args.clients} concurrent clients")
+    print(f"{'shards':>7}{'import tweets/s':>17}{'post_chirp ops/s':>18}{'speedup':>9}")
+    baseline = None
+    for count in range(1, len(args.shards) + 1):
+        sharded = ChirpRedisModel(shards=args.shards[:count], db=args.db)
+        with contextlib.redirect_stdout(io.StringIO()):
+            sharded.reset_db()
+        try:
+            import_rate = import_concurrently(sharded, tweets, args.clients, args.batch_size)
+            user_ids = [sharded.get_user_id(username) for username in sharded.get_usernames()]
+            posters = iter(user_ids * (args.operations // len(user_ids) + 1))
+            done, elapsed = run_concurrently(
+                lambda: sharded.post_chirp(next(posters), "Benchmark chirp"), args.clients, args.operations
+            )
+            post_rate = done / elapsed
+        finally:
+            with contextlib.redirect_stdout(io.StringIO()):
+                sharded.reset_db()
+
+        baseline = baseline or import_rate
+        print(f"{count:>7}{import_rate:>17.0f}{post_rate:>18.0f}{import_rate / baseline:>8.2f}x")
+
+def latency_percentiles(action, operations):
+    """
+    Run an action repeatedly and measure its latency
+
+    Returns:
+        tuple: (p50, p99) in milliseconds
+    """
+    latencies = []
+    for _ in range(operations):
+        start = time.perf_counter()
+        action()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+def benchmark_snapshots(model, args):
+    """Compare the live rankings with the reads served from snapshots"""
+    model.import_chirps(synthetic_tweets(10000))
+    snapshot = ChirpRedisModel(host=args.host, port=args.port, db=args.db, snapshots=True)
+    snapshot.refresh_snapshots()
+    operations = min(args.operations, 5000)
+    reads = {
+        "get_latest_chirps(20)": lambda m: m.get_latest_chirps(20),
+        "get_top_liked_chirps(10)": lambda m: m.get_top_liked_chirps(10),
+        "get_top_users_by_followers(5)": lambda m: m.get_top_users_by_followers(5),
+        "get_timeline_page(limit=20)": lambda m: m.get_timeline_page(limit=20),
+    }
+
+    print(f"\n📸 Live reads vs snapshots, {operations} operations, latency in ms")
+    print(f"{'read':<32}{'live p50':>10}{'p99':>8}{'snap p50':>10}{'p99':>8}{'round trips':>13}")
+    for name, read in reads.items():
+        results = []
+        for target in (model, snapshot):
+            # Refresh the snapshots before they expire, as the refresher would
+            snapshot.refresh_snapshots()
+            results.append(latency_percentiles(lambda: read(target), operations))
+        round_trips = [count_round_trips(target, lambda: read(target)) for target in (model, snapshot)]
+        (live_p50, live_p99), (snap_p50, snap_p99) = results
+        print(f"{name:<32}{live_p50:>10.3f}{live_p99:>8.3f}{snap_p50:>10.3f}{snap_p99:>8.3f}"
+              f"{round_trips[0]:>7} → {round_trips[1]}")
+
+def sample_memory_usage(client, pattern, samples):
+    """Mean MEMORY USAGE in bytes of a sample of the hashes matching a pattern"""
+    keys = list(itertools.islice(client.scan_iter(match=pattern, count=1000, _type="hash"), samples))
+    if not keys:
+        return 0.0
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        # Count every field of the hash, not an estimate from a few of them
+        pipe.memory_usage(key, samples=0)
+    return sum(pipe.execute()) / len(keys)
+
+def benchmark_codecs(model, args):
+    """Compare the memory per chirp and the read latency of the storage codecs"""
+    tweets = load_tweets(args.file)
+    operations = min(args.operations, 5000)
+    print(f"\n🗜️ Storage codecs on {len(tweets)} English tweets from {args.file}, "
+          f"MEMORY USAGE of {args.samples} sampled keys")
+    print(f"{'codec':<10}{'B/chirp':>9}{'vs hash':>9}{'B/user':>8}{'total B/chirp':>15}{'get_chirps(20) p50':>20}")
+
+    baseline = None
+    for name in CODECS:
+        model.redis.flushdb()
+        before = model.redis.info("memory")["used_memory"]
+        coded = ChirpRedisModel(host=args.host, port=args.port, db=args.db, codec=name)
+        chirp_ids = coded.import_chirps(tweets, chunk_size=args.batch_size)
+        # Everything the import added, timeline and rankings included
+        total = (model.redis.info("memory")["used_memory"] - before) / len(chirp_ids)
+
+        per_chirp = sample_memory_usage(model.redis, "chirp:*", args.samples)
+        per_user = sample_memory_usage(model.redis, "users:*", args.samples)
+        baseline = baseline or per_chirp
+        p50, _ = latency_percentiles(lambda: coded.get_chirps(random.sample(chirp_ids, 20)), operations)
+        print(f"{name:<10}{per_chirp:>9.1f}{per_chirp / baseline - 1:>+9.0%}{per_user:>8.1f}"
+              f"{total:>15.1f}{p50:>17.3f} ms")
+
+def benchmark_user_buckets(model, args):
+    """Compare the memory per user and the read latency of user hashes and user buckets"""
+    tweets = synthetic_tweets(args.users, users=args.users)
+    operations = min(args.operations, 5000)
+    buckets = max(1, args.users // 100)
+    print(f"\n🪣 {args.users} users, one hash each vs packed into {buckets} buckets, "
+          f"MEMORY USAGE of {args.samples} sampled keys")
+    print(f"{'layout':<10}{'B/user':>8}{'vs hash':>9}{'total B/user':>14}{'encoding':>10}{'get_users(20) p50':>19}")
+
+    baseline = None
+    for name, user_buckets in (("hash", None), ("buckets", buckets)):
+        model.redis.flushdb()
+        before = model.redis.info("memory")["used_memory"]
+        layout = ChirpRedisModel(host=args.host, port=args.port, db=args.db, user_buckets=user_buckets)
+        layout.import_chirps(tweets, chunk_size=args.batch_size)
+        # Chirps, timeline and rankings included, they are the same in both layouts
+        total = (model.redis.info("memory")["used_memory"] - before) / args.users
+
+        pattern, keys = ("users:[0-9]*", args.users) if user_buckets is None else ("ubucket:*", buckets)
+        per_user = sample_memory_usage(model.redis, pattern, args.samples) * keys / args.users
+        encoding = model.redis.object("encoding", next(model.redis.scan_iter(match=pattern, _type="hash")))
+        baseline = baseline or per_user
+        user_ids = [str(user_id) for user_id in range(args.users)]
+        p50, _ = latency_percentiles(lambda: layout.get_users(random.sample(user_ids, 20)), operations)
+        print(f"{name:<10}{per_user:>8.1f}{per_user / baseline - 1:>+9.0%}{total:>14.1f}{encoding:>10}"
+              f"{p50:>16.3f} ms")
+
+def benchmark_decode(args):
+    """Compare full stdlib decoding of every line with the projecting decoders"""
+    opener = bz2.open if args.file.endswith('.bz2') else open
+    with opener(args.file, 'rb') as f:
+        lines = f.readlines()
+    print(f"\n🧩 {len(lines)} raw lines from {args.file}")
+
+    def full_decode():
+        records = []
+        for line in lines:
+            try:
+                tweet = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if tweet.get('lang') == 'en':
+                records.append(project_tweet(tweet))
+        return records
+
+    paths = {"json.loads on every line": full_decode}
+    for backend in available_backends():
+        decoder = TweetDecoder(backend)
+        paths[f"{backend} + byte pre-check"] = (
+            lambda decoder=decoder: [r for r in map(decoder.decode, lines) if r is not None]
+        )
+
+    print(f"{'path':<32}{'records':>10}{'lines/s':>12}")
+    for name, action in paths.items():
+        start = time.perf_counter()
+        records = action()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<32}{len(records):>10}{len(lines) / elapsed:>12.0f}")
+
+def directory_size(path):
+    """Total size in bytes of a file or of the files of a directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def benchmark_formats(args):
+    """Compare the size and load time of the processed tweet formats"""
+    input_files = sorted(Path(args.input_dir).glob("*.json.bz2"))[:args.max_files]
+    tweets = []
+    for file_path in input_files:
+        with bz2.open(file_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    tweet = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if tweet.get('lang') == 'en':
+                    tweets.append(tweet)
+    print(f"\n🗂️ {len(tweets)} English tweets from {len(input_files)} files of {args.input_dir}")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        legacy = os.path.join(output_dir, "legacy.json")
+        with open(legacy, 'w', encoding='utf-8') as f:
+            json.dump(tweets, f, ensure_ascii=False, indent=2)
+
+        projected = [project_tweet(tweet) for tweet in tweets]
+        array = os.path.join(output_dir, "english_tweets.json")
+        with open(array, 'w', encoding='utf-8') as f:
+            json.dump(projected, f, ensure_ascii=False, indent=2)
+
+        parts = os.path.join(output_dir, "english_tweets")
+        with ChunkedJsonlWriter(parts, chunk_size=max(1, len(projected) // args.clients)) as writer:
+            for record in projected:
+                writer.write(record)
+
+        def load_legacy():
+            with open(legacy, encoding='utf-8') as f:
+                return [record for record in map(TweetDecoder("json").accept, json.load(f)) if record]
+
+        formats = {
+            "full tweets, indented JSON (json.load)": (legacy, load_legacy),
+            "projected, indented JSON array": (array, lambda: list(read_tweets(array))),
+            "projected, chunked JSONL": (parts, lambda: list(iter_directory_records(parts, workers=1))),
+            f"projected, chunked JSONL, {args.clients} workers": (
+                parts, lambda: list(iter_directory_records(parts, workers=args.clients))
+            ),
+        }
+
+        print(f"{'format':<48}{'MB':>8}{'load s':>9}{'tweets':>9}")
+        for name, (path, load) in formats.items():
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                loaded = load()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<48}{directory_size(path) / 1e6:>8.1f}{elapsed:>9.2f}{len(loaded):>9}")
+
+# Benchmarks which do not need a Redis server
+OFFLINE_BENCHMARKS = {
+    "decode": benchmark_decode,
+    "formats": benchmark_formats,
+}
+
+BENCHMARKS = {
+    "writes": benchmark_writes,
+    "ids": benchmark_ids,
+    "import": benchmark_import,
+    "async": benchmark_async,
+    "cluster": benchmark_cluster,
+    "shards": benchmark_shards,
+    "snapshots": benchmark_snapshots,
+    "codecs": benchmark_codecs,
+    "user_buckets": benchmark_user_buckets,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Chirp data model")
+    parser.add_argument("benchmark", choices=sorted({**BENCHMARKS, **OFFLINE_BENCHMARKS}),
+                        help="Benchmark to run")
+    parser.add_argument("--host", default="localhost", help="Redis host (default: localhost)")
+    parser.add_argument("--port", type=int, default=6379, help="Redis port (default: 6379)")
+    parser.add_argument("--db", type=int, default=15,
+                        help="Redis database, flushed by the benchmark (default: 15)")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients (default: 8)")
+    parser.add_argument("--operations", type=int, default=20000,
+                        help="Total number of operations (default: 20000)")
+    parser.add_argument("--file", default="data/twitter_data/00.json.bz2",
+                        help="Tweet file used by the import benchmarks (default: data/twitter_data/00.json.bz2)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Batch size used by the import benchmarks (default: 1000)")
+    parser.add_argument("--cluster-port", type=int, default=7000,
+                        help="Port of a node of the Redis Cluster used by the cluster benchmark (default: 7000)")
+    parser.add_argument("--partitions", type=int, default=16,
+                        help="Keyspace partitions used by the cluster benchmark (default: 16)")
+    parser.add_argument("--shard", action="append", dest="shards", metavar="HOST:PORT",
+                        help="Shard used by the shards benchmark, which adds them one by one (repeatable)")
+    parser.add_argument("--samples", type=int, default=1000,
+                        help="Keys whose memory usage is sampled by the memory benchmarks (default: 1000)")
+    parser.add_argument("--users", type=int, default=100000,
+                        help="Number of users written by the user_buckets benchmark (default: 100000)")
+    parser.add_argument("--input-dir", default="data/twitter_data",
+                        help="Directory of .json.bz2 files used by the formats benchmark (default: data/twitter_data)")
+    parser.add_argument("--max-files", type=int, default=4,
+                        help="Number of .json.bz2 files used by the formats benchmark (default: 4)")
+
+    args = parser.parse_args()
+
+    if args.benchmark in OFFLINE_BENCHMARKS:
+        OFFLINE_BENCHMARKS[args.benchmark](args)
+        sys.exit(0)
+
+    model = ChirpRedisModel(host=args.host, port=args.port, db=args.db)
+    model.redis.flushdb()
+    try:
+        BENCHMARKS[args.benchmark](model, args)
+    finally:
+        model.redis.flushdb()
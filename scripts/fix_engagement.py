@@ -3,43 +3,49 @@
 Script to add random engagement to existing chirps in Redis
 """
 
+import os
 import random
-import redis
 import sys
+import argparse
 
-def add_engagement_to_chirps():
-    """Add random engagement metrics to all existing chirps"""
-    # Connect to Redis
-    r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.options import add_model_arguments, model_options
+from src.models.redis_model import ChirpRedisModel
+from src.models.schema import CHIRP_PREFIX, chirp_id_from_key
+from src.models.sweeper import scan_batches
+
+def add_engagement_to_chirps(host='localhost', port=6379, db=0, **options):
+    """Add random engagement metrics to all existing chirps, in every partition of the keyspace"""
+    # Connect to Redis, options such as cluster or shards are passed to the model
+    model = ChirpRedisModel(host=host, port=port, db=db, **options)
     
-    # Get all chirp keys
-    chirp_keys = r.keys("chirp:*")
+    # Walk the chirps of every partition without blocking the servers,
+    # updating each batch and its rankings in one round trip per server
+    count = 0
+    for client in model.partitioner.clients:
+        for batch in scan_batches(client, f"{CHIRP_PREFIX}*", 1000):
+            # Generate random engagement metrics
+            model.set_engagements({
+                chirp_id_from_key(key): (random.randint(0, 5000000), random.randint(0, 20000000))
+                for key in batch
+            })
+            count += len(batch)
+            
+            # Show progress
+            print(f"Updated {count} chirps...")
     
-    if not chirp_keys:
+    if not count:
         print("No chirps found in the database.")
         return
     
-    print(f"Found {len(chirp_keys)} chirps. Adding random engagement...")
-    
-    # Update each chirp with random engagement
-    count = 0
-    for key in chirp_keys:
-        # Generate random engagement metrics
-        likes = random.randint(0, 5000000)
-        retweets = random.randint(0, 20000000)
-        
-        # Update the chirp
-        r.hset(key, "favorite_count", likes)
-        r.hset(key, "retweet_count", retweets)
-        count += 1
-        
-        # Show progress
-        if count % 50 == 0:
-            print(f"Updated {count} chirps...")
-    
     print(f"✅ Successfully added random engagement to {count} chirps!")
     print("\nNow try viewing the latest chirps again to see the engagement metrics.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add random engagement to the existing chirps")
+    add_model_arguments(parser, reads=False)
+    args = parser.parse_args()
+    
     print("🚀 Adding random engagement metrics to existing chirps...")
-    add_engagement_to_chirps()
\ No newline at end of file
+    add_engagement_to_chirps(**model_options(args))
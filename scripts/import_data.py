@@ -6,133 +6,242 @@ Support for both JSON and BZ2 compressed JSON files
 
 import os
 import sys
-import json
-import bz2
+import asyncio
 import argparse
+import itertools
 import random
 from tqdm import tqdm
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ingest.async_importer import BatchJob, ImportStats, import_batches
+from src.ingest.decoders import BACKENDS, TweetDecoder
+from src.ingest.checkpoints import ImportCheckpoints
+from src.ingest.tweet_files import iter_directory_files, read_tweets
+from src.models.async_redis_model import AsyncChirpRedisModel
 from src.models.redis_model import ChirpRedisModel
+from src.models.resp import RespExporter
+from src.models.options import add_model_arguments, model_options
 
-def import_data(file_path, host='localhost', port=6379, db=0, limit=None, add_engagement=False):
+def with_random_engagement(tweets):
+    """Add random like and retweet counts for more realistic data"""
+    for tweet in tweets:
+        tweet['favorite_count'] = random.randint(0, 5000000)
+        tweet['retweet_count'] = random.randint(0, 20000000)
+        yield tweet
+
+def batched(items, size):
+    """Group an iterable into lists of at most size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def peak_rss_mb():
+    """Peak resident memory of the process in MB, or None if unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def open_sources(file_path, workers=None, backend=None, skip=()):
+    """
+    Open the tweet streams of a file or of a directory of tweet files
+    
+    Returns:
+        iterable: (source file path, iterator of projected English tweets) tuples
+    """
+    if os.path.isdir(file_path):
+        return iter_directory_files(file_path, workers, backend, skip=skip)
+    if str(file_path).lower().endswith('.bz2'):
+        print(f"🔄 Detected BZ2 compressed file, decompressing...")
+    return [(file_path, read_tweets(file_path, TweetDecoder(backend)))]
+
+def iter_batches(sources, checkpoints, resume=False, limit=None, batch_size=1000, add_engagement=False):
+    """
+    Cut the tweet streams into batches, skipping what a previous run committed
+    
+    Args:
+        sources (iterable): (source file path, iterator of projected English tweets) tuples
+        checkpoints (ImportCheckpoints): Checkpoints of the imported database, only read with resume
+        resume (bool): Skip the tweets committed by a previous run
+        limit (int, optional): Maximum number of tweets to read
+        batch_size (int): Number of tweets per batch
+        add_engagement (bool): Add random engagement metrics to tweets
+    
+    Yields:
+        BatchJob: Batches of each source, then a job without tweets once the source was fully read
+    """
+    remaining = limit if limit and limit > 0 else None
+    
+    for source, tweets in sources:
+        if remaining == 0:
+            break
+        
+        # Seek past the tweets committed by a previous run
+        committed = checkpoints.offset(source) if resume else 0
+        if committed is None:
+            print(f"⏭️ {source} was already imported")
+            continue
+        if committed:
+            print(f"⏩ Resuming {source} after {committed} tweets")
+            tweets = itertools.islice(tweets, committed, None)
+        
+        if remaining is not None:
+            tweets = itertools.islice(tweets, remaining)
+        
+        # Add random engagement metrics if requested
+        if add_engagement:
+            tweets = with_random_engagement(tweets)
+        
+        for batch in batched(tweets, batch_size):
+            yield BatchJob(source, committed, batch)
+            committed += len(batch)
+            if remaining is not None:
+                remaining -= len(batch)
+        
+        # A file cut by the limit is not complete
+        if remaining is None or remaining > 0:
+            yield BatchJob(source, committed, None)
+
+async def import_async(host, port, db, jobs, checkpoints, batch_size=1000, writers=8, progress=None):
+    """
+    Write batch jobs with concurrent pipelines and report the stage timings
+    
+    Returns:
+        ImportStats: Counters of the import
+    """
+    async with AsyncChirpRedisModel(host=host, port=port, db=db) as model:
+        stats, timings = await import_batches(model, jobs, checkpoints, batch_size, writers,
+                                              progress=progress)
+    timings.report()
+    return stats
+
+def import_data(file_path, host='localhost', port=6379, db=0, limit=None, add_engagement=False,
+                batch_size=1000, workers=None, backend=None, resume=False, use_async=False,
+                writers=8, **options):
     """
     Import data from a JSON or BZ2 compressed JSON file into Redis
     
+    Tweets flow through a generator pipeline (read, decode, filter, project,
+    batch, write), so writing starts right away and memory stays bounded by
+    the batch size whatever the size of the file.
+    
+    If file_path is a directory, all its .json.bz2 archives and compact
+    part-*.jsonl files are parsed in parallel by worker processes and
+    written by this process.
+    
+    In async mode, batches are read and decoded in a thread while several
+    pipelines are in flight on a pool of connections, with a bounded queue
+    between them, and the time spent in each stage is reported.
+    
+    Progress is checkpointed in Redis after every batch. With resume, files
+    already imported are skipped and a partially imported file continues
+    after its last committed batch. Imports are idempotent, so replaying
+    the batch which was in flight during a crash never double-counts.
+    
     Args:
-        file_path (str): Path to the JSON or JSON.BZ2 file containing tweets
+        file_path (str): Path to the JSON or JSON.BZ2 file, or to a directory of tweet files
         host (str): Redis host
         port (int): Redis port
         db (int): Redis database
         limit (int, optional): Maximum number of tweets to import
         add_engagement (bool): Add random engagement metrics to tweets
+        batch_size (int): Number of tweets written per pipeline
+        workers (int, optional): Worker processes in directory mode (default: CPU count)
+        backend (str, optional): JSON backend (default: fastest installed)
+        resume (bool): Continue from the checkpoints of a previous run
+        use_async (bool): Write with concurrent asyncio pipelines, overlapping reading and writing
+        writers (int): Number of pipelines in flight in async mode
+        **options: Other options of ChirpRedisModel, such as timeline_buckets, codec or user_buckets
     """
+    if use_async and (options.get("cluster") or options.get("shards")):
+        print("❌ Error: The async importer only writes a single server, drop --async or --cluster/--shard.")
+        return
+    if use_async and options.get("timeline_buckets"):
+        print("❌ Error: The async importer only writes a single timeline, drop --async or --timeline-buckets.")
+        return
+    if use_async and options.get("codec", "hash") != "hash":
+        print("❌ Error: The async importer only writes plain hashes, drop --async or --codec.")
+        return
+    if use_async and options.get("user_buckets"):
+        print("❌ Error: The async importer only writes user hashes, drop --async or --user-buckets.")
+        return
+    
     # Initialize Redis model
-    model = ChirpRedisModel(host=host, port=port, db=db)
+    model = ChirpRedisModel(host=host, port=port, db=db, **options)
     
     # Check if file exists
     if not os.path.exists(file_path):
         print(f"❌ Error: The file {file_path} does not exist.")
         return
     
-    # Determine file type based on extension
-    file_path_str = str(file_path).lower()
-    is_bz2 = file_path_str.endswith('.bz2')
-    tweets = []
-
-    try:
-        if is_bz2:
-            print(f"🔄 Detected BZ2 compressed file, decompressing...")
-            
-            # Handle BZ2 compressed file
-            with bz2.open(file_path, 'rt', encoding='utf-8') as f:
-                # Check if it's a JSON array or line-by-line JSON
-                first_char = f.read(1)
-                f.seek(0)  # Reset to beginning
-                
-                if first_char == '[':
-                    # It's a JSON array
-                    tweets = json.load(f)
-                else:
-                    # It's line-by-line JSON
-                    for line in f:
-                        line = line.strip()
-                        if line:
-                            try:
-                                tweet = json.loads(line)
-                                tweets.append(tweet)
-                            except json.JSONDecodeError:
-                                continue
-        else:
-            # Handle regular JSON file
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    tweets = json.load(f)
-            except json.JSONDecodeError:
-                # Try to read line by line if the file is not a JSON array
-                print("🔄 Not a JSON array, trying line-by-line parsing...")
-                tweets = []
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line:
-                            try:
-                                tweet = json.loads(line)
-                                tweets.append(tweet)
-                            except json.JSONDecodeError:
-                                continue
-    except Exception as e:
-        print(f"❌ Error processing file: {e}")
-        return
+    checkpoints = ImportCheckpoints(model.redis)
+    users_before = model.get_stats()['users']
+    
+    # Build the pipeline, nothing is read before the first batch is requested
+    completed = checkpoints.completed() if resume and os.path.isdir(file_path) else ()
+    if completed:
+        print(f"⏭️ Skipping {len(completed)} file(s) already imported")
+    sources = open_sources(file_path, workers, backend, skip=completed)
     
-    # Limit the number of tweets if necessary
+    # Limit the number of tweets if necessary, reading stops once it is reached
     if limit and limit > 0:
         print(f"🔍 Limiting import to {limit} tweets")
-        tweets = tweets[:limit]
-    
-    # Filter English tweets
-    english_tweets = [tweet for tweet in tweets if tweet.get('lang') == 'en']
-    print(f"🌐 Total number of English tweets: {len(english_tweets)}")
-    
-    # Import tweets into Redis with a progress bar
-    imported_count = 0
-    users_seen = set()
+    jobs = iter_batches(sources, checkpoints, resume, limit, batch_size, add_engagement)
     
+    # Import English tweets into Redis in batches with a progress bar
     print("🚀 Importing tweets into Redis...")
-    for tweet in tqdm(english_tweets, desc="⏳ Importing"):
-        try:
-            # Add random engagement metrics if requested
-            if add_engagement:
-                # Add random like and retweet counts for more realistic data
-                tweet['favorite_count'] = random.randint(0, 5000000)
-                tweet['retweet_count'] = random.randint(0, 20000000)
-            
-            # Import the chirp (which also imports the user)
-            model.import_chirp(tweet)
-            
-            # Track imported users
-            user_id = str(tweet['user']['id'])
-            if user_id not in users_seen:
-                users_seen.add(user_id)
-            
-            imported_count += 1
-        except KeyError as e:
-            # Ignore tweets with missing data
-            print(f"⚠️ Warning: Missing data in a tweet - {e}")
-            continue
-        except Exception as e:
-            print(f"❌ Error importing a tweet: {e}")
-            continue
+    try:
+        with tqdm(desc="⏳ Importing", unit=" tweets") as progress:
+            if use_async:
+                stats = asyncio.run(import_async(host, port, db, jobs, checkpoints, batch_size,
+                                                 writers, progress))
+            else:
+                stats = ImportStats()
+                for job in jobs:
+                    if job.tweets is None:
+                        checkpoints.complete(job.source)
+                        continue
+                    
+                    # Import the chirps (which also imports the users)
+                    imported_ids = model.import_chirps(job.tweets, chunk_size=batch_size)
+                    skipped = stats.add(job.tweets, imported_ids)
+                    if skipped:
+                        print(f"⚠️ Warning: {skipped} tweet(s) with missing data skipped")
+                    
+                    checkpoints.commit(job.source, job.offset + len(job.tweets))
+                    progress.update(len(job.tweets))
+    except Exception as e:
+        print(f"❌ Error importing tweets: {e}")
+        print("💡 Run the import again with --resume to continue from the last committed batch")
+        return
     
+    print(f"🌐 Total number of English tweets: {stats.english_count}")
     print(f"\n✅ Import completed!")
-    print(f"📊 Tweets imported: {imported_count}")
-    print(f"👥 Users imported: {len(users_seen)}")
+    print(f"📊 Tweets imported: {stats.imported_count}")
+    if stats.duplicate_count:
+        print(f"🔁 Duplicate tweets skipped: {stats.duplicate_count}")
+    # Read from the users counter, so the importer never holds every user ID
+    db_stats = model.get_stats()
+    print(f"👥 New users: {db_stats['users'] - users_before}")
+    
+    peak_rss = peak_rss_mb()
+    if peak_rss is not None:
+        print(f"🧠 Peak memory (RSS): {peak_rss:.1f} MB")
     
     # Display some statistics
     print("\n📈 Statistics:")
-    print(f"- 💬 Total number of chirps: {model.redis.zcard('chirps:timeline')}")
-    print(f"- 👤 Total number of users: {len(model.redis.keys('users:*'))}")
+    print(f"- 💬 Total number of chirps: {db_stats['chirps']}")
+    print(f"- 👤 Total number of users: {db_stats['users']}")
+    print(f"- ✍️ Users who posted (estimate): {db_stats['posters']}")
     
     # Display top 5 users with most followers
     top_followers = model.get_top_users_by_followers(5)
@@ -146,23 +255,97 @@ def import_data(file_path, host='localhost', port=6379, db=0, limit=None, add_en
     for chirp in latest_chirps:
         print(f"- @{chirp['username']}: {chirp['text'][:50]}... ♥ {chirp['favorite_count']} | ↺ {chirp['retweet_count']}")
 
+def export_resp(file_path, output_path, limit=None, add_engagement=False, batch_size=1000,
+                workers=None, backend=None):
+    """
+    Write the Redis commands of an import to a RESP file instead of running them
+    
+    The file holds exactly the writes import_data would send to an empty
+    database, and can be loaded with redis-cli --pipe or scripts/load_resp.py,
+    which is much faster than going through the Python client.
+    
+    Args:
+        file_path (str): Path to the JSON or JSON.BZ2 file, or to a directory of tweet files
+        output_path (str): Path of the RESP file to write
+        limit (int, optional): Maximum number of tweets to export
+        add_engagement (bool): Add random engagement metrics to tweets
+        batch_size (int): Number of tweets per chunk, as in the import
+        workers (int, optional): Worker processes in directory mode (default: CPU count)
+        backend (str, optional): JSON backend (default: fastest installed)
+    """
+    if not os.path.exists(file_path):
+        print(f"❌ Error: The file {file_path} does not exist.")
+        return
+    
+    if limit and limit > 0:
+        print(f"🔍 Limiting export to {limit} tweets")
+    
+    # Batches follow the same boundaries as in import_data, so the trimming points match
+    exported_count = 0
+    print(f"📝 Writing Redis commands to {output_path}...")
+    with open(output_path, 'wb') as f:
+        exporter = RespExporter(f)
+        with tqdm(desc="⏳ Exporting", unit=" tweets") as progress:
+            sources = open_sources(file_path, workers, backend)
+            for job in iter_batches(sources, None, False, limit, batch_size, add_engagement):
+                if job.tweets is not None:
+                    exported_count += len(exporter.export_chirps(job.tweets, chunk_size=batch_size))
+                    progress.update(len(job.tweets))
+    
+    print(f"\n✅ Export completed!")
+    print(f"📊 Tweets exported: {exported_count}")
+    print(f"🧾 Commands written: {exporter.commands} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+    print(f"💡 Load them into an empty database with: redis-cli --pipe < {output_path}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Import Twitter data into Redis")
-    parser.add_argument("file", help="Path to the JSON or JSON.BZ2 file containing tweets")
-    parser.add_argument("--host", default="localhost", help="Redis host (default: localhost)")
-    parser.add_argument("--port", type=int, default=6379, help="Redis port (default: 6379)")
-    parser.add_argument("--db", type=int, default=0, help="Redis database (default: 0)")
+    parser.add_argument("file", help="Path to the JSON or JSON.BZ2 file containing tweets, "
+                                     "or to a directory of .json.bz2 / part-*.jsonl files")
+    add_model_arguments(parser, reads=False)
     parser.add_argument("--limit", type=int, help="Maximum number of tweets to import")
     parser.add_argument("--reset", action="store_true", help="Reset the database before importing")
     parser.add_argument("--add-engagement", action="store_true", help="Add random engagement metrics to tweets")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of tweets written per pipeline (default: 1000)")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes parsing files in directory mode (default: CPU count)")
+    parser.add_argument("--json-backend", choices=BACKENDS,
+                        help="JSON parser used to decode tweets (default: fastest installed)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip files already imported and continue after the last committed batch")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Write with concurrent asyncio pipelines and report the stage timings")
+    parser.add_argument("--writers", type=int, default=8,
+                        help="Pipelines in flight in async mode (default: 8)")
+    parser.add_argument("--emit-resp", metavar="PATH",
+                        help="Write the Redis commands to a RESP file for redis-cli --pipe instead of importing")
     
     args = parser.parse_args()
     
+    if args.emit_resp and (args.cluster or args.shards):
+        print("❌ Error: RESP exports only write a single server, drop --emit-resp or --cluster/--shard.")
+        sys.exit(1)
+    if args.emit_resp and args.timeline_buckets:
+        print("❌ Error: RESP exports only write a single timeline, drop --emit-resp or --timeline-buckets.")
+        sys.exit(1)
+    if args.emit_resp and args.codec != "hash":
+        print("❌ Error: RESP exports only write plain hashes, drop --emit-resp or --codec.")
+        sys.exit(1)
+    if args.emit_resp and args.user_buckets:
+        print("❌ Error: RESP exports only write user hashes, drop --emit-resp or --user-buckets.")
+        sys.exit(1)
+    if args.emit_resp:
+        export_resp(args.file, args.emit_resp, args.limit, args.add_engagement,
+                    args.batch_size, args.workers, args.json_backend)
+        sys.exit(0)
+    
     # Reset database if requested
     if args.reset:
-        model = ChirpRedisModel(host=args.host, port=args.port, db=args.db)
+        model = ChirpRedisModel.from_args(args)
         print("🧹 Resetting Redis database...")
         model.reset_db()
     
     # Import data
-    import_data(args.file, args.host, args.port, args.db, args.limit, args.add_engagement)
\ No newline at end of file
+    import_data(args.file, limit=args.limit, add_engagement=args.add_engagement,
+                batch_size=args.batch_size, workers=args.workers, backend=args.json_backend,
+                resume=args.resume, use_async=args.use_async, writers=args.writers, **model_options(args))
\ No newline at end of file
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Script to stream a RESP file written by import_data.py --emit-resp into Redis
+Equivalent to redis-cli --pipe, for machines without redis-cli
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.resp import load_resp
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a RESP file into Redis")
+    parser.add_argument("file", help="Path to the RESP file")
+    parser.add_argument("--host", default="localhost", help="Redis host (default: localhost)")
+    parser.add_argument("--port", type=int, default=6379, help="Redis port (default: 6379)")
+    parser.add_argument("--db", type=int, default=0, help="Redis database (default: 0)")
+    
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.file):
+        print(f"❌ Error: The file {args.file} does not exist.")
+        sys.exit(1)
+    
+    print(f"📤 Streaming {args.file} to {args.host}:{args.port}/{args.db}...")
+    start = time.perf_counter()
+    replies, errors = load_resp(args.file, args.host, args.port, args.db)
+    elapsed = time.perf_counter() - start
+    
+    for error in errors[:10]:
+        print(f"❌ {error}")
+    print(f"✅ {replies} commands executed in {elapsed:.2f}s ({replies / max(elapsed, 1e-9):,.0f} commands/s), "
+          f"{len(errors)} error(s)")
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Script to keep the snapshots of the rankings and the timeline fresh
+Refreshing them more often than they expire means readers never rebuild them
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.options import add_model_arguments, model_options
+from src.models.redis_model import ChirpRedisModel
+from src.models.snapshots import SNAPSHOT_MAX_AGE, SNAPSHOT_SIZE
+
+def parse_args(argv=None):
+    """Parse the command line of the refresher"""
+    parser = argparse.ArgumentParser(description="Refresh the snapshots of the Chirp rankings")
+    add_model_arguments(parser, reads=False)
+    parser.add_argument("--snapshot-size", type=int, default=SNAPSHOT_SIZE,
+                        help=f"Entries kept per snapshot (default: {SNAPSHOT_SIZE})")
+    parser.add_argument("--max-age", type=float, default=SNAPSHOT_MAX_AGE,
+                        help=f"Seconds a snapshot is served for (default: {SNAPSHOT_MAX_AGE})")
+    parser.add_argument("--interval", type=float,
+                        help="Seconds between refreshes (default: half the maximum age)")
+    parser.add_argument("--once", action="store_true", help="Refresh the snapshots once and exit")
+    return parser.parse_args(argv)
+
+def create_model(args):
+    """
+    Model refreshing the snapshots, which must read the layout of the database
+
+    The timeline buckets and user buckets of the importer must be given,
+    otherwise the snapshots are rendered from empty rankings and timeline.
+    """
+    return ChirpRedisModel(**model_options(args), snapshots=True, snapshot_size=args.snapshot_size,
+                           snapshot_max_age=args.max_age)
+
+if __name__ == "__main__":
+    args = parse_args()
+    interval = args.interval or args.max_age / 2
+    if interval >= args.max_age:
+        print("⚠️ Warning: Snapshots expire between refreshes, readers will rebuild them.")
+
+    model = create_model(args)
+    print(f"📸 Refreshing the snapshots every {interval:.2f}s (served for {args.max_age:.2f}s)...")
+    try:
+        while True:
+            start = time.perf_counter()
+            count = model.refresh_snapshots()
+            elapsed = time.perf_counter() - start
+            if args.once:
+                print(f"✅ Refreshed {count} snapshots in {elapsed * 1000:.1f}ms")
+                break
+            time.sleep(max(0.0, interval - elapsed))
+    except KeyboardInterrupt:
+        print("\n🛑 Refresher stopped. Goodbye! 👋")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Script to migrate an existing Redis database to the current data model
+"""
+
+import os
+import sys
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.options import add_model_arguments
+from src.models.redis_model import ChirpRedisModel
+
+def migrate_rankings(model, batch_size=1000):
+    """Backfill the chirps:top_liked and chirps:top_rechirped rankings"""
+    print("🔄 Backfilling engagement rankings...")
+    indexed = model.rebuild_engagement_rankings(batch_size=batch_size)
+    print(f"✅ {indexed} chirps indexed in the engagement rankings.")
+
+def migrate_buckets(model, batch_size=1000):
+    """Split the chirps:timeline sorted set into time buckets"""
+    print("🔄 Splitting the timeline into buckets...")
+    moved = model.split_timeline(batch_size=batch_size)
+    print(f"✅ {moved} chirps moved to their timeline buckets.")
+
+def migrate_stats(model, batch_size=1000):
+    """Recount the stats counters and the posters HyperLogLog from the existing hashes"""
+    print("🔄 Recounting chirps, users and posters...")
+    counts = model.rebuild_stats(batch_size=batch_size)
+    print(f"✅ {counts['chirps']} chirps and {counts['users']} users counted.")
+
+def migrate_codec(model, batch_size=1000):
+    """Rewrite the chirp hashes with the storage codec of the model"""
+    print(f"🔄 Recoding chirps with the {model.codec.name} codec...")
+    recoded = model.recode_chirps(batch_size=batch_size)
+    print(f"✅ {recoded} chirps recoded.")
+
+def migrate_dates(model, batch_size=1000):
+    """Rewrite the Twitter dates of the chirp and user hashes as epoch seconds"""
+    print("🔄 Converting dates to epoch seconds...")
+    converted = model.convert_dates(batch_size=batch_size)
+    print(f"✅ {converted} chirps and users converted.")
+
+MIGRATIONS = {
+    "rankings": migrate_rankings,
+    "buckets": migrate_buckets,
+    "stats": migrate_stats,
+    "codec": migrate_codec,
+    "dates": migrate_dates,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate an existing Redis database")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS), help="Migration to run")
+    add_model_arguments(parser, reads=False)
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of keys handled per round trip (default: 1000)")
+    
+    args = parser.parse_args()
+    if args.migration == "buckets" and args.timeline_buckets is None:
+        parser.error("the buckets migration requires --timeline-buckets")
+    
+    model = ChirpRedisModel.from_args(args)
+    MIGRATIONS[args.migration](model, batch_size=args.batch_size)
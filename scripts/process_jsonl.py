@@ -5,7 +5,6 @@ Added functionality to generate sample data for testing
 """
 
 import json
-import bz2
 import os
 import sys
 import argparse
@@ -14,6 +13,11 @@ from pathlib import Path
 from datetime import datetime, timedelta
 import time
 
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ingest.decoders import BACKENDS
+from src.ingest.tweet_files import ChunkedJsonlWriter, iter_directory_records
+
 def generate_sample_data(num_users=20, tweets_per_user=5):
     """Generate synthetic Twitter data for testing"""
     print(f"🔧 Generating sample data with {num_users} users and {tweets_per_user} tweets per user...")
@@ -54,61 +58,66 @@ def generate_sample_data(num_users=20, tweets_per_user=5):
     
     return tweets
 
-def process_jsonl_bz2_files(input_dir, output_dir):
-    """Process JSONL files compressed in bz2 and extract English tweets"""
+def write_json_array(records, output_file):
+    """
+    Stream records to a single indented JSON array
+    
+    Returns:
+        int: Number of records written
+    """
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("[\n")
+        for record in records:
+            if count:
+                f.write(",\n")
+            f.write(json.dumps(record, ensure_ascii=False, indent=2))
+            count += 1
+        f.write("\n]\n")
+    return count
+
+def process_jsonl_bz2_files(input_dir, output_dir, workers=None, output_format="jsonl",
+                            chunk_size=50000, backend=None):
+    """
+    Process JSONL files compressed in bz2 and extract English tweets
+    
+    Files are decompressed and parsed in parallel by a pool of processes and
+    the projected English tweets are streamed to the output as they arrive,
+    in file order.
+    
+    Args:
+        input_dir (str): Directory containing .json.bz2 files
+        output_dir (str): Output directory
+        workers (int, optional): Worker processes (default: CPU count)
+        output_format (str): "jsonl" for chunked part files in english_tweets/,
+            "json" for a single english_tweets.json array
+        chunk_size (int): Maximum number of tweets per part file
+        backend (str, optional): JSON backend (default: fastest installed)
+    """
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
     # Find all .bz2 files
-    bz2_files = list(Path(input_dir).glob("*.json.bz2"))
-    print(f"🔍 Found {len(bz2_files)} .bz2 files")
-    
-    if not bz2_files:
+    if not list(Path(input_dir).glob("*.json.bz2")):
         print(f"❌ No .bz2 files found in {input_dir}")
         return
     
-    # Process each file
-    all_english_tweets = []
-    for file_path in bz2_files:
-        print(f"⏳ Processing {file_path}...")
-        try:
-            english_tweets_in_file = 0
-            
-            # Open the bz2 file and read line by line
-            with bz2.open(file_path, 'rt', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:  # Ignore empty lines
-                        continue
-                    
-                    try:
-                        # Parse each line as an independent JSON object
-                        tweet = json.loads(line)
-                        
-                        # Check if the tweet is in English
-                        if tweet.get('lang') == 'en':
-                            all_english_tweets.append(tweet)
-                            english_tweets_in_file += 1
-                    except json.JSONDecodeError as je:
-                        print(f"  ⚠️ JSON decoding error in {file_path}: {je}")
-                        continue
-            
-            print(f"  📊 {english_tweets_in_file} English tweets found in {file_path.name}")
-        
-        except Exception as e:
-            print(f"❌ Error processing {file_path}: {e}")
+    records = iter_directory_records(input_dir, workers, backend)
     
-    # Save results
-    print(f"📈 Total: {len(all_english_tweets)} English tweets")
+    if output_format == "jsonl":
+        output_path = os.path.join(output_dir, "english_tweets")
+        with ChunkedJsonlWriter(output_path, chunk_size) as writer:
+            for record in records:
+                writer.write(record)
+        count = writer.count
+    else:
+        output_path = os.path.join(output_dir, "english_tweets.json")
+        count = write_json_array(records, output_path)
     
-    if all_english_tweets:
-        # Save all tweets to a file instead of just a sample
-        all_tweets_file = os.path.join(output_dir, "english_tweets.json")
-        
-        with open(all_tweets_file, 'w', encoding='utf-8') as f:
-            json.dump(all_english_tweets, f, ensure_ascii=False, indent=2)
-        
-        print(f"💾 All {len(all_english_tweets)} English tweets saved in {all_tweets_file}")
+    # Report results
+    print(f"📈 Total: {count} English tweets")
+    if count:
+        print(f"💾 All {count} English tweets saved in {output_path}")
     else:
         print("📭 No English tweets found to save.")
 
@@ -125,6 +134,15 @@ def main():
                         help="Number of users in sample data (default: 20)")
     parser.add_argument("--tweets", type=int, default=5, 
                         help="Tweets per user in sample data (default: 5)")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes parsing the .bz2 files (default: CPU count)")
+    parser.add_argument("--format", choices=["jsonl", "json"], default="jsonl",
+                        help="Output format: chunked JSONL parts in english_tweets/ or a single "
+                             "english_tweets.json array (default: jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=50000,
+                        help="Maximum number of tweets per JSONL part (default: 50000)")
+    parser.add_argument("--json-backend", choices=BACKENDS,
+                        help="JSON parser used to decode tweets (default: fastest installed)")
     
     args = parser.parse_args()
     
@@ -143,7 +161,8 @@ def main():
         print(f"💾 Generated {len(sample_tweets)} sample tweets saved in {sample_file}")
     else:
         # Process real data files
-        process_jsonl_bz2_files(args.input_dir, args.output_dir)
+        process_jsonl_bz2_files(args.input_dir, args.output_dir, args.workers, args.format,
+                                args.chunk_size, args.json_backend)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script to add shards to a sharded Chirp database
+Only the keys which the consistent hashing ring assigns to the new shards are moved,
+stop the application's writers while it runs and restart them on the new shards
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.options import add_model_arguments
+from src.models.rebalance import rebalance
+from src.models.redis_model import ChirpRedisModel
+from src.models.schema import TIMELINE_BUCKETS, USER_BUCKET_PREFIX
+
+def ring_nodes(model):
+    """Clients by node name of a sharded model, in the order of its shards"""
+    return dict(zip(model.partitioner.names, model.partitioner.clients))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add shards to a sharded Chirp database")
+    add_model_arguments(parser, reads=False)
+    parser.add_argument("--add", action="append", dest="added", required=True, metavar="HOST:PORT",
+                        help="New shard (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="Number of keys moved per round trip (default: 500)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the keys which would move")
+
+    args = parser.parse_args()
+    if not args.shards:
+        parser.error("the current shards must be given with --shard, in the order given to the application")
+
+    old_nodes = ring_nodes(ChirpRedisModel.from_args(args))
+    new_nodes = {**ring_nodes(ChirpRedisModel.from_args(args, shards=args.shards + args.added)), **old_nodes}
+    if len(new_nodes) == len(old_nodes):
+        print("❌ Error: The new shards are already part of the ring.")
+        sys.exit(1)
+    if any(client.exists(TIMELINE_BUCKETS) for client in old_nodes.values()):
+        print("❌ Error: Only shards with a single timeline can be rebalanced, not timeline buckets.")
+        sys.exit(1)
+    if any(next(client.scan_iter(match=f"{USER_BUCKET_PREFIX}*"), None) for client in old_nodes.values()):
+        print("❌ Error: Only shards with a hash per user can be rebalanced, not user buckets.")
+        sys.exit(1)
+
+    if not args.dry_run:
+        print("⚠️ Writers must be stopped: moved keys are only found on the new ring.")
+    action = "Counting" if args.dry_run else "Moving"
+    print(f"🔀 {action} the keys of {len(old_nodes)} shard(s) owned by {', '.join(args.added)}...")
+    start = time.perf_counter()
+    moved = rebalance(old_nodes, new_nodes, args.virtual_nodes, args.batch_size, args.dry_run)
+    elapsed = time.perf_counter() - start
+
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"✅ {verb} {moved['chirps']} chirps, {moved['users']} users and "
+          f"{moved['usernames']} usernames in {elapsed:.2f}s")
+    shard_options = " ".join(f"--shard {name}" for name in new_nodes)
+    print(f"👉 Start the application with: {shard_options}")
+    if not args.dry_run:
+        print(f"📊 Then recount the posters of the moved users with: migrate_db.py stats {shard_options}")
@@ -9,20 +9,20 @@ import sys
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.app.chirp_app import ChirpApp
+from src.models.options import add_model_arguments
+from src.models.redis_model import ChirpRedisModel
 
 if __name__ == "__main__":
     # Handle arguments for Redis configuration
     import argparse
     
     parser = argparse.ArgumentParser(description="Launch the Chirp application")
-    parser.add_argument("--host", default="localhost", help="Redis host (default: localhost)")
-    parser.add_argument("--port", type=int, default=6379, help="Redis port (default: 6379)")
-    parser.add_argument("--db", type=int, default=0, help="Redis database (default: 0)")
+    add_model_arguments(parser)
     
     args = parser.parse_args()
     
     # Create and run the application
-    app = ChirpApp(host=args.host, port=args.port, db=args.db)
+    app = ChirpApp(model=ChirpRedisModel.from_args(args, socket_keepalive=True))
     try:
         app.run()
     except KeyboardInterrupt:
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Script to delete the chirp hashes trimmed out of the timeline, and optionally the users left without chirps
+The keyspace is walked with SCAN at a bounded rate, so it can run next to the application
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.options import add_model_arguments
+from src.models.redis_model import ChirpRedisModel
+from src.models.sweeper import sweep_orphans
+
+def print_report(report, dry_run, elapsed):
+    """Print the counters of a sweep"""
+    verb = "Would delete" if dry_run else "Deleted"
+    reclaimed = "unknown" if report["bytes"] is None else f"{report['bytes'] / 1e6:.2f} MB"
+    print(f"✅ {verb} {report['chirps']}/{report['scanned_chirps']} chirps and "
+          f"{report['users']}/{report['scanned_users']} users in {elapsed:.2f}s, "
+          f"reclaiming {reclaimed}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete orphaned chirp and user hashes")
+    add_model_arguments(parser, reads=False)
+    parser.add_argument("--rate", type=float, default=2000,
+                        help="Keys scanned per second, 0 for no limit (default: 2000)")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="Number of keys checked per round trip (default: 500)")
+    parser.add_argument("--users", action="store_true",
+                        help="Also delete the users none of whose chirps remain, including users who never posted")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the orphans")
+    parser.add_argument("--interval", type=float,
+                        help="Sweep again every N seconds instead of exiting after one sweep")
+
+    args = parser.parse_args()
+
+    model = ChirpRedisModel.from_args(args)
+    try:
+        while True:
+            print(f"🧹 Sweeping orphaned hashes at {args.rate or 'unlimited'} keys/s...")
+            start = time.perf_counter()
+            report = sweep_orphans(model, args.rate or None, args.batch_size, args.users, args.dry_run)
+            print_report(report, args.dry_run, time.perf_counter() - start)
+            if args.interval is None:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n🛑 Sweeper stopped. Goodbye! 👋")
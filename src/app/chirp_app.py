@@ -5,19 +5,19 @@ Chirp Main Application - Implementation of functionalities
 
 import os
 import sys
-import json
-from datetime import datetime
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.redis_model import ChirpRedisModel
+from models.schema import format_created_at
 
 class ChirpApp:
     """Main Chirp Application"""
     
-    def __init__(self, host='localhost', port=6379, db=0):
-        """Initialize Chirp application with a Redis connection"""
-        self.model = ChirpRedisModel(host=host, port=port, db=db)
+    def __init__(self, host='localhost', port=6379, db=0, model=None, **model_options):
+        """Initialize Chirp application with a Redis connection, or a model, model_options go to ChirpRedisModel"""
+        self.model = model if model is not None else ChirpRedisModel(host=host, port=port, db=db, **model_options)
+        self.timeline_cursor = None
         
     def display_welcome(self):
         """Display a welcome message"""
@@ -31,23 +31,24 @@ class ChirpApp:
         """Display help and available commands"""
         print("\n📋 Available commands:")
         print("  1. latest - Display the 5 most recent chirps")
-        print("  2. topFollowers - Display the 5 users with the most followers")
-        print("  3. topPosters - Display the 5 users with the most chirps")
-        print("  4. topLiked - Display the 5 most liked chirps")
-        print("  5. topRechirped - Display the 5 most rechirped chirps")
-        print("  6. post <username> <message> - Post a new chirp")
-        print("  7. addUser <username> <name> - Add a new user")
-        print("  8. like <chirp_id> - Like a chirp")
-        print("  9. rechirp <chirp_id> - Rechirp a chirp")
-        print("  10. help - Display this help message")
-        print("  11. exit - Exit the application")
+        print("  2. more - Display the next 5 chirps of the timeline")
+        print("  3. topFollowers - Display the 5 users with the most followers")
+        print("  4. topPosters - Display the 5 users with the most chirps")
+        print("  5. topLiked - Display the 5 most liked chirps")
+        print("  6. topRechirped - Display the 5 most rechirped chirps")
+        print("  7. post <username> <message> - Post a new chirp")
+        print("  8. addUser <username> <name> - Add a new user")
+        print("  9. like <chirp_id> - Like a chirp")
+        print("  10. rechirp <chirp_id> - Rechirp a chirp")
+        print("  11. help - Display this help message")
+        print("  12. exit - Exit the application")
         print("\n")
     
     def format_chirp(self, chirp):
         """Format a chirp for display"""
         chirp_id = chirp.get('chirp_id', 'unknown')
         return f"""
-  [@{chirp['username']}] - {chirp['created_at']}
+  [@{chirp['username']}] - {format_created_at(chirp['created_at'])}
   {chirp['text']}
   ♥ {chirp['favorite_count']} | ↺ {chirp['retweet_count']} | ID: {chirp_id}
         """
@@ -61,19 +62,30 @@ class ChirpApp:
     
     def display_latest_chirps(self):
         """Display the 5 latest chirps"""
-        chirps = self.model.get_latest_chirps(5)
+        chirps, self.timeline_cursor = self.model.get_timeline_page(limit=5)
         
         if not chirps:
             print("\n📭 No available chirps.")
             return
         
         print("\n📱 --- 5 latest chirps ---")
-        # Get chirp IDs from timeline
-        chirp_ids = self.model.redis.zrevrange("chirps:timeline", 0, 4)
+        for chirp in chirps:
+            print(self.format_chirp(chirp))
+    
+    def display_more_chirps(self):
+        """Display the next 5 chirps after the last displayed page"""
+        if self.timeline_cursor is None:
+            print("\n📭 No more chirps. Use 'latest' to start from the top.")
+            return
+        
+        chirps, self.timeline_cursor = self.model.get_timeline_page(self.timeline_cursor, limit=5)
         
-        for i, chirp in enumerate(chirps):
-            if i < len(chirp_ids):
-                chirp['chirp_id'] = chirp_ids[i]
+        if not chirps:
+            print("\n📭 No more chirps.")
+            return
+        
+        print("\n📱 --- Next 5 chirps ---")
+        for chirp in chirps:
             print(self.format_chirp(chirp))
     
     def display_top_followers(self):
@@ -103,7 +115,7 @@ class ChirpApp:
     def post_new_chirp(self, username, text):
         """Post a new chirp"""
         # Get the user ID from the username
-        user_id = self.model.redis.hget("usernames", username)
+        user_id = self.model.get_user_id(username)
         
         if not user_id:
             print(f"\n❌ Error: User @{username} does not exist.")
@@ -193,6 +205,9 @@ class ChirpApp:
             elif command.lower() == "latest":
                 self.display_latest_chirps()
             
+            elif command.lower() == "more":
+                self.display_more_chirps()
+            
             elif command.lower() == "topfollowers" or command.lower() == "topFollowers":
                 self.display_top_followers()
 
@@ -6,17 +6,24 @@ import os
 import sys
 import time
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.redis_model import ChirpRedisModel
+from models.schema import format_created_at
 
 # Initialize the Redis model
 @st.cache_resource
 def get_model():
-    """Get or create a Redis model instance"""
-    return ChirpRedisModel(host='localhost', port=6379, db=0)
+    """Get or create a Redis model instance, configured by the CHIRP_REDIS_* environment variables"""
+    return ChirpRedisModel.from_env(socket_keepalive=True)
+
+# Activity chart windows: (seconds covered, seconds per bar)
+ACTIVITY_WINDOWS = {
+    "Last 24 hours": (86400, 3600),
+    "Last 7 days": (7 * 86400, 6 * 3600),
+}
 
 # Set up the page
 st.set_page_config(
@@ -37,7 +44,7 @@ st.markdown("---")
 st.sidebar.title("Navigation")
 page = st.sidebar.radio(
     "Go to",
-    ["Home", "Post a Chirp", "Top Users", "About"]
+    ["Home", "Post a Chirp", "Top Users", "Activity", "About"]
 )
 
 # Function to format a chirp as a card
@@ -54,7 +61,7 @@ def display_chirp(chirp):
         
         with col2:
             # Display chirp content
-            st.markdown(f"**@{chirp['username']}** - {chirp['created_at']}")
+            st.markdown(f"**@{chirp['username']}** - {format_created_at(chirp['created_at'])}")
             st.markdown(chirp['text'])
             
             # Create a row for chirp actions
@@ -95,13 +102,29 @@ if page == "Home":
     
     with tab1:
         st.header("Latest Chirps")
-        chirps = model.get_latest_chirps(5)
+        
+        # Cursors of the pages visited so far (None is the first page)
+        if 'timeline_cursors' not in st.session_state:
+            st.session_state['timeline_cursors'] = [None]
+        cursors = st.session_state['timeline_cursors']
+        
+        chirps, next_cursor = model.get_timeline_page(cursors[-1], limit=5)
         
         if not chirps:
             st.info("No chirps available. Be the first to post!")
         else:
             for chirp in chirps:
                 display_chirp(chirp)
+        
+        col_prev, col_next = st.columns([1, 1])
+        with col_prev:
+            if len(cursors) > 1 and st.button("← Newer", key="timeline_newer"):
+                cursors.pop()
+                st.rerun()
+        with col_next:
+            if next_cursor is not None and st.button("Older →", key="timeline_older"):
+                cursors.append(next_cursor)
+                st.rerun()
     
     with tab2:
         st.header("Most Liked Chirps")
@@ -128,7 +151,7 @@ elif page == "Post a Chirp":
     st.header("Post a New Chirp")
     
     # Get all usernames for the dropdown
-    all_usernames = list(model.redis.hgetall("usernames").keys())
+    all_usernames = model.get_usernames()
     
     if not all_usernames:
         st.warning("No users found. Please add a user first.")
@@ -156,7 +179,7 @@ elif page == "Post a Chirp":
             submit_chirp = st.form_submit_button("Chirp")
             
             if submit_chirp and chirp_text:
-                user_id = model.redis.hget("usernames", username)
+                user_id = model.get_user_id(username)
                 try:
                     chirp_id = model.post_chirp(user_id, chirp_text)
                     st.success(f"Chirp posted with ID: {chirp_id}")
@@ -227,6 +250,26 @@ elif page == "Top Users":
                     
                     st.markdown("---")
 
+# Activity page
+elif page == "Activity":
+    st.header("Chirps Over Time")
+    
+    col_day, col_window = st.columns([1, 1])
+    with col_day:
+        day = st.date_input("Ending on (UTC)", value=datetime.now(timezone.utc).date())
+    with col_window:
+        window = st.selectbox("Window", list(ACTIVITY_WINDOWS))
+    span, interval = ACTIVITY_WINDOWS[window]
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time(), timezone.utc).timestamp()
+    
+    # Counted from the timeline scores alone, no chirp is read
+    counts = model.chirps_per_interval(end - span, end, interval)
+    if not counts.sum():
+        st.info("No chirps in this window.")
+    else:
+        st.bar_chart(counts)
+        st.caption(f"{counts.sum()} chirps still in the timeline, {interval // 3600} hour(s) per bar")
+
 # About page
 elif page == "About":
     st.header("About Chirp")
@@ -240,6 +283,7 @@ elif page == "About":
     - Like and rechirp posts
     - Post new chirps
     - View top users by followers and post count
+    - Chart the chirps posted over time
     - Simple and intuitive interface
     
     ## Technology
@@ -256,11 +300,18 @@ elif page == "About":
 # Add Redis database status in the sidebar
 st.sidebar.markdown("---")
 st.sidebar.subheader("Database Status")
-chirp_count = model.redis.zcard("chirps:timeline")
-user_count = len(model.redis.keys("users:*"))
+db_stats = model.get_stats()
+
+st.sidebar.metric("Total Chirps", db_stats["chirps"])
+st.sidebar.metric("Total Users", db_stats["users"])
+st.sidebar.metric("Users Who Posted", f"~{db_stats['posters']}")
 
-st.sidebar.metric("Total Chirps", chirp_count)
-st.sidebar.metric("Total Users", user_count)
+if model.cache is not None:
+    cache_stats = model.cache.stats()
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    st.sidebar.metric("Cache Hit Rate", f"{cache_stats['hits'] / lookups:.0%}" if lookups else "-")
+    st.sidebar.caption(f"{cache_stats['entries']} cached hashes, {cache_stats['bytes'] / 1024:.0f} KiB, "
+                       f"{cache_stats['evictions']} evictions, {cache_stats['invalidations']} invalidations")
 
 # Add a database reset button in the sidebar
 st.sidebar.markdown("---")
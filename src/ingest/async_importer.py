@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Asyncio bulk importer
+
+One producer pulls batches from the blocking tweet readers in a thread, so
+decompression and decoding overlap with network writes, and hands them to
+writer tasks through a bounded queue. Each writer keeps one pipeline in
+flight on its own pooled connection. When the writers fall behind the
+queue fills up and the producer waits, so memory stays flat.
+"""
+
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# A batch of projected tweets of a source file, starting at offset. A job
+# without tweets marks the end of a source, offset being its length.
+BatchJob = namedtuple("BatchJob", ["source", "offset", "tweets"])
+
+class ImportStats:
+    """
+    Counters of an import
+
+    Only counts are kept, so they take the same memory whatever the size
+    of the import. New users are counted by the users counter of the
+    database (see ChirpRedisModel.get_stats).
+    """
+
+    def __init__(self):
+        self.english_count = 0
+        self.imported_count = 0
+        self.duplicate_count = 0
+
+    def add(self, tweets, imported_ids):
+        """
+        Count a written batch
+
+        A tweet repeated within the batch is written once, and counted as a
+        duplicate rather than as imported.
+
+        Args:
+            tweets (list): Tweets of the batch
+            imported_ids (list): IDs of the imported chirps, once per tweet written
+
+        Returns:
+            int: Number of tweets skipped because of missing data
+        """
+        unique_ids = set(imported_ids)
+        self.english_count += len(tweets)
+        self.imported_count += len(unique_ids)
+        self.duplicate_count += len(imported_ids) - len(unique_ids)
+        return len(tweets) - len(imported_ids)
+
+class OffsetTracker:
+    """
+    Turn batches completed out of order into committed offsets
+
+    A source only advances to the end of the contiguous run of completed
+    batches, so a crash never checkpoints past a batch still in flight.
+    """
+
+    def __init__(self):
+        self._committed = {}
+        self._done = {}
+        self._ends = {}
+
+    def start(self, source, offset):
+        """Record the offset a source is read from, before any of its batches completes"""
+        self._committed.setdefault(source, offset)
+
+    def done(self, source, offset, count):
+        """
+        Record a completed batch
+
+        Returns:
+            int: New committed offset of the source, or None if unchanged
+        """
+        committed = self._committed[source]
+        self._done.setdefault(source, {})[offset] = count
+        done = self._done[source]
+        while committed in done:
+            committed += done.pop(committed)
+        if committed == self._committed[source]:
+            return None
+        self._committed[source] = committed
+        return committed
+
+    def finish(self, source, end):
+        """Record the end offset of a source"""
+        self._committed.setdefault(source, end)
+        self._ends[source] = end
+
+    def complete(self, source):
+        """Whether every batch of a finished source was committed"""
+        return self._ends.get(source) == self._committed.get(source)
+
+class StageTimings:
+    """Time spent in each stage of the import"""
+
+    def __init__(self, writers):
+        self.writers = writers
+        self.read = 0.0
+        self.queue_full = 0.0
+        self.write = 0.0
+        self.queue_empty = 0.0
+        self.start = time.perf_counter()
+
+    def report(self):
+        """Print the timings and the stage which limited the throughput"""
+        elapsed = time.perf_counter() - self.start
+        print(f"\n⏱️ Stage timings (wall clock {elapsed:.2f}s):")
+        print(f"- 📖 Read and decode: {self.read:.2f}s, "
+              f"waiting on a full queue {self.queue_full:.2f}s")
+        print(f"- 📝 Write: {self.write:.2f}s across {self.writers} writer(s), "
+              f"waiting on an empty queue {self.queue_empty / self.writers:.2f}s per writer")
+
+        # The producer waits when writers are too slow, writers wait when reading is too slow
+        if self.queue_full > self.queue_empty / self.writers:
+            print("🐢 Bottleneck: Redis writes (try more writers or larger batches)")
+        else:
+            print("🐢 Bottleneck: reading and decoding (try more --workers or a faster --json-backend)")
+
+async def import_batches(model, jobs, checkpoints, chunk_size=1000, writers=8, queue_size=None,
+                         progress=None):
+    """
+    Write batch jobs to Redis with concurrent pipelines
+
+    Args:
+        model (AsyncChirpRedisModel): Model the batches are written with
+        jobs (iterator): BatchJob items, pulled from a thread as they are needed
+        checkpoints (ImportCheckpoints): Checkpoints, updated in order from a thread
+        chunk_size (int): Number of chirps written per pipeline
+        writers (int): Number of pipelines in flight
+        queue_size (int, optional): Batches buffered between reading and writing (default: 2 per writer)
+        progress (tqdm, optional): Progress bar updated with each written batch
+
+    Returns:
+        tuple: (ImportStats, StageTimings)
+
+    Raises:
+        Exception: The first error of a writer, once the other writers stopped
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size or 2 * writers)
+    stats = ImportStats()
+    timings = StageTimings(writers)
+    tracker = OffsetTracker()
+
+    async def checkpoint(source, offset):
+        # A single thread runs the checkpoint writes, in the order they were made
+        if offset is not None:
+            await loop.run_in_executor(committer, checkpoints.commit, source, offset)
+        if tracker.complete(source):
+            await loop.run_in_executor(committer, checkpoints.complete, source)
+
+    async def produce():
+        while True:
+            start = time.perf_counter()
+            job = await loop.run_in_executor(reader, next, jobs, None)
+            timings.read += time.perf_counter() - start
+            if job is None:
+                break
+
+            tracker.start(job.source, job.offset)
+            if job.tweets is None:
+                tracker.finish(job.source, job.offset)
+                await checkpoint(job.source, None)
+                continue
+
+            start = time.perf_counter()
+            await queue.put(job)
+            timings.queue_full += time.perf_counter() - start
+
+        for _ in range(writers):
+            await queue.put(None)
+
+    async def write():
+        while True:
+            start = time.perf_counter()
+            job = await queue.get()
+            timings.queue_empty += time.perf_counter() - start
+            if job is None:
+                return
+
+            start = time.perf_counter()
+            imported_ids = await model.import_chirps(job.tweets, chunk_size=chunk_size)
+            timings.write += time.perf_counter() - start
+
+            skipped = stats.add(job.tweets, imported_ids)
+            if skipped:
+                print(f"⚠️ Warning: {skipped} tweet(s) with missing data skipped")
+            await checkpoint(job.source, tracker.done(job.source, job.offset, len(job.tweets)))
+            if progress is not None:
+                progress.update(len(job.tweets))
+
+    # A single reader thread, the tweet generators are not thread-safe
+    with ThreadPoolExecutor(max_workers=1) as reader, ThreadPoolExecutor(max_workers=1) as committer:
+        tasks = [asyncio.ensure_future(produce())]
+        tasks += [asyncio.ensure_future(write()) for _ in range(writers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    return stats, timings
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Import checkpoints stored in Redis
+
+Checkpoints live in the same database as the imported data, so they are
+reset together with it and can never describe data which is not there.
+"""
+
+import os
+
+CHECKPOINTS_KEY = "import:checkpoints"
+DONE = "done"
+
+class ImportCheckpoints:
+    """Track how many projected tweets of each source file were committed"""
+
+    def __init__(self, redis_client, key=CHECKPOINTS_KEY):
+        """
+        Initialize the checkpoints
+
+        Args:
+            redis_client (redis.Redis): Redis client of the imported database
+            key (str): Hash holding one field per source file
+        """
+        self.redis = redis_client
+        self.key = key
+
+    @staticmethod
+    def source_key(file_path):
+        """Identify a source file independently of the working directory"""
+        return os.path.abspath(file_path)
+
+    def offset(self, file_path):
+        """
+        Number of projected tweets of a file already committed
+
+        Returns:
+            int: Committed tweets, or None if the file was fully imported
+        """
+        value = self.redis.hget(self.key, self.source_key(file_path))
+        if value == DONE:
+            return None
+        return int(value or 0)
+
+    def completed(self):
+        """Source files which were fully imported"""
+        return {
+            source for source, value in self.redis.hgetall(self.key).items() if value == DONE
+        }
+
+    def commit(self, file_path, offset):
+        """Record that the first offset projected tweets of a file are in Redis"""
+        self.redis.hset(self.key, self.source_key(file_path), offset)
+
+    def complete(self, file_path):
+        """Record that a file was fully imported"""
+        self.redis.hset(self.key, self.source_key(file_path), DONE)
+
+    def clear(self):
+        """Forget all checkpoints"""
+        self.redis.delete(self.key)
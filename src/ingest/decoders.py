@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Pluggable JSON decoders for tweet ingestion
+
+Raw tweets carry dozens of fields but the data model only reads about a
+dozen of them. A TweetDecoder turns one raw JSON line into a compact
+projected record, using the fastest JSON parser installed (orjson, then
+pysimdjson, then the standard library). Lines that cannot be English
+tweets are rejected with a byte-level check before any parsing.
+"""
+
+import json
+
+# Fields read by ChirpRedisModel when importing a tweet
+TWEET_FIELDS = ("id", "text", "lang", "timestamp_ms", "created_at", "favorite_count", "retweet_count")
+USER_FIELDS = ("id", "name", "screen_name", "followers_count", "friends_count", "statuses_count",
+               "created_at", "profile_image_url_https")
+
+# Backends in order of preference
+BACKENDS = ("orjson", "simdjson", "json")
+
+_MISSING = object()
+
+def project_tweet(tweet):
+    """
+    Keep only the fields of a tweet (and of its user) read by the model
+
+    Works on any mapping with a get method, so parsers returning lazy
+    document proxies only materialize the projected fields.
+
+    Args:
+        tweet (dict): Decoded tweet
+
+    Returns:
+        dict: Projected tweet
+    """
+    record = {}
+    for field in TWEET_FIELDS:
+        value = tweet.get(field, _MISSING)
+        if value is not _MISSING:
+            record[field] = value
+
+    user = tweet.get('user')
+    if user is not None and hasattr(user, 'get'):
+        record['user'] = {}
+        for field in USER_FIELDS:
+            value = user.get(field, _MISSING)
+            if value is not _MISSING:
+                record['user'][field] = value
+
+    return record
+
+def _load_backend(name):
+    """
+    Return a function parsing a JSON document from bytes
+
+    Raises:
+        ImportError: If the backend is not installed
+        ValueError: If the backend is unknown
+    """
+    if name == "orjson":
+        import orjson
+        return orjson.loads
+    if name == "simdjson":
+        import simdjson
+        parser = simdjson.Parser()
+        return parser.parse
+    if name == "json":
+        return json.loads
+    raise ValueError(f"Unknown JSON backend: {name}")
+
+def available_backends():
+    """List the installed JSON backends, fastest first"""
+    available = []
+    for name in BACKENDS:
+        try:
+            _load_backend(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+class TweetDecoder:
+    """Decode raw JSON lines into projected tweets of a given language"""
+
+    def __init__(self, backend=None, lang='en'):
+        """
+        Initialize the decoder
+
+        Args:
+            backend (str, optional): JSON backend name, the fastest installed one if not given
+            lang (str): Language of the tweets to keep
+
+        Raises:
+            ImportError: If the requested backend is not installed
+            ValueError: If the requested backend is unknown
+        """
+        self.backend = backend or available_backends()[0]
+        self._loads = _load_backend(self.backend)
+        self.lang = lang
+        # Compact and spaced separators, as written by the Twitter API and json.dumps
+        self._markers = tuple(
+            f'"lang"{separator}"{lang}"'.encode() for separator in (':', ': ')
+        )
+
+    def might_match(self, line):
+        """Cheap byte-level check, False means the line is not a tweet of the language"""
+        return any(marker in line for marker in self._markers)
+
+    def accept(self, tweet):
+        """
+        Filter and project an already decoded tweet
+
+        Returns:
+            dict: Projected tweet, or None if the tweet is in another language
+        """
+        if tweet.get('lang') != self.lang:
+            return None
+        return project_tweet(tweet)
+
+    def decode(self, line):
+        """
+        Decode one raw JSON line
+
+        Args:
+            line (bytes): Raw JSON document
+
+        Returns:
+            dict: Projected tweet, or None if the line is invalid or in another language
+        """
+        if not self.might_match(line):
+            return None
+        try:
+            tweet = self._loads(line)
+        except ValueError:
+            return None
+        if not hasattr(tweet, 'get'):
+            return None
+        return self.accept(tweet)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Streaming readers and writers for tweet files
+
+Supported inputs are JSON arrays and line-by-line JSON files, optionally
+compressed in bz2, and directories of such files. The compact output
+format is a directory of chunked JSONL part files holding one projected
+English tweet per line, which can be read back with one worker per part.
+"""
+
+import bz2
+import io
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .decoders import TweetDecoder
+
+# Files picked up in directory mode: raw archives and compact part files
+DIRECTORY_PATTERNS = ("*.json.bz2", "part-*.jsonl")
+
+def open_tweet_file(file_path, mode='rt'):
+    """Open a JSON or BZ2 compressed JSON file as text or bytes"""
+    encoding = 'utf-8' if 't' in mode else None
+    if str(file_path).lower().endswith('.bz2'):
+        return bz2.open(file_path, mode, encoding=encoding)
+    return open(file_path, mode.replace('t', ''), encoding=encoding)
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """
+    Decode the items of a JSON array one at a time
+
+    The file is read in chunks, so only the item being decoded is held in
+    memory rather than the whole array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()[1:]  # Skip the opening bracket
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                # Truncated or invalid array, keep what was decoded so far
+                print("⚠️ Warning: Invalid JSON at the end of the array")
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+def read_tweets(file_path, decoder=None):
+    """
+    Stream the projected English tweets of a JSON array or line-by-line JSON file
+
+    Lines of line-by-line JSON files go through the decoder, which skips
+    non-English lines before parsing them.
+
+    Args:
+        file_path (str): Path to the JSON or JSON.BZ2 file
+        decoder (TweetDecoder, optional): Decoder to use (default: fastest installed backend)
+
+    Yields:
+        dict: Projected English tweet
+    """
+    decoder = decoder or TweetDecoder()
+
+    with open_tweet_file(file_path, 'rb') as f:
+        # Check if it's a JSON array or line-by-line JSON
+        first_char = f.read(1)
+        while first_char.isspace():
+            first_char = f.read(1)
+        f.seek(0)  # Reset to beginning
+
+        if first_char == b'[':
+            with io.TextIOWrapper(f, encoding='utf-8') as text:
+                for tweet in iter_json_array(text):
+                    record = decoder.accept(tweet)
+                    if record is not None:
+                        yield record
+        else:
+            for line in f:
+                record = decoder.decode(line)
+                if record is not None:
+                    yield record
+
+def parse_file(file_path, backend=None):
+    """
+    Decode, filter and project all the tweets of a file
+
+    Runs in a worker process in directory mode.
+
+    Args:
+        file_path (str): Path to the JSON or JSON.BZ2 file
+        backend (str, optional): JSON backend of the decoder
+
+    Returns:
+        list: Projected English tweets
+    """
+    return list(read_tweets(file_path, TweetDecoder(backend)))
+
+def list_tweet_files(dir_path):
+    """List the tweet files of a directory, in name order"""
+    paths = set()
+    for pattern in DIRECTORY_PATTERNS:
+        paths.update(str(path) for path in Path(dir_path).glob(pattern))
+    return sorted(paths)
+
+def iter_directory_files(dir_path, workers=None, backend=None, skip=()):
+    """
+    Parse every tweet file of a directory in parallel
+
+    Files are decompressed and parsed by a pool of processes. Results are
+    consumed in file order, with at most two files per worker in flight so
+    memory stays bounded.
+
+    Args:
+        dir_path (str): Directory containing .json.bz2 or part-*.jsonl files
+        workers (int, optional): Number of worker processes (default: CPU count)
+        backend (str, optional): JSON backend of the decoders
+        skip (iterable): Paths of files which should not be parsed
+
+    Yields:
+        tuple: (file path, list of projected English tweets)
+    """
+    skip = {os.path.abspath(path) for path in skip}
+    file_paths = [path for path in list_tweet_files(dir_path) if os.path.abspath(path) not in skip]
+    workers = workers or os.cpu_count() or 1
+    print(f"🔍 Found {len(file_paths)} tweet files, parsing with {workers} worker(s)")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        files = iter(file_paths)
+
+        for file_path in itertools.islice(files, 2 * workers):
+            pending.append((file_path, executor.submit(parse_file, file_path, backend)))
+
+        done = 0
+        try:
+            while pending:
+                file_path, future = pending.popleft()
+                try:
+                    records = future.result()
+                except Exception as e:
+                    print(f"❌ Error processing {file_path}: {e}")
+                    records = []
+
+                # Keep the pool busy while the records of this file are consumed
+                for next_path in itertools.islice(files, 1):
+                    pending.append((next_path, executor.submit(parse_file, next_path, backend)))
+
+                done += 1
+                print(f"  📂 [{done}/{len(file_paths)}] {os.path.basename(file_path)}: {len(records)} English tweets")
+                yield file_path, records
+        finally:
+            # Do not parse the remaining files if the consumer stopped early
+            for _, future in pending:
+                future.cancel()
+
+def iter_directory_records(dir_path, workers=None, backend=None):
+    """
+    Stream the projected English tweets of every tweet file of a directory
+
+    Args:
+        dir_path (str): Directory containing .json.bz2 or part-*.jsonl files
+        workers (int, optional): Number of worker processes (default: CPU count)
+        backend (str, optional): JSON backend of the decoders
+
+    Yields:
+        dict: Projected English tweet
+    """
+    for _, records in iter_directory_files(dir_path, workers, backend):
+        yield from records
+
+class ChunkedJsonlWriter:
+    """
+    Write projected tweets to numbered JSONL part files
+
+    Each part holds at most chunk_size tweets, one compact JSON document
+    per line, so parts can be read back in parallel.
+    """
+
+    def __init__(self, output_dir, chunk_size=50000):
+        """
+        Initialize the writer
+
+        Args:
+            output_dir (str): Directory receiving the part files
+            chunk_size (int): Maximum number of tweets per part file
+        """
+        self.output_dir = output_dir
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.parts = []
+        self._file = None
+        self._in_part = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Remove the parts of a previous run
+        for path in Path(output_dir).glob("part-*.jsonl"):
+            path.unlink()
+
+    def write(self, record):
+        """Append one projected tweet"""
+        if self._file is None or self._in_part >= self.chunk_size:
+            self._next_part()
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        self._file.write("\n")
+        self._in_part += 1
+        self.count += 1
+
+    def _next_part(self):
+        """Close the current part file and open the next one"""
+        self.close()
+        path = os.path.join(self.output_dir, f"part-{len(self.parts):05d}.jsonl")
+        self._file = open(path, 'w', encoding='utf-8')
+        self._in_part = 0
+        self.parts.append(path)
+
+    def close(self):
+        """Close the current part file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""
+Asyncio Redis Data Model for the Chirp application
+
+Same API as ChirpRedisModel, on redis.asyncio: every method is a coroutine,
+so a slow call never blocks the event loop and reads can fan out
+concurrently. Keys, records and cursors come from the shared schema module,
+and chirps are read back through the shared codecs whatever their layout.
+The async model only knows the plain keyspace: a single server, a single
+timeline and a hash per user, and it writes plain chirp hashes.
+"""
+
+import asyncio
+import base64
+import redis.asyncio as aioredis
+
+from .codecs import DEFLATED_FIELD, ENGAGEMENT_FIELDS, FAVORITE_FIELDS, RETWEET_FIELDS, chirp_engagement, get_codec
+from .id_generator import MAX_WORKER_ID, SnowflakeIdGenerator
+from .lua_scripts import ADD_USER, INCR_ENGAGEMENT, POST_CHIRP, SET_ENGAGEMENT
+from .schema import (
+    DICTIONARY, ID_WORKERS, POSTERS, STATS, TIMELINE, TIMELINE_MAX_SIZE,
+    TIMELINE_TRIMMED_SIZE, TOP_FOLLOWERS, TOP_LIKED, TOP_POSTERS, TOP_RECHIRPED, USERNAMES, chirp_id_from_key,
+    chirp_key, chirp_record, decode_cursor, next_cursor, parse_chirp, parse_user,
+    queue_records, user_key, user_record, users_created_elsewhere,
+)
+
+class AsyncChirpRedisModel:
+    def __init__(self, host='localhost', port=6379, db=0, worker_id=None, hydrate_chunk_size=100,
+                 codec="hash", cluster=False, timeline_buckets=None, user_buckets=None):
+        """
+        Initialize the Redis connection pool
+
+        The keyspace options of ChirpRedisModel are accepted so that callers
+        can pass their settings through, but only the plain layout is served.
+
+        Args:
+            host (str): Redis host
+            port (int): Redis port
+            db (int): Redis database
+            worker_id (int, optional): ID generator worker, leased from Redis if not given
+            hydrate_chunk_size (int): Chirps or users per pipeline when hydrating concurrently
+            codec (str): Storage codec of new chirps, only hash is supported
+            cluster (bool): Connect to a Redis Cluster, not supported
+            timeline_buckets (str, optional): Split the timeline by hour or day, not supported
+            user_buckets (int, optional): Number of user buckets, not supported
+
+        Raises:
+            ValueError: If the codec is not hash, or cluster mode, timeline buckets or
+                user buckets are asked for
+        """
+        if codec != "hash":
+            raise ValueError("The async model only writes plain chirp hashes, use ChirpRedisModel")
+        if cluster or timeline_buckets or user_buckets:
+            raise ValueError("The async model only knows a single timeline and user hashes, use ChirpRedisModel")
+
+        self.redis = aioredis.Redis(host=host, port=port, db=db, decode_responses=True)
+        self.hydrate_chunk_size = hydrate_chunk_size
+        self._worker_id = worker_id
+        self._id_generator = None
+        self._id_lock = asyncio.Lock()
+        # Reads any chirp layout, the zlib dictionary is loaded on the first deflated chirp
+        self.codec = get_codec(codec)
+
+        # Write paths run as cached server-side scripts (EVALSHA)
+        self._incr_engagement = self.redis.register_script(INCR_ENGAGEMENT)
+        self._set_engagement = self.redis.register_script(SET_ENGAGEMENT)
+        self._post_chirp = self.redis.register_script(POST_CHIRP)
+        self._add_user = self.redis.register_script(ADD_USER)
+
+    async def close(self):
+        """Close the connections of the pool"""
+        await self.redis.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def next_id(self):
+        """
+        Generate a unique, time-sortable ID for a chirp or a user
+
+        Returns:
+            str: New ID
+        """
+        if self._id_generator is None:
+            # Concurrent first calls lease a single worker ID
+            async with self._id_lock:
+                if self._id_generator is None:
+                    worker_id = self._worker_id
+                    if worker_id is None:
+                        worker_id = (await self.redis.incr(ID_WORKERS) - 1) % (MAX_WORKER_ID + 1)
+                    self._id_generator = SnowflakeIdGenerator(worker_id)
+
+        return str(self._id_generator.next_id())
+
+    async def reset_db(self):
+        """Reset the database"""
+        await self.redis.flushdb()
+        print("🗑️ Redis database reset.")
+
+    async def import_user(self, user_data):
+        """
+        Import user data into Redis
+
+        Args:
+            user_data (dict): User data extracted from the tweet
+
+        Returns:
+            str: ID of the imported user
+        """
+        user_id, user_hash = user_record(user_data)
+        await self._write_records({user_id: user_hash}, {})
+        return user_id
+
+    async def import_chirp(self, chirp_data):
+        """
+        Import a chirp into Redis (a chirp already imported is left untouched)
+
+        Args:
+            chirp_data (dict): Chirp data
+
+        Returns:
+            str: ID of the imported chirp
+        """
+        user_id, user_hash = user_record(chirp_data['user'])
+        chirp_id, record = chirp_record(chirp_data)
+        await self._write_records({user_id: user_hash}, {chirp_id: record})
+        return chirp_id
+
+    async def import_chirps(self, chirps, chunk_size=1000):
+        """
+        Import many chirps (and their users) into Redis
+
+        Same chunking, deduplication and idempotence as
+        ChirpRedisModel.import_chirps.
+
+        Args:
+            chirps (iterable): Chirp data dictionaries
+            chunk_size (int): Number of chirps written per pipeline
+
+        Returns:
+            list: IDs of the imported chirps
+        """
+        imported = []
+        users = {}
+        records = {}
+
+        for chirp_data in chirps:
+            try:
+                user_id, user_hash = user_record(chirp_data['user'])
+                chirp_id, record = chirp_record(chirp_data)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+            users[user_id] = user_hash
+            records[chirp_id] = record
+            imported.append(chirp_id)
+
+            if len(records) >= chunk_size:
+                await self._write_records(users, records)
+                users = {}
+                records = {}
+
+        if records:
+            await self._write_records(users, records)
+
+        return imported
+
+    async def _write_records(self, users, chirps):
+        """
+        Write projected users and chirps with two pipelines
+
+        Args:
+            users (dict): User hashes by user ID
+            chirps (dict): (chirp hash, timestamp) tuples by chirp ID
+        """
+        # Find out which users and chirps already exist
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in users:
+                pipe.exists(user_key(user_id))
+            for chirp_id in chirps:
+                pipe.exists(chirp_key(chirp_id))
+            existing = await pipe.execute()
+
+            # Chirps are written once, so re-importing them never resets their engagement
+            chirps = {
+                chirp_id: record
+                for (chirp_id, record), exists in zip(chirps.items(), existing[len(users):])
+                if not exists
+            }
+
+            queue_records(pipe, users, chirps, existing[:len(users)])
+            if chirps:
+                pipe.zcard(TIMELINE)
+            results = await pipe.execute()
+
+        duplicates = users_created_elsewhere(results, existing[:len(users)])
+        if duplicates:
+            await self.redis.hincrby(STATS, "users", -duplicates)
+
+        # Keep only the latest chirps in the timeline
+        timeline_size = results[-1] if chirps else 0
+        if timeline_size > TIMELINE_MAX_SIZE:
+            # Remove the oldest ones
+            to_remove = await self.redis.zrange(TIMELINE, 0, timeline_size - TIMELINE_TRIMMED_SIZE - 1)
+            if to_remove:
+                await self.redis.zrem(TIMELINE, *to_remove)
+
+    async def _hydrate(self, ids, key, parse, prepare=None):
+        """
+        Read hashes in chunks of pipelines sent concurrently
+
+        Each chunk runs on its own pooled connection, so a long list costs
+        about one round trip instead of one per chunk. The parse function
+        gets each ID with its stored hash, once the optional prepare
+        coroutine has seen all the stored hashes.
+        """
+        async def read_chunk(chunk):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for item_id in chunk:
+                    pipe.hgetall(key(item_id))
+                return await pipe.execute()
+
+        size = max(1, self.hydrate_chunk_size)
+        chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+        results = await asyncio.gather(*(read_chunk(chunk) for chunk in chunks))
+
+        stored = [data for chunk in results for data in chunk]
+        if prepare is not None:
+            await prepare(stored)
+
+        items = map(parse, ids, stored)
+        return [item for item in items if item is not None]
+
+    async def _load_dictionary(self, stored):
+        """Load the deflate dictionary of the zlib codec the first time a deflated chirp is read"""
+        if self.codec.dictionary is None and any(DEFLATED_FIELD in data for data in stored):
+            dictionary = await self.redis.get(DICTIONARY)
+            self.codec.dictionary = base64.b85decode(dictionary) if dictionary is not None else None
+
+    async def get_chirps(self, chirp_ids):
+        """
+        Get several chirps, hydrated concurrently
+
+        Args:
+            chirp_ids (list): Chirp IDs, in the order they should be returned
+
+        Returns:
+            list: List of chirps (missing chirps are skipped)
+        """
+        return await self._hydrate(list(chirp_ids), chirp_key,
+                                   lambda chirp_id, stored: parse_chirp(chirp_id, self.codec.decode(stored)),
+                                   self._load_dictionary)
+
+    async def get_users(self, user_ids):
+        """
+        Get several users, hydrated concurrently
+
+        Args:
+            user_ids (list): User IDs, in the order they should be returned
+
+        Returns:
+            list: List of users (missing users are skipped)
+        """
+        return await self._hydrate(list(user_ids), user_key,
+                                   lambda user_id, stored: parse_user(user_id, self.codec.decode_user(stored)))
+
+    async def get_latest_chirps(self, count=5):
+        """
+        Get the latest chirps
+
+        Args:
+            count (int): Number of chirps to retrieve
+
+        Returns:
+            list: List of chirps
+        """
+        chirp_ids = await self.redis.zrevrange(TIMELINE, 0, count - 1)
+        return await self.get_chirps(chirp_ids)
+
+    async def get_timeline_page(self, before=None, limit=5):
+        """
+        Get a page of the timeline, newest first
+
+        Args:
+            before (str, optional): Cursor returned with the previous page
+            limit (int): Number of chirps to retrieve
+
+        Returns:
+            tuple: (list of chirps, cursor of the next page or None)
+
+        Raises:
+            ValueError: If the limit is not positive or the cursor is malformed
+        """
+        if limit < 1:
+            raise ValueError("The page size must be positive")
+
+        chirp_ids, cursor = await self._timeline_slice(before, limit)
+        return await self.get_chirps(chirp_ids), cursor
+
+    async def iter_timeline(self, chunk_size=500):
+        """
+        Stream the whole timeline, newest first
+
+        Args:
+            chunk_size (int): Number of chirps fetched per chunk
+
+        Yields:
+            dict: Chirp data
+
+        Raises:
+            ValueError: If the chunk size is not positive
+        """
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be positive")
+
+        cursor = None
+        while True:
+            chirp_ids, cursor = await self._timeline_slice(cursor, chunk_size)
+            for chirp in await self.get_chirps(chirp_ids):
+                yield chirp
+            if cursor is None:
+                return
+
+    async def _timeline_slice(self, cursor, limit):
+        """Read the chirp IDs of one timeline page and the cursor of the next"""
+        max_score, offset = decode_cursor(cursor)
+        entries = await self.redis.zrevrangebyscore(
+            TIMELINE, max_score, "-inf",
+            start=offset, num=limit, withscores=True
+        )
+        chirp_ids = [chirp_id for chirp_id, _ in entries]
+        return chirp_ids, next_cursor(entries, max_score, offset, limit)
+
+    async def get_chirps_between(self, start, end, limit=100):
+        """
+        Get the chirps posted in a time range, newest first
+
+        Args:
+            start (float): Epoch second the range starts at, included
+            end (float): Epoch second the range ends at, included
+            limit (int): Maximum number of chirps to retrieve
+
+        Returns:
+            list: List of chirps, the latest of the range if it holds more than limit
+        """
+        chirp_ids = await self.redis.zrevrangebyscore(TIMELINE, end, start, start=0, num=limit)
+        return await self.get_chirps(chirp_ids)
+
+    async def get_top_users_by_followers(self, count=5):
+        """
+        Get users with the most followers
+
+        Args:
+            count (int): Number of users to retrieve
+
+        Returns:
+            list: List of users
+        """
+        user_ids = await self.redis.zrevrange(TOP_FOLLOWERS, 0, count - 1)
+        return await self.get_users(user_ids)
+
+    async def get_top_posters(self, count=5):
+        """
+        Get users who have posted the most chirps
+
+        Args:
+            count (int): Number of users to retrieve
+
+        Returns:
+            list: List of users
+        """
+        user_ids = await self.redis.zrevrange(TOP_POSTERS, 0, count - 1)
+        return await self.get_users(user_ids)
+
+    async def get_stats(self):
+        """
+        Get the number of chirps and users, without scanning the keyspace
+
+        Returns:
+            dict: Number of chirps, users and users who ever posted
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(STATS, "chirps", "users")
+            pipe.pfcount(POSTERS)
+            (chirps, users), posters = await pipe.execute()
+        return {"chirps": int(chirps or 0), "users": int(users or 0), "posters": posters}
+
+    async def post_chirp(self, user_id, text):
+        """
+        Post a new chirp
+
+        Args:
+            user_id (str): User ID
+            text (str): Chirp text
+
+        Returns:
+            str: ID of the created chirp
+
+        Raises:
+            ValueError: If the user doesn't exist
+        """
+        # Generate a unique ID, its timestamp is the timeline score
+        chirp_id = await self.next_id()
+        timestamp = SnowflakeIdGenerator.timestamp_ms(chirp_id) / 1000
+        now = int(timestamp)
+
+        # Create the chirp, index it and update the poster ranking atomically
+        created = await self._post_chirp(
+            keys=[user_key(user_id), chirp_key(chirp_id), TIMELINE,
+                  TOP_POSTERS, TOP_LIKED, TOP_RECHIRPED, STATS, POSTERS],
+            args=[user_id, chirp_id, repr(timestamp), text, now]
+        )
+        if created is None:
+            raise ValueError(f"User {user_id} doesn't exist")
+
+        return chirp_id
+
+    async def like_chirp(self, chirp_id):
+        """
+        Like a chirp (increment favorite count)
+
+        Args:
+            chirp_id (str): Chirp ID
+
+        Returns:
+            int: New favorite count
+
+        Raises:
+            ValueError: If the chirp doesn't exist
+        """
+        new_count = await self._incr_engagement(
+            keys=[chirp_key(chirp_id), TOP_LIKED],
+            args=[*FAVORITE_FIELDS, chirp_id]
+        )
+        if new_count is None:
+            raise ValueError(f"Chirp {chirp_id} doesn't exist")
+
+        return new_count
+
+    async def rechirp(self, chirp_id):
+        """
+        Rechirp a chirp (increment retweet count)
+
+        Args:
+            chirp_id (str): Chirp ID
+
+        Returns:
+            int: New retweet count
+
+        Raises:
+            ValueError: If the chirp doesn't exist
+        """
+        new_count = await self._incr_engagement(
+            keys=[chirp_key(chirp_id), TOP_RECHIRPED],
+            args=[*RETWEET_FIELDS, chirp_id]
+        )
+        if new_count is None:
+            raise ValueError(f"Chirp {chirp_id} doesn't exist")
+
+        return new_count
+
+    async def add_user(self, username, name, profile_image=''):
+        """
+        Add a new user to the database
+
+        Args:
+            username (str): Username (screen_name)
+            name (str): Full name of the user
+            profile_image (str, optional): Profile image URL
+
+        Returns:
+            str: ID of the created user
+
+        Raises:
+            ValueError: If the username already exists
+        """
+        user_id = await self.next_id()
+        now = SnowflakeIdGenerator.timestamp_ms(user_id) // 1000
+
+        # Reserve the username, save the user and add it to the rankings atomically
+        created = await self._add_user(
+            keys=[USERNAMES, user_key(user_id), TOP_FOLLOWERS, TOP_POSTERS, STATS],
+            args=[username, user_id, name, now, profile_image]
+        )
+        if created is None:
+            raise ValueError(f"The username @{username} already exists")
+
+        return user_id
+
+    async def set_engagement(self, chirp_id, favorite_count, retweet_count):
+        """
+        Overwrite the engagement metrics of a chirp and its rankings
+
+        Args:
+            chirp_id (str): Chirp ID
+            favorite_count (int): New favorite count
+            retweet_count (int): New retweet count
+        """
+        await self._set_engagement(
+            keys=[chirp_key(chirp_id), TOP_LIKED, TOP_RECHIRPED],
+            args=[chirp_id, favorite_count, retweet_count, FAVORITE_FIELDS[0], RETWEET_FIELDS[0],
+                  FAVORITE_FIELDS[1], RETWEET_FIELDS[1]]
+        )
+
+    async def rebuild_engagement_rankings(self, batch_size=1000):
+        """
+        Backfill the engagement rankings from the existing chirp hashes
+
+        Args:
+            batch_size (int): Number of chirps handled per round trip
+
+        Returns:
+            int: Number of chirps indexed
+        """
+        indexed = 0
+        batch = []
+
+        async for key in self.redis.scan_iter(match=chirp_key("*"), count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                indexed += await self._index_engagement(batch)
+                batch = []
+
+        if batch:
+            indexed += await self._index_engagement(batch)
+
+        return indexed
+
+    async def _index_engagement(self, chirp_keys):
+        """Add a batch of chirp hashes to the engagement rankings"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in chirp_keys:
+                pipe.hmget(key, ENGAGEMENT_FIELDS)
+            counts = await pipe.execute()
+
+            liked = {}
+            rechirped = {}
+            for key, values in zip(chirp_keys, counts):
+                chirp_id = chirp_id_from_key(key)
+                liked[chirp_id], rechirped[chirp_id] = chirp_engagement(values)
+
+            pipe.zadd(TOP_LIKED, liked)
+            pipe.zadd(TOP_RECHIRPED, rechirped)
+            await pipe.execute()
+
+        return len(chirp_keys)
+
+    async def get_top_liked_chirps(self, count=5):
+        """
+        Get chirps with the most likes
+
+        Args:
+            count (int): Number of chirps to retrieve
+
+        Returns:
+            list: List of chirps
+        """
+        top_chirp_ids = await self.redis.zrevrange(TOP_LIKED, 0, count - 1)
+        return await self.get_chirps(top_chirp_ids)
+
+    async def get_top_rechirped_chirps(self, count=5):
+        """
+        Get chirps with the most retweets
+
+        Args:
+            count (int): Number of chirps to retrieve
+
+        Returns:
+            list: List of chirps
+        """
+        top_chirp_ids = await self.redis.zrevrange(TOP_RECHIRPED, 0, count - 1)
+        return await self.get_chirps(top_chirp_ids)
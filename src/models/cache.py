@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+In-process cache of chirp and user hashes
+
+The top users and latest chirps are read again on every Streamlit rerun
+and CLI command. The cache keeps their hashes in an LRU bounded by a TTL
+and a memory budget, and drops an entry as soon as Redis reports that its
+key changed, so repeated reads skip the network.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+import redis
+
+from .schema import CHIRP_PREFIX, USER_PREFIX
+
+# How Redis reports changed keys: CLIENT TRACKING (Redis 6+) or keyspace
+# notifications, which need notify-keyspace-events to include Kghxe
+INVALIDATION_MODES = ("tracking", "keyspace")
+
+# Key prefixes of the cached hashes. User IDs are numeric, behind the hash
+# tag of their partition in cluster mode, which leaves out the rankings
+# sharing the users: prefix: their writes would drop nothing cached but
+# still bump the generation of the cache
+CACHED_PREFIXES = (CHIRP_PREFIX, *(f"{USER_PREFIX}{first}" for first in "0123456789{"))
+
+# Channel receiving the CLIENT TRACKING invalidations in redirect mode
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+def _entry_size(key, value):
+    """Approximate memory used by a cached hash, in bytes"""
+    return (sys.getsizeof(key) + sys.getsizeof(value)
+            + sum(sys.getsizeof(field) + sys.getsizeof(item) for field, item in value.items()))
+
+class HashCache:
+    """
+    LRU cache of Redis hashes with a TTL and a memory budget
+
+    Reads which started before an invalidation never store their (possibly
+    stale) replies: take a token before reading from Redis and pass it back
+    to put.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=60.0):
+        """
+        Args:
+            max_bytes (int): Memory budget of the cached hashes
+            ttl (float): Seconds an entry is served for, however quiet its key is
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def token(self):
+        """Token of the current generation, taken before reading from Redis"""
+        return self._generation
+
+    def get(self, key):
+        """
+        Look up a hash
+
+        Returns:
+            dict: Copy of the cached hash, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key, value, token):
+        """Store a hash read from Redis, unless an invalidation happened since the token was taken"""
+        size = _entry_size(key, value)
+        with self._lock:
+            if token != self._generation or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (dict(value), time.monotonic() + self.ttl, size)
+            self._bytes += size
+
+            # Evict the least recently used entries beyond the budget
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        """Drop the entries of changed keys"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry, when invalidations may have been missed"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        """
+        Counters of the cache
+
+        Returns:
+            dict: Hits, misses, evictions, invalidations, entries and bytes used
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+class InvalidationListener:
+    """
+    Drop cache entries when their keys change on a Redis server
+
+    In tracking mode a dedicated connection turns on CLIENT TRACKING in
+    broadcast mode for the cached prefixes, redirected to a subscribed
+    connection. In keyspace mode the subscribed connection listens to the
+    keyspace notifications of the prefixes. Either way a background
+    thread applies the invalidations, and clears the whole cache whenever
+    the connection drops, since invalidations may have been missed.
+    """
+
+    def __init__(self, client, cache, mode="tracking"):
+        """
+        Args:
+            client (redis.Redis): Client of the server whose keys are cached
+            cache (HashCache): Cache to invalidate
+            mode (str): One of INVALIDATION_MODES
+
+        Raises:
+            ValueError: If the mode is unknown or not supported by the server
+        """
+        if mode not in INVALIDATION_MODES:
+            raise ValueError(f"Unknown invalidation mode: {mode} "
+                             f"(expected one of {', '.join(INVALIDATION_MODES)})")
+        self.client = client
+        self.cache = cache
+        self.mode = mode
+        self._pool = None
+        self._pubsub = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+        try:
+            self._subscribe()
+        except redis.ResponseError as e:
+            self.close()
+            raise ValueError(f"The server does not support {mode} invalidation: {e}")
+
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def _subscribe(self):
+        """Open the listening connections and turn on the invalidation messages"""
+        # A pool of their own, the listening connections never return to the client's pool
+        pool = self.client.connection_pool
+        self._pool = redis.ConnectionPool(connection_class=pool.connection_class, **pool.connection_kwargs)
+        self._pubsub = redis.client.PubSub(self._pool)
+        if self.mode == "keyspace":
+            db = pool.connection_kwargs.get("db", 0)
+            self._pubsub.psubscribe(*(f"__keyspace@{db}__:{prefix}*" for prefix in CACHED_PREFIXES))
+            return
+
+        # The subscribed connection is opened first, tracking redirects to its ID
+        connection = self._pool.get_connection("CLIENT")
+        connection.send_command("CLIENT", "ID")
+        client_id = connection.read_response()
+        self._pubsub.connection = connection
+        self._pubsub.subscribe(INVALIDATE_CHANNEL)
+
+        # Tracking lasts as long as the connection which turned it on
+        tracking = self._pool.get_connection("CLIENT")
+        prefixes = [arg for prefix in CACHED_PREFIXES for arg in ("PREFIX", prefix)]
+        tracking.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST", *prefixes)
+        tracking.read_response()
+
+    def handle(self, message):
+        """Apply an invalidation message"""
+        if message["type"] == "message" and message["channel"] == INVALIDATE_CHANNEL:
+            # No keys means the database was flushed
+            if message["data"] is None:
+                self.cache.clear()
+            else:
+                self.cache.invalidate(message["data"])
+        elif message["type"] == "pmessage":
+            self.cache.invalidate([message["channel"].split("__:", 1)[1]])
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self._pubsub is None:
+                    self._subscribe()
+                message = self._pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    self.handle(message)
+            except (redis.ConnectionError, redis.TimeoutError, redis.ResponseError):
+                # Invalidations may have been missed while disconnected
+                self.cache.clear()
+                self._disconnect()
+                self._stopped.wait(1.0)
+
+    def _disconnect(self):
+        if self._pool is not None:
+            self._pool.disconnect()
+        self._pool = None
+        self._pubsub = None
+
+    def close(self):
+        """Stop listening and close the connections"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._disconnect()
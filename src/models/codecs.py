@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Storage codecs of the chirp hashes
+
+A codec decides how a chirp is laid out in its hash. Whatever the codec
+used to write a chirp, any codec reads it back: the layout is recognized
+from its fields. The engagement counters always stay hash fields of their
+own, so likes and rechirps remain a single HINCRBY of the counter the
+chirp is stored with. Recoding a database (ChirpRedisModel.recode_chirps)
+still needs the writers stopped.
+
+- hash: one field per chirp field, as projected from the tweets
+- compact: one-letter fields
+- packed: the fields which never change packed into a single field
+- zlib: packed, with the text deflated against a dictionary trained
+  on the dataset (only when that makes it shorter)
+
+Users keep their hash layout, the compact codecs only store the profile
+image URLs without their common prefix. With user buckets, each user is
+packed into a single field of a shared hash instead. Nothing in this
+module talks to Redis, the model stores the dictionary.
+"""
+
+import base64
+import zlib
+from collections import Counter
+
+from .schema import created_at_epoch
+
+# Fields of the compact layout, by chirp hash field
+COMPACT_FIELDS = {
+    "text": "t",
+    "user_id": "u",
+    "username": "n",
+    "created_at": "c",
+    "lang": "l",
+    "favorite_count": "f",
+    "retweet_count": "r",
+}
+
+# Single field of the packed layouts, and the order of the chirp fields packed in it
+PACKED_FIELD = "d"
+DEFLATED_FIELD = "z"
+PACKED_ORDER = ("user_id", "username", "created_at", "lang", "text")  # The text may hold the separator
+SEPARATOR = "\x1f"
+
+# Order of the user fields packed in a user bucket, chirp_count is the fourth
+# (the Lua scripts count on it) and the name, which may hold the separator, is last
+USER_PACKED_ORDER = (
+    "username", "follower_count", "following_count", "chirp_count", "created_at", "profile_image", "name",
+)
+
+# Fields holding the author and the engagement counters, in every layout
+AUTHOR_FIELDS = ("user_id", "u", PACKED_FIELD, DEFLATED_FIELD)
+ENGAGEMENT_FIELDS = ("favorite_count", "retweet_count", "f", "r")
+
+# Fields of each counter, in the hash layout then in the compact layouts
+FAVORITE_FIELDS = ("favorite_count", "f")
+RETWEET_FIELDS = ("retweet_count", "r")
+
+# Profile images are served from one host, the compact codecs store the path only
+PROFILE_IMAGE_PREFIX = "https://pbs.twimg.com/profile_images"
+
+# Bytes of the deflate dictionary, at most the 32 KiB window
+DICTIONARY_SIZE = 4096
+
+def _encode_date(created_at):
+    """Epoch second of a created_at field, or the field itself if it is not a date"""
+    try:
+        return created_at_epoch(created_at)
+    except ValueError:
+        return created_at
+
+def _encode_image(url):
+    """Profile image URL without the common prefix"""
+    if url and url.startswith(PROFILE_IMAGE_PREFIX + "/"):
+        return url[len(PROFILE_IMAGE_PREFIX):]
+    return url
+
+def _decode_image(value):
+    """Profile image URL of a stored value, with or without the common prefix"""
+    if value and value.startswith("/"):
+        return PROFILE_IMAGE_PREFIX + value
+    return value
+
+def train_dictionary(texts, size=DICTIONARY_SIZE):
+    """
+    Build a deflate dictionary from sample chirp texts
+
+    Deflate copies strings found in its window, so the dictionary is the
+    words and word pairs saving the most bytes over the samples, with the
+    most useful last, where they are the cheapest to refer to.
+
+    Args:
+        texts (iterable): Sample chirp texts
+        size (int): Maximum size of the dictionary in bytes
+
+    Returns:
+        bytes: Dictionary, empty without samples
+    """
+    counts = Counter()
+    for text in texts:
+        words = text.split()
+        counts.update(f"{word} " for word in words)
+        counts.update(f"{first} {second} " for first, second in zip(words, words[1:]))
+
+    picked = []
+    total = 0
+    # A string only saves bytes from its second occurrence on
+    for string, count in sorted(counts.items(), key=lambda item: (item[1] - 1) * len(item[0]), reverse=True):
+        encoded = string.encode()
+        if count < 2 or len(encoded) < 4:
+            continue
+        if total + len(encoded) > size:
+            break
+        picked.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(picked))
+
+class ChirpCodec:
+    """Plain layout, one field per chirp field"""
+
+    name = "hash"
+    needs_dictionary = False
+
+    def __init__(self, load_dictionary=None):
+        """
+        Args:
+            load_dictionary (callable, optional): Function returning the stored deflate
+                dictionary, or None if there is none yet
+        """
+        self._load_dictionary = load_dictionary
+        self.dictionary = None
+
+    def encode(self, chirp_hash):
+        """Hash fields storing a chirp hash"""
+        return dict(chirp_hash)
+
+    def encode_profile_image(self, url):
+        """Stored value of a profile image URL"""
+        return url
+
+    def encode_user(self, user_hash):
+        """Hash fields storing a user hash"""
+        return dict(user_hash, profile_image=self.encode_profile_image(user_hash["profile_image"]))
+
+    def has_dictionary(self):
+        """Whether the deflate dictionary is known, loading it if it was stored since"""
+        if self.dictionary is None and self._load_dictionary is not None:
+            self.dictionary = self._load_dictionary()
+        return self.dictionary is not None
+
+    def decode(self, stored):
+        """
+        Chirp hash of the stored fields of a chirp, in any layout
+
+        Raises:
+            ValueError: If the chirp is deflated and no dictionary was stored
+        """
+        if not stored:
+            return stored
+        if DEFLATED_FIELD in stored:
+            return self._unpack(stored, stored[DEFLATED_FIELD], self._inflate)
+        if PACKED_FIELD in stored:
+            return self._unpack(stored, stored[PACKED_FIELD])
+        if "t" in stored:
+            return {field: stored[short] for field, short in COMPACT_FIELDS.items() if short in stored}
+        return stored
+
+    def decode_user(self, stored):
+        """User hash of the stored fields of a user, whatever the codec which wrote it"""
+        if stored and "profile_image" in stored:
+            stored["profile_image"] = _decode_image(stored["profile_image"])
+        return stored
+
+    def pack_user(self, user_hash):
+        """Field value of a user hash in a user bucket, with an epoch-second date and a short profile image"""
+        values = dict(user_hash, created_at=_encode_date(user_hash.get("created_at")),
+                      profile_image=_encode_image(user_hash.get("profile_image")))
+        return SEPARATOR.join(str(values.get(field, "")) for field in USER_PACKED_ORDER)
+
+    def unpack_user(self, value):
+        """User hash of a field value of a user bucket, or None if the user is missing"""
+        if value is None:
+            return None
+        user_hash = dict(zip(USER_PACKED_ORDER, value.split(SEPARATOR, len(USER_PACKED_ORDER) - 1)))
+        user_hash["profile_image"] = _decode_image(user_hash.get("profile_image"))
+        return user_hash
+
+    def _unpack(self, stored, blob, decode_text=None):
+        """Chirp hash of a packed field and the counters next to it"""
+        chirp_hash = dict(zip(PACKED_ORDER, blob.split(SEPARATOR, len(PACKED_ORDER) - 1)))
+        if decode_text is not None:
+            chirp_hash["text"] = decode_text(chirp_hash.get("text", ""))
+        chirp_hash["favorite_count"] = stored.get("f")
+        chirp_hash["retweet_count"] = stored.get("r")
+        return chirp_hash
+
+    def _inflate(self, text):
+        """Text of a deflated text field"""
+        if not self.has_dictionary():
+            raise ValueError("The chirp text is deflated but the database has no dictionary")
+        inflater = zlib.decompressobj(wbits=-15, zdict=self.dictionary)
+        return (inflater.decompress(base64.b85decode(text)) + inflater.flush()).decode()
+
+class CompactCodec(ChirpCodec):
+    """One-letter fields"""
+
+    name = "compact"
+
+    def encode(self, chirp_hash):
+        stored = {COMPACT_FIELDS.get(field, field): value for field, value in chirp_hash.items()}
+        stored["c"] = _encode_date(chirp_hash.get("created_at"))
+        return stored
+
+    def encode_profile_image(self, url):
+        return _encode_image(url)
+
+class PackedCodec(CompactCodec):
+    """Fields which never change packed into one, next to the counters"""
+
+    name = "packed"
+
+    def encode(self, chirp_hash):
+        return {
+            PACKED_FIELD: self._pack(chirp_hash, chirp_hash.get("text", "")),
+            "f": chirp_hash.get("favorite_count", 0),
+            "r": chirp_hash.get("retweet_count", 0),
+        }
+
+    def _pack(self, chirp_hash, text):
+        """Packed field of a chirp hash, holding a stored text"""
+        values = dict(chirp_hash, created_at=_encode_date(chirp_hash.get("created_at")), text=text)
+        return SEPARATOR.join(str(values.get(field) or "") for field in PACKED_ORDER)
+
+class ZlibCodec(PackedCodec):
+    """Packed, with the text deflated against a trained dictionary"""
+
+    name = "zlib"
+    needs_dictionary = True
+
+    def encode(self, chirp_hash):
+        """
+        Hash fields storing a chirp hash
+
+        Raises:
+            ValueError: If no dictionary was stored yet
+        """
+        if not self.has_dictionary():
+            raise ValueError("The zlib codec needs a trained dictionary")
+        stored = super().encode(chirp_hash)
+        deflater = zlib.compressobj(level=9, wbits=-15, zdict=self.dictionary)
+        text = chirp_hash.get("text", "").encode()
+        deflated = base64.b85encode(deflater.compress(text) + deflater.flush()).decode()
+        # Short texts may come out longer, they are only packed
+        if len(deflated) < len(text):
+            stored[DEFLATED_FIELD] = self._pack(chirp_hash, deflated)
+            del stored[PACKED_FIELD]
+        return stored
+
+CODECS = {codec.name: codec for codec in (ChirpCodec, CompactCodec, PackedCodec, ZlibCodec)}
+
+def get_codec(name, load_dictionary=None):
+    """
+    Create a codec by name
+
+    Args:
+        name (str): Name of the codec: hash, compact, packed or zlib
+        load_dictionary (callable, optional): Function returning the stored deflate dictionary
+
+    Raises:
+        ValueError: If the codec is unknown
+    """
+    if name not in CODECS:
+        raise ValueError(f"Unknown storage codec: {name} (expected one of {', '.join(CODECS)})")
+    return CODECS[name](load_dictionary)
+
+def chirp_author(values):
+    """User ID of a chirp, from the values of AUTHOR_FIELDS in any layout"""
+    user_id, short, packed, deflated = values
+    blob = packed or deflated
+    return user_id or short or (blob.partition(SEPARATOR)[0] if blob else None)
+
+def chirp_engagement(values):
+    """(favorite count, retweet count) of a chirp, from the values of ENGAGEMENT_FIELDS in any layout"""
+    favorite_count, retweet_count, short_favorite, short_retweet = values
+    return int(favorite_count or short_favorite or 0), int(retweet_count or short_retweet or 0)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Redis connection pools and read-replica routing
+"""
+
+import itertools
+import threading
+import time
+import redis
+from redis.connection import DefaultParser, _HiredisParser, _RESP2Parser
+from redis.utils import HIREDIS_AVAILABLE
+
+# Reply parsers: hiredis if installed, hiredis or fail, pure Python
+PARSERS = ("auto", "hiredis", "python")
+
+REPLICA_STRATEGIES = ("round_robin", "least_latency")
+
+def parser_class(parser):
+    """
+    Resolve a reply parser name
+
+    Raises:
+        ValueError: If the parser is unknown, or hiredis is requested but not installed
+    """
+    if parser == "auto":
+        return DefaultParser
+    if parser == "hiredis":
+        if not HIREDIS_AVAILABLE:
+            raise ValueError("The hiredis parser was requested but hiredis is not installed")
+        return _HiredisParser
+    if parser == "python":
+        return _RESP2Parser
+    raise ValueError(f"Unknown parser: {parser} (expected one of {', '.join(PARSERS)})")
+
+def parse_endpoint(endpoint, default_port=6379):
+    """Turn "host:port", "host" or (host, port) into a (host, port) tuple"""
+    if isinstance(endpoint, (tuple, list)):
+        host, port = endpoint
+        return host, int(port)
+    host, _, port = str(endpoint).rpartition(":")
+    if not host:
+        return port, default_port
+    return host, int(port)
+
+def create_client(host='localhost', port=6379, db=0, max_connections=None, socket_timeout=None,
+                  socket_connect_timeout=None, socket_keepalive=False, parser="auto"):
+    """
+    Create a Redis client with its own configured connection pool
+
+    Args:
+        host (str): Redis host
+        port (int): Redis port
+        db (int): Redis database
+        max_connections (int, optional): Maximum number of pooled connections (default: unbounded)
+        socket_timeout (float, optional): Seconds to wait for a reply (default: forever)
+        socket_connect_timeout (float, optional): Seconds to wait for a connection (default: socket_timeout)
+        socket_keepalive (bool): Enable TCP keepalive on the connections
+        parser (str): Reply parser, one of PARSERS
+
+    Returns:
+        redis.Redis: Client returning decoded strings
+    """
+    pool = redis.ConnectionPool(
+        host=host, port=port, db=db, decode_responses=True,
+        max_connections=max_connections,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=socket_connect_timeout,
+        socket_keepalive=socket_keepalive,
+        parser_class=parser_class(parser),
+    )
+    return redis.Redis(connection_pool=pool)
+
+def create_cluster_client(host='localhost', port=6379, max_connections=None, socket_timeout=None,
+                          socket_connect_timeout=None, socket_keepalive=False):
+    """
+    Create a Redis Cluster client, discovering the nodes from one of them
+
+    Each node gets its own connection pool with the given options. The
+    cluster client picks its reply parser itself (hiredis if installed).
+
+    Args:
+        host (str): Host of any node of the cluster
+        port (int): Port of that node
+        max_connections (int, optional): Maximum pooled connections per node (default: unbounded)
+        socket_timeout (float, optional): Seconds to wait for a reply (default: forever)
+        socket_connect_timeout (float, optional): Seconds to wait for a connection
+        socket_keepalive (bool): Enable TCP keepalive on the connections
+
+    Returns:
+        redis.RedisCluster: Client returning decoded strings
+    """
+    options = {"max_connections": max_connections} if max_connections else {}
+    return redis.RedisCluster(
+        host=host, port=port, decode_responses=True,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=socket_connect_timeout,
+        socket_keepalive=socket_keepalive,
+        **options
+    )
+
+class ReplicaRouter:
+    """
+    Pick the read replica serving the next read
+
+    Round robin spreads reads evenly. Least latency sends them to the replica
+    which answered the last PING probe fastest; probes run at most once per
+    probe interval and unreachable replicas are left out until they answer.
+    """
+
+    def __init__(self, clients, strategy="round_robin", probe_interval=5.0):
+        """
+        Initialize the router
+
+        Args:
+            clients (list): Redis clients of the replicas
+            strategy (str): One of REPLICA_STRATEGIES
+            probe_interval (float): Seconds between latency probes
+
+        Raises:
+            ValueError: If there is no replica or the strategy is unknown
+        """
+        if not clients:
+            raise ValueError("At least one replica is required")
+        if strategy not in REPLICA_STRATEGIES:
+            raise ValueError(f"Unknown replica strategy: {strategy} "
+                             f"(expected one of {', '.join(REPLICA_STRATEGIES)})")
+
+        self.clients = list(clients)
+        self.strategy = strategy
+        self.probe_interval = probe_interval
+        self.latencies = [0.0] * len(self.clients)
+        self._cycle = itertools.cycle(self.clients)
+        self._lock = threading.Lock()
+        self._probed_at = None
+
+    def pick(self):
+        """
+        Choose a replica
+
+        Returns:
+            redis.Redis: Replica client, or None if no replica is reachable
+        """
+        if self.strategy == "round_robin":
+            with self._lock:
+                return next(self._cycle)
+
+        self._probe()
+        latency, client = min(zip(self.latencies, self.clients), key=lambda item: item[0])
+        return None if latency == float("inf") else client
+
+    def _probe(self):
+        """Measure the PING latency of every replica, unless done recently"""
+        now = time.monotonic()
+        with self._lock:
+            if self._probed_at is not None and now - self._probed_at < self.probe_interval:
+                return
+            self._probed_at = now
+
+            for i, client in enumerate(self.clients):
+                start = time.perf_counter()
+                try:
+                    client.ping()
+                    self.latencies[i] = time.perf_counter() - start
+                except (redis.ConnectionError, redis.TimeoutError):
+                    self.latencies[i] = float("inf")
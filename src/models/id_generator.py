@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Collision-free, time-sortable ID generator for chirps and users
+"""
+
+import threading
+import time
+
+# Same layout and epoch as Twitter's Snowflake IDs, so the IDs of posted
+# chirps sort chronologically with the IDs of imported tweets
+EPOCH_MS = 1288834974657
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+class SnowflakeIdGenerator:
+    """
+    Generate 64-bit IDs packing a timestamp, a worker ID and a sequence
+
+    IDs are generated locally without any Redis round trip. Up to 4096 IDs
+    are issued per millisecond and per worker; two processes never collide
+    as long as they use different worker IDs.
+    """
+
+    def __init__(self, worker_id):
+        """
+        Initialize the generator
+
+        Args:
+            worker_id (int): Worker ID, between 0 and 1023
+
+        Raises:
+            ValueError: If the worker ID is out of range
+        """
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker ID must be between 0 and {MAX_WORKER_ID}")
+
+        self.worker_id = worker_id
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _now_ms(self):
+        """Current time in milliseconds"""
+        return time.time_ns() // 1_000_000
+
+    def next_id(self):
+        """
+        Generate a new ID
+
+        Returns:
+            int: A unique ID, greater than every ID previously generated
+        """
+        with self._lock:
+            now = self._now_ms()
+
+            if now <= self._last_ms:
+                # Same millisecond, or the clock moved backwards
+                now = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted, wait for the next millisecond
+                    while now <= self._last_ms:
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+
+            self._last_ms = now
+            return ((now - EPOCH_MS) << TIMESTAMP_SHIFT) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    @staticmethod
+    def timestamp_ms(generated_id):
+        """
+        Extract the creation time of an ID
+
+        Args:
+            generated_id (int): ID produced by a generator
+
+        Returns:
+            int: Unix timestamp in milliseconds
+        """
+        return (int(generated_id) >> TIMESTAMP_SHIFT) + EPOCH_MS
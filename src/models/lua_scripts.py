@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Server-side Lua scripts for the Chirp write paths
+
+Each script turns a user action into a single atomic round trip. They are
+registered with redis-py's register_script, which runs them with EVALSHA
+and only sends the source again when the server script cache is empty.
+Missing chirps, users or duplicate usernames are reported by returning nil.
+"""
+
+# KEYS: chirp hash, ranking
+# ARGV: counter field of the hash layout, counter field of the compact layouts, chirp ID
+# The counter the chirp is stored with is incremented, whatever the codec of the model
+INCR_ENGAGEMENT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local field = ARGV[1]
+if redis.call('HEXISTS', KEYS[1], field) == 0 and redis.call('HEXISTS', KEYS[1], ARGV[2]) == 1 then
+    field = ARGV[2]
+end
+local count = redis.call('HINCRBY', KEYS[1], field, 1)
+redis.call('ZADD', KEYS[2], count, ARGV[3])
+return count
+"""
+
+# KEYS: chirp hash, top liked, top rechirped
+# ARGV: chirp ID, favorite count, retweet count, then the favorite and retweet count
+#       fields of the hash layout and of the compact layouts
+SET_ENGAGEMENT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local favorite, retweet = ARGV[4], ARGV[5]
+if redis.call('HEXISTS', KEYS[1], favorite) == 0 and redis.call('HEXISTS', KEYS[1], ARGV[6]) == 1 then
+    favorite, retweet = ARGV[6], ARGV[7]
+end
+redis.call('HSET', KEYS[1], favorite, ARGV[2], retweet, ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+return 1
+"""
+
+# KEYS: user hash, chirp hash, timeline, top posters, top liked, top rechirped, stats, posters[, timeline buckets]
+# ARGV: user ID, chirp ID, timestamp, text, created_at[, bucket start]
+POST_CHIRP = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local username = redis.call('HGET', KEYS[1], 'username') or ''
+redis.call('HSET', KEYS[2],
+    'text', ARGV[4],
+    'user_id', ARGV[1],
+    'username', username,
+    'created_at', ARGV[5],
+    'lang', 'en',
+    'favorite_count', 0,
+    'retweet_count', 0)
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[2])
+if KEYS[9] then
+    redis.call('ZADD', KEYS[9], ARGV[6], ARGV[6])
+end
+redis.call('ZADD', KEYS[5], 0, ARGV[2])
+redis.call('ZADD', KEYS[6], 0, ARGV[2])
+redis.call('HINCRBY', KEYS[7], 'chirps', 1)
+redis.call('PFADD', KEYS[8], ARGV[1])
+local count = redis.call('HINCRBY', KEYS[1], 'chirp_count', 1)
+redis.call('ZADD', KEYS[4], count, ARGV[1])
+return count
+"""
+
+# KEYS: username index, user hash, top followers, top posters, stats
+# ARGV: username, user ID, name, created_at, profile image
+ADD_USER = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return false
+end
+redis.call('HSET', KEYS[2],
+    'username', ARGV[1],
+    'name', ARGV[3],
+    'follower_count', 0,
+    'following_count', 0,
+    'chirp_count', 0,
+    'created_at', ARGV[4],
+    'profile_image', ARGV[5])
+redis.call('ZADD', KEYS[3], 0, ARGV[2])
+redis.call('ZADD', KEYS[4], 0, ARGV[2])
+redis.call('HINCRBY', KEYS[5], 'users', 1)
+return 1
+"""
+
+# The scripts below split POST_CHIRP and ADD_USER for partitioned keyspaces,
+# where a chirp and its author (or a user and its username) may live in
+# different cluster slots or servers. Each half is atomic on its own.
+
+# KEYS: user hash, top posters, posters
+# ARGV: user ID
+RECORD_POST = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+redis.call('PFADD', KEYS[3], ARGV[1])
+local count = redis.call('HINCRBY', KEYS[1], 'chirp_count', 1)
+redis.call('ZADD', KEYS[2], count, ARGV[1])
+return redis.call('HGET', KEYS[1], 'username') or ''
+"""
+
+# KEYS: user bucket, top posters, posters
+# ARGV: user ID
+# The user is a packed field value (see codecs.USER_PACKED_ORDER), chirp_count is its fourth field
+RECORD_BUCKET_POST = """
+local user = redis.call('HGET', KEYS[1], ARGV[1])
+if not user then
+    return false
+end
+local separator = string.char(31)
+local fields = {}
+for field in string.gmatch(user .. separator, '(.-)' .. separator) do
+    fields[#fields + 1] = field
+end
+local count = (tonumber(fields[4]) or 0) + 1
+fields[4] = tostring(count)
+redis.call('HSET', KEYS[1], ARGV[1], table.concat(fields, separator))
+redis.call('PFADD', KEYS[3], ARGV[1])
+redis.call('ZADD', KEYS[2], count, ARGV[1])
+return fields[1]
+"""
+
+# KEYS: chirp hash, timeline, top liked, top rechirped, stats[, timeline buckets]
+# ARGV: chirp ID, timestamp, bucket start (empty without buckets), then the chirp hash
+#       field/value pairs, as laid out by the storage codec
+CREATE_CHIRP = """
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+if KEYS[6] then
+    redis.call('ZADD', KEYS[6], ARGV[3], ARGV[3])
+end
+redis.call('ZADD', KEYS[3], 0, ARGV[1])
+redis.call('ZADD', KEYS[4], 0, ARGV[1])
+redis.call('HINCRBY', KEYS[5], 'chirps', 1)
+return 1
+"""
+
+# KEYS: user hash (or user bucket), top followers, top posters, stats
+# ARGV: user ID, then the user hash field/value pairs (or the user ID and the packed user)
+CREATE_USER = """
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('ZADD', KEYS[2], 0, ARGV[1])
+redis.call('ZADD', KEYS[3], 0, ARGV[1])
+redis.call('HINCRBY', KEYS[4], 'users', 1)
+return 1
+"""
+
+# KEYS: chirp hash, timeline, top liked, top rechirped, stats
+# ARGV: chirp ID
+DELETE_ORPHAN_CHIRP = """
+if redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    return 0
+end
+redis.call('UNLINK', KEYS[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('HINCRBY', KEYS[5], 'chirps', -1)
+return 1
+"""
+
+# KEYS: user hash, top followers, top posters, stats
+# ARGV: user ID, chirp count when the user was checked, start of the sweep (epoch second)
+# A user who posted since the check, or signed up after the sweep started, is kept
+DELETE_ORPHAN_USER = """
+if redis.call('HGET', KEYS[1], 'chirp_count') ~= ARGV[2] then
+    return 0
+end
+local created_at = tonumber(redis.call('HGET', KEYS[1], 'created_at'))
+if created_at and created_at >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('UNLINK', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('HINCRBY', KEYS[4], 'users', -1)
+return 1
+"""
+
+# KEYS: hash, then the sorted sets indexing it
+# ARGV: member ID, its score in each sorted set ('' when missing), then the field/value pairs copied
+# The hash is only removed from the source shard if it still holds what was copied
+DELETE_MOVED_HASH = """
+local rankings = #KEYS - 1
+for i = 1, rankings do
+    local score = redis.call('ZSCORE', KEYS[i + 1], ARGV[1])
+    local copied = ARGV[i + 1]
+    if (score == false) ~= (copied == '') or (score and tonumber(score) ~= tonumber(copied)) then
+        return 0
+    end
+end
+local first = rankings + 2
+if redis.call('HLEN', KEYS[1]) * 2 ~= #ARGV - first + 1 then
+    return 0
+end
+for i = first, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) ~= ARGV[i + 1] then
+        return 0
+    end
+end
+redis.call('UNLINK', KEYS[1])
+for i = 2, #KEYS do
+    redis.call('ZREM', KEYS[i], ARGV[1])
+end
+return 1
+"""
+
+# KEYS: username index
+# ARGV: username, user ID copied
+DELETE_MOVED_USERNAME = """
+if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+return redis.call('HDEL', KEYS[1], ARGV[1])
+"""
@@ -0,0 +1,148 @@
+"""
+Options of ChirpRedisModel shared by the entry points, read from the command line or the environment
+"""
+
+import os
+
+from .cache import INVALIDATION_MODES
+from .codecs import CODECS
+from .connections import PARSERS, REPLICA_STRATEGIES
+from .partitions import VIRTUAL_NODES
+from .schema import BUCKET_SIZES
+from .snapshots import SNAPSHOT_MAX_AGE
+
+# Prefix of the environment variables read by env_options
+ENV_PREFIX = "CHIRP_REDIS_"
+
+def add_model_arguments(parser, reads=True):
+    """
+    Add the options of ChirpRedisModel to the argument parser of an entry point
+
+    Args:
+        parser (argparse.ArgumentParser): Parser of the entry point
+        reads (bool): Also add the options which only serve reads (replicas, cache and snapshots)
+    """
+    parser.add_argument("--host", default="localhost", help="Redis host (default: localhost)")
+    parser.add_argument("--port", type=int, default=6379, help="Redis port (default: 6379)")
+    parser.add_argument("--db", type=int, default=0, help="Redis database (default: 0)")
+    parser.add_argument("--max-connections", type=int, help="Maximum pooled connections per server")
+    parser.add_argument("--socket-timeout", type=float, help="Seconds to wait for a Redis reply")
+    parser.add_argument("--parser", choices=PARSERS, default="auto",
+                        help="Reply parser (default: auto, hiredis when installed)")
+    parser.add_argument("--cluster", action="store_true",
+                        help="Connect to a Redis Cluster, host and port being any of its nodes")
+    parser.add_argument("--partitions", type=int, default=16,
+                        help="Keyspace partitions in cluster mode (default: 16)")
+    parser.add_argument("--shard", action="append", dest="shards", metavar="HOST:PORT",
+                        help="Shard of a sharded database, always in the same order (repeatable)")
+    parser.add_argument("--virtual-nodes", type=int, default=VIRTUAL_NODES,
+                        help=f"Ring points per shard of a sharded database (default: {VIRTUAL_NODES})")
+    parser.add_argument("--timeline-buckets", choices=sorted(BUCKET_SIZES),
+                        help="Split the timeline by hour or day instead of trimming it by size")
+    parser.add_argument("--retention-days", type=float, default=0,
+                        help="Days of chirps kept with timeline buckets (default: 0, keeps all)")
+    parser.add_argument("--codec", choices=sorted(CODECS), default="hash",
+                        help="Storage codec of new chirps (default: hash)")
+    parser.add_argument("--user-buckets", type=int,
+                        help="Pack the users into this many small hashes, about one per hundred users")
+    if not reads:
+        return
+    parser.add_argument("--replica", action="append", dest="replicas", metavar="HOST:PORT",
+                        help="Read replica serving the feed reads (repeatable)")
+    parser.add_argument("--replica-strategy", choices=REPLICA_STRATEGIES, default="round_robin",
+                        help="How reads are spread across replicas (default: round_robin)")
+    parser.add_argument("--cache", action="store_true", help="Cache chirp and user hashes in process")
+    parser.add_argument("--cache-invalidation", choices=INVALIDATION_MODES, default="tracking",
+                        help="How Redis reports changed keys to the cache (default: tracking)")
+    parser.add_argument("--cache-mb", type=float, default=16, help="Memory budget of the cache in MB (default: 16)")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="Serve the rankings and the first timeline page from snapshots")
+    parser.add_argument("--snapshot-max-age", type=float, default=SNAPSHOT_MAX_AGE,
+                        help=f"Seconds a snapshot is served for (default: {SNAPSHOT_MAX_AGE})")
+
+def model_options(args):
+    """
+    Keyword arguments of ChirpRedisModel from the options added by add_model_arguments
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        dict: Keyword arguments of ChirpRedisModel
+    """
+    options = {
+        "host": args.host,
+        "port": args.port,
+        "db": args.db,
+        "max_connections": args.max_connections,
+        "socket_timeout": args.socket_timeout,
+        "parser": args.parser,
+        "cluster": args.cluster,
+        "partitions": args.partitions,
+        "shards": args.shards,
+        "virtual_nodes": args.virtual_nodes,
+        "timeline_buckets": args.timeline_buckets,
+        "timeline_retention": args.retention_days * 86400 or None,
+        "codec": args.codec,
+        "user_buckets": args.user_buckets,
+    }
+    if hasattr(args, "replicas"):
+        options.update(
+            replicas=args.replicas,
+            replica_strategy=args.replica_strategy,
+            cache=args.cache,
+            cache_invalidation=args.cache_invalidation,
+            cache_max_bytes=int(args.cache_mb * 1024 * 1024),
+            snapshots=args.snapshots,
+            snapshot_max_age=args.snapshot_max_age,
+        )
+    return options
+
+def env_options(environ=None):
+    """
+    Keyword arguments of ChirpRedisModel from the CHIRP_REDIS_* environment variables
+
+    HOST, PORT and DB locate the database. CLUSTER (1, true or yes)
+    connects to a Redis Cluster split into PARTITIONS partitions. REPLICAS
+    and SHARDS are comma-separated HOST:PORT lists, with VIRTUAL_NODES ring
+    points per shard. CACHE is the invalidation mode of the cache,
+    SNAPSHOTS the maximum age of the snapshots in seconds,
+    TIMELINE_BUCKETS the bucket size (hour or day), RETENTION_DAYS the
+    retention window, CODEC the storage codec and USER_BUCKETS the number
+    of user buckets. Unset variables keep the defaults of the model.
+
+    Args:
+        environ (dict, optional): Environment to read (default: os.environ)
+
+    Returns:
+        dict: Keyword arguments of ChirpRedisModel
+    """
+    environ = os.environ if environ is None else environ
+
+    def env(name):
+        """Value of a variable, None if unset or empty"""
+        return environ.get(ENV_PREFIX + name) or None
+
+    def endpoints(name):
+        """HOST:PORT endpoints of a comma-separated variable, None if there are none"""
+        return [endpoint for endpoint in (env(name) or "").split(",") if endpoint] or None
+
+    options = {
+        "host": env("HOST") or "localhost",
+        "port": int(env("PORT") or 6379),
+        "db": int(env("DB") or 0),
+        "cluster": (env("CLUSTER") or "").lower() in ("1", "true", "yes"),
+        "partitions": int(env("PARTITIONS") or 16),
+        "replicas": endpoints("REPLICAS"),
+        "shards": endpoints("SHARDS"),
+        "virtual_nodes": int(env("VIRTUAL_NODES") or VIRTUAL_NODES),
+        "timeline_buckets": env("TIMELINE_BUCKETS"),
+        "timeline_retention": float(env("RETENTION_DAYS") or 0) * 86400 or None,
+        "codec": env("CODEC") or "hash",
+        "user_buckets": int(env("USER_BUCKETS")) if env("USER_BUCKETS") else None,
+    }
+    if env("CACHE"):
+        options.update(cache=True, cache_invalidation=env("CACHE"))
+    if env("SNAPSHOTS"):
+        options.update(snapshots=True, snapshot_max_age=float(env("SNAPSHOTS")))
+    return options
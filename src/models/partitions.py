@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Partitioning of the Chirp keyspace
+
+A partitioner maps each chirp, user and username to the partition holding
+it. Every partition keeps its own timeline and rankings, so global reads
+gather the top entries of each partition and merge them.
+"""
+
+import bisect
+import hashlib
+import heapq
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .schema import Partition
+
+def partition_hash(value):
+    """Hash of an ID or a username, stable across processes"""
+    return zlib.crc32(str(value).encode())
+
+def ring_hash(value):
+    """Position of a node or a key on the consistent hashing ring"""
+    return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], "big")
+
+# Ring points per shard, enough for the shards to get even shares of the keys
+VIRTUAL_NODES = 160
+
+def merge_ranked(entries, count):
+    """
+    K-way merge of sorted set ranges read in descending order
+
+    Ties are broken by member, descending, as Redis does, so the merged
+    ranking is the one a single sorted set would return.
+
+    Args:
+        entries (list): Lists of (member, score) tuples, one per partition
+        count (int): Number of entries to keep
+
+    Returns:
+        list: The top (member, score) tuples across the partitions
+    """
+    merged = heapq.merge(*entries, key=lambda entry: (entry[1], entry[0]), reverse=True)
+    return list(itertools.islice(merged, count))
+
+class SinglePartitioner:
+    """Everything in one partition, with the plain keys of a single server"""
+
+    def __init__(self, client):
+        self.partitions = [Partition(client)]
+        self.clients = [client]
+
+    def pipelines(self):
+        """Pipelines for a group of commands"""
+        return Pipelines()
+
+    def for_chirp(self, chirp_id):
+        """Partition of a chirp"""
+        return self.partitions[0]
+
+    def for_user(self, user_id):
+        """Partition of a user"""
+        return self.partitions[0]
+
+    def for_username(self, username):
+        """Partition of the username index entry of a user"""
+        return self.partitions[0]
+
+class HashTagPartitioner:
+    """
+    Spread the keyspace over hash-tagged partitions of a Redis Cluster
+
+    Chirps, users and usernames are assigned to one of N partitions by a
+    hash of their ID. The keys of a partition share a hash tag, so a chirp
+    and the sorted sets it is indexed in sit in the same slot, and the
+    cluster spreads the partitions over its nodes.
+    """
+
+    def __init__(self, client, count=16):
+        """
+        Args:
+            client (redis.RedisCluster): Cluster client
+            count (int): Number of partitions, several per node to balance the load
+
+        Raises:
+            ValueError: If there is no partition
+        """
+        if count < 1:
+            raise ValueError("At least one partition is required")
+        self.partitions = [Partition(client, f"p{i}") for i in range(count)]
+        self.clients = [client]
+
+    def pipelines(self):
+        """Pipelines for a group of commands, a cluster pipeline splits them by node"""
+        return Pipelines()
+
+    def _locate(self, value):
+        return self.partitions[partition_hash(value) % len(self.partitions)]
+
+    def for_chirp(self, chirp_id):
+        """Partition of a chirp"""
+        return self._locate(chirp_id)
+
+    def for_user(self, user_id):
+        """Partition of a user"""
+        return self._locate(user_id)
+
+    def for_username(self, username):
+        """Partition of the username index entry of a user"""
+        return self._locate(username)
+
+class ConsistentHashPartitioner:
+    """
+    Spread the keyspace over standalone Redis servers by consistent hashing
+
+    Each shard owns many points (virtual nodes) of a hash ring, and a key
+    belongs to the shard owning the first point after its hash. Adding a
+    shard only moves the keys which fall on its points, about 1/N of them.
+    Each shard is one untagged partition, and the commands of a group run
+    on every shard in parallel.
+    """
+
+    def __init__(self, nodes, virtual_nodes=VIRTUAL_NODES):
+        """
+        Args:
+            nodes (dict): Redis clients by node name ("host:port"), which places them on the ring
+            virtual_nodes (int): Ring points per shard
+
+        Raises:
+            ValueError: If there is no shard
+        """
+        if not nodes:
+            raise ValueError("At least one shard is required")
+        self.names = list(nodes)
+        self.clients = list(nodes.values())
+        self.partitions = [Partition(client) for client in self.clients]
+
+        ring = sorted(
+            (ring_hash(f"{name}#{i}"), index)
+            for index, name in enumerate(self.names)
+            for i in range(virtual_nodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [index for _, index in ring]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.clients)) if len(self.clients) > 1 else None
+
+    def pipelines(self):
+        """Pipelines for a group of commands, executed on the shards in parallel"""
+        return Pipelines(self._executor)
+
+    def _locate(self, value):
+        i = bisect.bisect(self._points, ring_hash(value)) % len(self._points)
+        return self.partitions[self._owners[i]]
+
+    def for_chirp(self, chirp_id):
+        """Partition of a chirp"""
+        return self._locate(chirp_id)
+
+    def for_user(self, user_id):
+        """Partition of a user"""
+        return self._locate(user_id)
+
+    def for_username(self, username):
+        """Partition of the username index entry of a user"""
+        return self._locate(username)
+
+class Pipelines:
+    """
+    One non-transactional pipeline per client, executed together
+
+    Commands are queued on the pipeline of the partition they target. A
+    cluster pipeline sends the commands of every node before reading the
+    replies, and the pipelines of several shards run in parallel threads,
+    so a whole group costs about one round trip.
+    """
+
+    def __init__(self, executor=None):
+        """
+        Args:
+            executor (Executor, optional): Runs the pipelines of several clients in parallel
+        """
+        self._pipes = {}
+        self._results = {}
+        self._executor = executor
+
+    def __call__(self, partition):
+        """Pipeline of the client of a partition"""
+        key = id(partition.client)
+        if key not in self._pipes:
+            self._pipes[key] = partition.client.pipeline(transaction=False)
+        return self._pipes[key]
+
+    def execute(self):
+        """Run the queued commands of every pipeline"""
+        pipes = list(self._pipes.values())
+        if self._executor is not None and len(pipes) > 1:
+            results = self._executor.map(lambda pipe: pipe.execute(), pipes)
+        else:
+            results = [pipe.execute() for pipe in pipes]
+        self._results = dict(zip(self._pipes, results))
+
+    def result(self, partition, index):
+        """Reply of a command, by its index in the pipeline of its partition"""
+        return self._results[id(partition.client)][index]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Rebalancing of a sharded keyspace after shards are added or removed
+
+Only the chirps, users and username index entries whose shard changes on
+the consistent hashing ring are moved, each with its scores in the
+timeline and rankings. A key is copied to its new shard before it is
+removed from the old one, so nothing is lost if the move is interrupted;
+running it again finishes the job. The removal is a script which checks
+that the key still holds what was copied, and a key written in between
+is copied again, so writes landing during its copy are not lost.
+
+Once a key is moved, the application only finds it on the new ring:
+stop the writers while the keys move and restart them on the new shards.
+
+The stats counters stay where they are, their sums across shards are
+still exact, but the posters of moved users may then be counted on two
+shards. Recount them with the stats migration, given the shards of the
+new ring (scripts/migrate_db.py stats --shard ...).
+"""
+
+from .lua_scripts import DELETE_MOVED_HASH, DELETE_MOVED_USERNAME
+from .partitions import VIRTUAL_NODES, ConsistentHashPartitioner
+from .schema import (
+    CHIRP_PREFIX, TIMELINE, TOP_FOLLOWERS, TOP_LIKED, TOP_POSTERS, TOP_RECHIRPED, USER_PREFIX,
+    USERNAMES, chirp_id_from_key, user_id_from_key,
+)
+from .sweeper import scan_batches
+
+# Hashes moved between shards: (kind, key pattern, ID of a key, sorted sets indexing them)
+MOVABLE_HASHES = (
+    ("chirps", f"{CHIRP_PREFIX}*", chirp_id_from_key, (TIMELINE, TOP_LIKED, TOP_RECHIRPED)),
+    ("users", f"{USER_PREFIX}*", user_id_from_key, (TOP_FOLLOWERS, TOP_POSTERS)),
+)
+
+# Copies of a key still being written before it is left on its source shard for the next run
+MOVE_ATTEMPTS = 5
+
+def rebalance(old_nodes, new_nodes, virtual_nodes=VIRTUAL_NODES, batch_size=500, dry_run=False):
+    """
+    Move the keys whose shard changes between two rings
+
+    Args:
+        old_nodes (dict): Redis clients by node name, before the change
+        new_nodes (dict): Redis clients by node name, after the change
+        virtual_nodes (int): Ring points per shard, as used by the model
+        batch_size (int): Number of keys moved per round trip
+        dry_run (bool): Only count the keys which would move
+
+    Returns:
+        dict: Number of moved chirps, users and usernames (keys still changing
+            after MOVE_ATTEMPTS copies stay behind and are not counted)
+    """
+    ring = ConsistentHashPartitioner(new_nodes, virtual_nodes)
+    names = {id(partition): name for name, partition in zip(ring.names, ring.partitions)}
+    moved = {"chirps": 0, "users": 0, "usernames": 0}
+
+    for name, client in old_nodes.items():
+        delete_moved = client.register_script(DELETE_MOVED_HASH)
+        for kind, pattern, key_id, rankings in MOVABLE_HASHES:
+            locate = ring.for_chirp if kind == "chirps" else ring.for_user
+            for keys in scan_batches(client, pattern, batch_size):
+                targets = [(key, locate(key_id(key))) for key in keys]
+                batch = [(key, target.client) for key, target in targets if names[id(target)] != name]
+                if batch:
+                    moved[kind] += _move_hashes(client, batch, key_id, rankings, delete_moved, dry_run)
+
+        moved["usernames"] += _move_usernames(name, client, ring, names, batch_size, dry_run)
+
+    return moved
+
+def _move_hashes(source, batch, key_id, rankings, delete_moved, dry_run):
+    """Copy a batch of hashes and their scores to their new shards, then remove those left unchanged"""
+    if dry_run:
+        return len(batch)
+
+    moved = 0
+    pending = batch
+    for _ in range(MOVE_ATTEMPTS):
+        if not pending:
+            break
+        pipe = source.pipeline(transaction=False)
+        for key, _ in pending:
+            pipe.hgetall(key)
+            for ranking in rankings:
+                pipe.zscore(ranking, key_id(key))
+        replies = pipe.execute()
+
+        targets = {}
+        copies = []
+        step = 1 + len(rankings)
+        for i, (key, target) in enumerate(pending):
+            data, scores = replies[i * step], replies[i * step + 1:(i + 1) * step]
+            # Drop the copy of an earlier attempt, the hash may have lost fields since
+            target_pipe = targets.setdefault(id(target), target.pipeline(transaction=False))
+            target_pipe.unlink(key)
+            if not data:
+                for ranking in rankings:
+                    target_pipe.zrem(ranking, key_id(key))
+                continue
+            target_pipe.hset(key, mapping=data)
+            for ranking, score in zip(rankings, scores):
+                if score is not None:
+                    target_pipe.zadd(ranking, {key_id(key): score})
+                else:
+                    target_pipe.zrem(ranking, key_id(key))
+            copies.append((key, target, data, scores))
+        for target_pipe in targets.values():
+            target_pipe.execute()
+
+        # Remove the hashes which still hold what was copied, the others are copied again
+        pipe = source.pipeline(transaction=False)
+        for key, _, data, scores in copies:
+            args = [key_id(key), *("" if score is None else repr(score) for score in scores)]
+            for field, value in data.items():
+                args += [field, value]
+            delete_moved(keys=[key, *rankings], args=args, client=pipe)
+        removed = pipe.execute()
+        moved += sum(removed)
+        pending = [(key, target) for (key, target, _, _), done in zip(copies, removed) if not done]
+
+    return moved
+
+def _move_usernames(name, source, ring, names, batch_size, dry_run):
+    """Move the username index entries of a shard to their new shards"""
+    entries = []
+    for username, user_id in source.hscan_iter(USERNAMES, count=batch_size):
+        target = ring.for_username(username)
+        if names[id(target)] != name:
+            entries.append((username, user_id, target.client))
+    if dry_run or not entries:
+        return len(entries)
+
+    delete_moved = source.register_script(DELETE_MOVED_USERNAME)
+    moved = 0
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        targets = {}
+        for username, user_id, target in batch:
+            targets.setdefault(id(target), target.pipeline(transaction=False)).hset(USERNAMES, username, user_id)
+        for target_pipe in targets.values():
+            target_pipe.execute()
+        # Entries released since they were read stay on the source, and their copies are dropped
+        pipe = source.pipeline(transaction=False)
+        for username, user_id, _ in batch:
+            delete_moved(keys=[USERNAMES], args=[username, user_id], client=pipe)
+        removed = pipe.execute()
+        moved += sum(removed)
+        for (username, _, target), done in zip(batch, removed):
+            if not done:
+                target.hdel(USERNAMES, username)
+
+    return moved
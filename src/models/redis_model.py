@@ -4,21 +4,275 @@ Redis Data Model for the Chirp application
 """
 
 import json
+import base64
 import redis
-import time
 import random
-from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from .cache import HashCache, InvalidationListener
+from .codecs import (
+    AUTHOR_FIELDS, ENGAGEMENT_FIELDS, FAVORITE_FIELDS, RETWEET_FIELDS, chirp_author, chirp_engagement, get_codec,
+    train_dictionary,
+)
+from .connections import ReplicaRouter, create_client, create_cluster_client, parse_endpoint
+from .id_generator import MAX_WORKER_ID, SnowflakeIdGenerator
+from .options import env_options, model_options
+from .lua_scripts import (
+    ADD_USER, CREATE_CHIRP, CREATE_USER, INCR_ENGAGEMENT, POST_CHIRP, RECORD_BUCKET_POST, RECORD_POST,
+    SET_ENGAGEMENT,
+)
+from .partitions import (
+    VIRTUAL_NODES, ConsistentHashPartitioner, HashTagPartitioner, SinglePartitioner, merge_ranked,
+)
+from .schema import (
+    BUCKET_SIZES, DICTIONARY, ID_WORKERS, POSTERS, STATS, TIMELINE, TIMELINE_BUCKETS, TIMELINE_MAX_SIZE,
+    TIMELINE_TRIMMED_SIZE, TOP_FOLLOWERS, TOP_LIKED, TOP_POSTERS, TOP_RECHIRPED, USER_BUCKET_PREFIX,
+    USER_PREFIX, USERNAMES, Partition, bucket_start, chirp_id_from_key, chirp_key, chirp_record,
+    created_at_epoch, decode_cursor, next_cursor, parse_chirp, parse_user, queue_records, timeline_bucket,
+    user_id_from_key, user_record, users_created_elsewhere,
+)
+from .snapshots import SNAPSHOT_MAX_AGE, SNAPSHOT_SIZE, SNAPSHOTS, SnapshotStore, top_items
+from .sweeper import scan_batches
 
 class ChirpRedisModel:
-    def __init__(self, host='localhost', port=6379, db=0):
-        """Initialize the Redis connection"""
-        self.redis = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+    def __init__(self, host='localhost', port=6379, db=0, worker_id=None, max_connections=None,
+                 socket_timeout=None, socket_connect_timeout=None, socket_keepalive=False,
+                 parser="auto", replicas=None, replica_strategy="round_robin", cluster=False,
+                 partitions=16, shards=None, virtual_nodes=VIRTUAL_NODES, cache=False,
+                 cache_max_bytes=16 * 1024 * 1024, cache_ttl=60.0, cache_invalidation="tracking",
+                 snapshots=False, snapshot_size=SNAPSHOT_SIZE, snapshot_max_age=SNAPSHOT_MAX_AGE,
+                 timeline_buckets=None, timeline_retention=None, codec="hash", user_buckets=None):
+        """
+        Initialize the Redis connection
+        
+        Writes always go to the primary. With replicas, the feed readers
+        (latest chirps, timeline pages and top-N rankings) are served by the
+        replicas, so they may lag slightly behind the latest writes.
+        
+        In cluster mode, host and port are any node of a Redis Cluster. The
+        keyspace is split into hash-tagged partitions, each with its own
+        timeline and rankings, which feed reads gather and merge.
+        
+        With shards, chirps, users and usernames are spread over standalone
+        servers by consistent hashing, and feed reads gather the shards in
+        parallel. The first shard also holds the ID worker counter, so it
+        must stay first when shards are added.
+        
+        With the cache, chirp and user hashes are kept in process and
+        dropped as soon as Redis reports that their keys changed, so
+        repeated reads of the same chirps and users skip the network.
+        
+        With snapshots, the rankings and the first timeline page are served
+        from pre-rendered blobs at the cost of one GET, and may lag up to
+        snapshot_max_age seconds behind the latest writes.
+        
+        With timeline buckets, the timeline is split into one sorted set per
+        hour or day instead of being trimmed by size, and reads walk the
+        buckets newest first. With a retention window, buckets older than
+        the window (counted back from the newest bucket) are dropped with
+        their chirps, at a cost growing with the number of chirps they
+        hold (see expire_timeline): posting into an imported archive then
+        drops every bucket older than the window before the post. Every writer of
+        a database must use the same bucket size.
+        
+        The codec only decides how new chirps are laid out in their hashes,
+        chirps written by any codec are read back the same way. The zlib
+        codec trains its dictionary on the first chirps it writes.
+        
+        With user buckets, users are not stored in a hash each but packed
+        into a field of one of a fixed number of shared hashes, which Redis
+        keeps in the compact listpack encoding while they hold fewer than
+        hash-max-listpack-entries fields (128 by default): pick about one
+        bucket per hundred users. User reads then bypass the cache. Every
+        writer of a database must use the same number of buckets.
+        
+        Args:
+            host (str): Redis host
+            port (int): Redis port
+            db (int): Redis database
+            worker_id (int, optional): ID generator worker, leased from Redis if not given
+            max_connections (int, optional): Maximum pooled connections per server (default: unbounded)
+            socket_timeout (float, optional): Seconds to wait for a reply (default: forever)
+            socket_connect_timeout (float, optional): Seconds to wait for a connection
+            socket_keepalive (bool): Enable TCP keepalive on the connections
+            parser (str): Reply parser: auto, hiredis or python
+            replicas (list, optional): Read replica endpoints, as "host:port" strings
+            replica_strategy (str): How reads are spread: round_robin or least_latency
+            cluster (bool): Connect to a Redis Cluster (db, parser and replicas do not apply)
+            partitions (int): Number of keyspace partitions in cluster mode
+            shards (list, optional): Shard endpoints, as "host:port" strings (host and port are then unused)
+            virtual_nodes (int): Ring points per shard
+            cache (bool): Cache chirp and user hashes in process (not in cluster mode)
+            cache_max_bytes (int): Memory budget of the cache
+            cache_ttl (float): Seconds a cached hash is served for at most
+            cache_invalidation (str): How changed keys are reported: tracking or keyspace
+            snapshots (bool): Serve the rankings and the first timeline page from snapshots
+            snapshot_size (int): Entries kept per snapshot, larger reads skip the snapshots
+            snapshot_max_age (float): Seconds a snapshot is served for before it is rebuilt
+            timeline_buckets (str, optional): Split the timeline by hour or day
+            timeline_retention (float, optional): Seconds of chirps kept with timeline buckets
+                (default: None, every bucket is kept)
+            codec (str): Storage codec of new chirps: hash, compact, packed or zlib
+            user_buckets (int, optional): Number of user buckets per partition, if users
+                are packed into them
+        
+        Raises:
+            ValueError: If replicas, cluster mode and shards are combined, if the
+                cache is used in cluster mode or its invalidation is not supported,
+                if the snapshot size or maximum age is not positive, if the
+                bucket size is unknown or longer than the retention window,
+                if the codec is unknown or if the number of user buckets is not positive
+        """
+        pool_options = {
+            "max_connections": max_connections,
+            "socket_timeout": socket_timeout,
+            "socket_connect_timeout": socket_connect_timeout,
+            "socket_keepalive": socket_keepalive,
+            "parser": parser,
+        }
+        if sum(map(bool, (replicas, cluster, shards))) > 1:
+            raise ValueError("Replicas, cluster mode and shards cannot be combined")
+        if cluster:
+            del pool_options["parser"]
+            self.redis = create_cluster_client(host, port, **pool_options)
+            self.partitioner = HashTagPartitioner(self.redis, partitions)
+        elif shards:
+            nodes = {
+                f"{shard_host}:{shard_port}": create_client(shard_host, shard_port, db, **pool_options)
+                for shard_host, shard_port in map(parse_endpoint, shards)
+            }
+            self.partitioner = ConsistentHashPartitioner(nodes, virtual_nodes)
+            self.redis = self.partitioner.clients[0]
+        else:
+            self.redis = create_client(host, port, db, **pool_options)
+            self.partitioner = SinglePartitioner(self.redis)
+        self.replicas = None
+        if replicas:
+            self.replicas = ReplicaRouter(
+                [create_client(*parse_endpoint(endpoint), db, **pool_options) for endpoint in replicas],
+                replica_strategy
+            )
+        self._worker_id = worker_id
+        self._id_generator = None
+        
+        self.cache = None
+        self._listeners = []
+        if cache:
+            if cluster:
+                raise ValueError("The cache is not supported in cluster mode")
+            self.cache = HashCache(cache_max_bytes, cache_ttl)
+            # Replicas replay the primary's writes, so the primary reports every change
+            self._listeners = [
+                InvalidationListener(client, self.cache, cache_invalidation)
+                for client in self.partitioner.clients
+            ]
+        self.snapshots = SnapshotStore(snapshot_size, snapshot_max_age) if snapshots else None
+        
+        self.bucket_seconds = None
+        self.timeline_retention = timeline_retention
+        self._newest_bucket = None
+        if timeline_buckets is not None:
+            if timeline_buckets not in BUCKET_SIZES:
+                raise ValueError(f"Unknown timeline bucket size: {timeline_buckets} "
+                                 f"(expected one of {', '.join(BUCKET_SIZES)})")
+            self.bucket_seconds = BUCKET_SIZES[timeline_buckets]
+            if timeline_retention is not None and timeline_retention < self.bucket_seconds:
+                raise ValueError("The retention window must hold at least one timeline bucket")
+        self.codec = get_codec(codec, self._load_dictionary)
+        if user_buckets is not None and user_buckets < 1:
+            raise ValueError("The number of user buckets must be positive")
+        self.user_buckets = user_buckets
+        
+        # Write paths run as cached server-side scripts (EVALSHA)
+        self._incr_engagement = self.redis.register_script(INCR_ENGAGEMENT)
+        self._set_engagement = self.redis.register_script(SET_ENGAGEMENT)
+        self._post_chirp = self.redis.register_script(POST_CHIRP)
+        self._add_user = self.redis.register_script(ADD_USER)
+        self._record_post = self.redis.register_script(RECORD_POST)
+        self._record_bucket_post = self.redis.register_script(RECORD_BUCKET_POST)
+        self._create_chirp = self.redis.register_script(CREATE_CHIRP)
+        self._create_user = self.redis.register_script(CREATE_USER)
+        
+    @classmethod
+    def from_args(cls, args, **overrides):
+        """
+        Create a model from the command-line options added by add_model_arguments
+        
+        Args:
+            args (argparse.Namespace): Parsed command line
+            **overrides: Other keyword arguments, taking precedence over the command line
+        
+        Returns:
+            ChirpRedisModel: New model
+        """
+        return cls(**{**model_options(args), **overrides})
+    
+    @classmethod
+    def from_env(cls, environ=None, **overrides):
+        """
+        Create a model from the CHIRP_REDIS_* environment variables (see env_options)
         
+        Args:
+            environ (dict, optional): Environment to read (default: os.environ)
+            **overrides: Other keyword arguments, taking precedence over the environment
+        
+        Returns:
+            ChirpRedisModel: New model
+        """
+        return cls(**{**env_options(environ), **overrides})
+    
+    def next_id(self):
+        """
+        Generate a unique, time-sortable ID for a chirp or a user
+        
+        The first call leases a worker ID from Redis (unless one was given),
+        later calls never leave the process.
+        
+        Returns:
+            str: New ID
+        """
+        if self._id_generator is None:
+            worker_id = self._worker_id
+            if worker_id is None:
+                worker_id = (self.redis.incr(ID_WORKERS) - 1) % (MAX_WORKER_ID + 1)
+            self._id_generator = SnowflakeIdGenerator(worker_id)
+        
+        return str(self._id_generator.next_id())
+    
+    def close(self):
+        """Stop the cache invalidation listeners"""
+        for listener in self._listeners:
+            listener.close()
+        self._listeners = []
+    
     def reset_db(self):
         """Reset the database"""
-        self.redis.flushdb()
+        for client in self.partitioner.clients:
+            client.flushdb()
+        if self.cache is not None:
+            self.cache.clear()
+        self.codec.dictionary = None
         print("🗑️ Redis database reset.")
     
+    def _load_dictionary(self):
+        """Deflate dictionary of the zlib codec, kept next to the ID worker counter"""
+        dictionary = self.redis.get(DICTIONARY)
+        return base64.b85decode(dictionary) if dictionary is not None else None
+    
+    def _prepare_codec(self, texts):
+        """
+        Train the dictionary of the zlib codec from the first texts written, unless one is stored
+        
+        The first writer to store a dictionary wins, and every writer then
+        uses that one.
+        """
+        if not texts or not self.codec.needs_dictionary or self.codec.has_dictionary():
+            return
+        dictionary = base64.b85encode(train_dictionary(texts)).decode()
+        self.redis.set(DICTIONARY, dictionary, nx=True)
+        self.codec.has_dictionary()
+    
     def import_user(self, user_data):
         """
         Import user data into Redis
@@ -29,81 +283,461 @@ class ChirpRedisModel:
         Returns:
             str: ID of the imported user
         """
-        user_id = str(user_data['id'])
+        user_id, user_hash = user_record(user_data)
+        self._write_records({user_id: user_hash}, {})
+        return user_id
+    
+    def import_chirp(self, chirp_data):
+        """
+        Import a chirp into Redis (a chirp already imported is left untouched)
         
-        # Check if the user already exists
-        if self.redis.exists(f"users:{user_id}"):
-            # Update counters only
-            self.redis.hset(f"users:{user_id}", "follower_count", user_data['followers_count'])
-            self.redis.hset(f"users:{user_id}", "following_count", user_data['friends_count'])
-            self.redis.hset(f"users:{user_id}", "chirp_count", user_data['statuses_count'])
-        else:
-            # Create a new user
-            user_hash = {
-                "username": user_data['screen_name'],
-                "name": user_data['name'],
-                "follower_count": user_data['followers_count'],
-                "following_count": user_data['friends_count'],
-                "chirp_count": user_data['statuses_count'],
-                "created_at": user_data['created_at'],
-                "profile_image": user_data.get('profile_image_url_https', '')
+        Args:
+            chirp_data (dict): Chirp data
+        
+        Returns:
+            str: ID of the imported chirp
+        """
+        user_id, user_hash = user_record(chirp_data['user'])
+        chirp_id, record = chirp_record(chirp_data)
+        self._write_records({user_id: user_hash}, {chirp_id: record})
+        return chirp_id
+    
+    def import_chirps(self, chirps, chunk_size=1000):
+        """
+        Import many chirps (and their users) into Redis
+        
+        Chirps are written in chunks through non-transactional pipelines,
+        which costs two round trips per chunk instead of about ten per
+        chirp. Users appearing several times in a chunk are written once,
+        from their last-seen record. Chirps with missing data are skipped.
+        
+        Imports are idempotent: chirps already in the database are left
+        untouched and users get the same counters again, so a batch can be
+        safely replayed after a crash.
+        
+        Args:
+            chirps (iterable): Chirp data dictionaries
+            chunk_size (int): Number of chirps written per pipeline
+        
+        Returns:
+            list: IDs of the imported chirps
+        """
+        imported = []
+        users = {}
+        records = {}
+        
+        for chirp_data in chirps:
+            try:
+                user_id, user_hash = user_record(chirp_data['user'])
+                chirp_id, record = chirp_record(chirp_data)
+            except (KeyError, TypeError, ValueError):
+                continue
+            
+            users[user_id] = user_hash
+            records[chirp_id] = record
+            imported.append(chirp_id)
+            
+            if len(records) >= chunk_size:
+                self._write_records(users, records)
+                users = {}
+                records = {}
+        
+        if records:
+            self._write_records(users, records)
+        
+        return imported
+    
+    def _write_records(self, users, chirps):
+        """
+        Write projected users and chirps with two pipelines per server
+        
+        Args:
+            users (dict): User hashes by user ID
+            chirps (dict): (chirp hash, timestamp) tuples by chirp ID
+        """
+        partitioner = self.partitioner
+        user_groups = {}
+        chirp_groups = {}
+        for user_id, user_hash in users.items():
+            user_groups.setdefault(partitioner.for_user(user_id), {})[user_id] = user_hash
+        for chirp_id, record in chirps.items():
+            chirp_groups.setdefault(partitioner.for_chirp(chirp_id), {})[chirp_id] = record
+        partitions = list(dict.fromkeys([*user_groups, *chirp_groups]))
+        
+        # Find out which users and chirps already exist
+        pipes = partitioner.pipelines()
+        checks = {}
+        for partition in partitions:
+            pipe = pipes(partition)
+            checks[partition] = len(pipe)
+            for user_id in user_groups.get(partition, {}):
+                if self.user_buckets is None:
+                    pipe.exists(partition.user_key(user_id))
+                else:
+                    # The stored user is merged with the imported counters
+                    pipe.hget(partition.user_bucket_key(user_id, self.user_buckets), user_id)
+            for chirp_id in chirp_groups.get(partition, {}):
+                pipe.exists(partition.chirp_key(chirp_id))
+        pipes.execute()
+        
+        # Usernames and posters are partitioned on their own when the keyspace is split
+        new_usernames = {} if len(partitioner.partitions) > 1 else None
+        new_posters = set() if len(partitioner.partitions) > 1 else None
+        timeline_sizes = {}
+        writes = {}
+        newest_bucket = None
+        for partition in partitions:
+            partition_users = user_groups.get(partition, {})
+            partition_chirps = chirp_groups.get(partition, {})
+            index = checks[partition]
+            existing = [pipes.result(partition, index + i)
+                        for i in range(len(partition_users) + len(partition_chirps))]
+            
+            # Chirps are written once, so re-importing them never resets their engagement
+            partition_chirps = {
+                chirp_id: record
+                for (chirp_id, record), exists in zip(partition_chirps.items(), existing[len(partition_users):])
+                if not exists
             }
-            self.redis.hset(f"users:{user_id}", mapping=user_hash)
             
-            # Add to the username index
-            self.redis.hset("usernames", user_data['screen_name'], user_id)
+            pipe = pipes(partition)
+            self._prepare_codec([chirp_hash["text"] for chirp_hash, _ in partition_chirps.values()])
+            start = len(pipe)
+            queue_records(pipe, partition_users, partition_chirps, existing[:len(partition_users)],
+                          partition, new_usernames, self.bucket_seconds, new_posters, self.codec,
+                          self.user_buckets)
+            writes[partition] = (start, len(pipe), existing[:len(partition_users)])
+            if partition_chirps and self.bucket_seconds is None:
+                timeline_sizes[partition] = len(pipe)
+                pipe.zcard(partition.key(TIMELINE))
+            elif partition_chirps:
+                newest = max(timestamp for _, timestamp in partition_chirps.values())
+                newest_bucket = max(newest_bucket or 0, bucket_start(newest, self.bucket_seconds))
+        
+        for username, user_id in (new_usernames or {}).items():
+            partition = partitioner.for_username(username)
+            pipes(partition).hset(partition.key(USERNAMES), username, user_id)
+        for user_id in new_posters or ():
+            partition = partitioner.for_user(user_id)
+            pipes(partition).pfadd(partition.key(POSTERS), user_id)
+        pipes.execute()
+        
+        # Concurrent writers may all have counted the same new user, take back the copies
+        fixes = partitioner.pipelines()
+        for partition, (start, end, existing_users) in writes.items():
+            replies = [pipes.result(partition, index) for index in range(start, end)]
+            duplicates = users_created_elsewhere(replies, existing_users, new_usernames is None)
+            if duplicates:
+                fixes(partition).hincrby(partition.key(STATS), "users", -duplicates)
+        fixes.execute()
+        self._invalidate(
+            [partition.user_key(user_id) for partition, group in user_groups.items() for user_id in group]
+        )
+        if newest_bucket is not None:
+            self._bucket_written(newest_bucket)
+        
+        # Keep only the latest chirps in each timeline
+        max_size = TIMELINE_MAX_SIZE // len(partitioner.partitions)
+        trimmed_size = TIMELINE_TRIMMED_SIZE // len(partitioner.partitions)
+        for partition, index in timeline_sizes.items():
+            timeline_size = pipes.result(partition, index)
+            if timeline_size > max_size:
+                # Remove the oldest ones
+                timeline = partition.key(TIMELINE)
+                to_remove = partition.client.zrange(timeline, 0, timeline_size - trimmed_size - 1)
+                if to_remove:
+                    partition.client.zrem(timeline, *to_remove)
+    
+    def get_chirps(self, chirp_ids):
+        """
+        Get several chirps in a single round trip
         
-        # Update rankings
-        self.redis.zadd("users:top_followers", {user_id: int(user_data['followers_count'])})
-        self.redis.zadd("users:top_posters", {user_id: int(user_data['statuses_count'])})
+        Args:
+            chirp_ids (list): Chirp IDs, in the order they should be returned
         
-        return user_id
+        Returns:
+            list: List of chirps (missing chirps are skipped)
+        """
+        return self._hydrate_chirps(self.partitioner, chirp_ids)
     
-    def import_chirp(self, chirp_data):
+    def get_users(self, user_ids):
         """
-        Import a chirp into Redis
+        Get several users in a single round trip
         
         Args:
-            chirp_data (dict): Chirp data
+            user_ids (list): User IDs, in the order they should be returned
         
         Returns:
-            str: ID of the imported chirp
+            list: List of users (missing users are skipped)
         """
-        chirp_id = str(chirp_data['id'])
-        user_id = str(chirp_data['user']['id'])
-        timestamp = int(chirp_data['timestamp_ms']) / 1000  # Convert to seconds
-        
-        # Import the user first
-        self.import_user(chirp_data['user'])
-        
-        # Ensure favorite_count and retweet_count have values and are integers
-        favorite_count = int(chirp_data.get('favorite_count', 0))
-        retweet_count = int(chirp_data.get('retweet_count', 0))
-        
-        # Create the chirp
-        chirp_hash = {
-            "text": chirp_data['text'],
-            "user_id": user_id,
-            "username": chirp_data['user']['screen_name'],
-            "created_at": chirp_data['created_at'],
-            "lang": chirp_data['lang'],
-            "favorite_count": favorite_count,
-            "retweet_count": retweet_count
-        }
-        self.redis.hset(f"chirp:{chirp_id}", mapping=chirp_hash)
+        return self._hydrate_users(self.partitioner, user_ids)
+    
+    def get_user_id(self, username):
+        """
+        Look up a user by username
         
-        # Add to timeline
-        self.redis.zadd("chirps:timeline", {chirp_id: timestamp})
+        Args:
+            username (str): Username (screen_name)
         
-        # Keep only the 100000 latest chirps in the timeline
-        timeline_size = self.redis.zcard("chirps:timeline")
-        if timeline_size > 100000:
-            # Remove the oldest ones
-            to_remove = self.redis.zrange("chirps:timeline", 0, timeline_size - 1001)
-            if to_remove:
-                self.redis.zrem("chirps:timeline", *to_remove)
+        Returns:
+            str: User ID, or None if the username doesn't exist
+        """
+        partition = self.partitioner.for_username(username)
+        return partition.client.hget(partition.key(USERNAMES), username)
+    
+    def get_usernames(self):
+        """
+        Get every username
         
-        return chirp_id
+        Returns:
+            list: Usernames
+        """
+        pipes = self.partitioner.pipelines()
+        indexes = []
+        for partition in self.partitioner.partitions:
+            pipe = pipes(partition)
+            indexes.append((partition, len(pipe)))
+            pipe.hkeys(partition.key(USERNAMES))
+        pipes.execute()
+        return [username for partition, index in indexes for username in pipes.result(partition, index)]
+    
+    def get_stats(self):
+        """
+        Get the number of chirps and users, without scanning the keyspace
+        
+        The counters are maintained by the write paths, which only count
+        new records, and the users who posted are estimated by a
+        HyperLogLog (within 1%), so this costs one round trip whatever
+        the size of the database.
+        
+        Returns:
+            dict: Number of chirps, users and users who ever posted
+        """
+        def read(partitioner):
+            pipes = partitioner.pipelines()
+            indexes = []
+            for partition in partitioner.partitions:
+                pipe = pipes(partition)
+                indexes.append((partition, len(pipe)))
+                pipe.hmget(partition.key(STATS), "chirps", "users")
+                pipe.pfcount(partition.key(POSTERS))
+            pipes.execute()
+            
+            stats = {"chirps": 0, "users": 0, "posters": 0}
+            for partition, index in indexes:
+                chirps, users = pipes.result(partition, index)
+                stats["chirps"] += int(chirps or 0)
+                stats["users"] += int(users or 0)
+                stats["posters"] += pipes.result(partition, index + 1)
+            return stats
+        
+        return self._read(read)
+    
+    def _hydrate_chirps(self, partitioner, chirp_ids):
+        """Read chirp hashes in a single round trip per server"""
+        return self._hydrate(partitioner.pipelines(), chirp_ids, partitioner.for_chirp, Partition.chirp_key,
+                             lambda chirp_id, stored: parse_chirp(chirp_id, self.codec.decode(stored)),
+                             fill=partitioner is self.partitioner)
+    
+    def _hydrate_users(self, partitioner, user_ids):
+        """Read user hashes (or user bucket fields) in a single round trip per server"""
+        if self.user_buckets is not None:
+            return self._hydrate(partitioner.pipelines(), user_ids, partitioner.for_user,
+                                 lambda partition, user_id: partition.user_bucket_key(user_id,
+                                                                                      self.user_buckets),
+                                 lambda user_id, stored: parse_user(user_id, self.codec.unpack_user(stored)),
+                                 field=True)
+        return self._hydrate(partitioner.pipelines(), user_ids, partitioner.for_user, Partition.user_key,
+                             lambda user_id, stored: parse_user(user_id, self.codec.decode_user(stored)),
+                             fill=partitioner is self.partitioner)
+    
+    def _hydrate(self, pipes, ids, locate, key, parse, field=False, fill=True):
+        """
+        Read the hashes of chirps or users, located by partition, in a single round trip per server
+        
+        Cached hashes are served from the cache, and only the others are read.
+        With field, each item is the field named by its ID in the hash at its
+        key, and is never cached since the cache holds whole hashes. Without
+        fill, the hashes read are not cached: a lagging replica may return a
+        hash older than the invalidation the primary already sent.
+        """
+        cache = self.cache if not field else None
+        token = cache.token() if cache is not None else None
+        replies = []
+        for item_id in ids:
+            partition = locate(item_id)
+            item_key = key(partition, item_id)
+            cached = cache.get(item_key) if cache is not None else None
+            if cached is not None:
+                replies.append(cached)
+                continue
+            pipe = pipes(partition)
+            replies.append((partition, len(pipe), item_key))
+            if field:
+                pipe.hget(item_key, item_id)
+            else:
+                pipe.hgetall(item_key)
+        pipes.execute()
+        
+        items = []
+        for item_id, reply in zip(ids, replies):
+            if isinstance(reply, tuple):
+                partition, index, item_key = reply
+                reply = pipes.result(partition, index)
+                if reply and cache is not None and fill:
+                    cache.put(item_key, reply, token)
+            item = parse(item_id, reply)
+            if item is not None:
+                items.append(item)
+        return items
+    
+    def _invalidate(self, keys):
+        """Drop the cached hashes of keys this model just wrote"""
+        if self.cache is not None:
+            self.cache.invalidate(keys)
+    
+    def _read(self, action):
+        """
+        Run a feed read on a replica, or on the primary without replicas
+        
+        Args:
+            action (callable): Function of the partitioner serving the read
+        """
+        client = self.replicas.pick() if self.replicas else None
+        if client is None:
+            return action(self.partitioner)
+        try:
+            return action(SinglePartitioner(client))
+        except (redis.ConnectionError, redis.TimeoutError):
+            # The replica is unreachable, the primary can always serve the read
+            return action(self.partitioner)
+    
+    def _top_ids(self, partitioner, name, count):
+        """IDs of the top members of a sorted set split over the partitions"""
+        partitions = partitioner.partitions
+        if len(partitions) == 1 and not (name == TIMELINE and self.bucket_seconds):
+            partition = partitions[0]
+            return partition.client.zrevrange(partition.key(name), 0, count - 1)
+        return [member for member, _ in self._top_entries(partitioner, name, count)]
+    
+    def _top_entries(self, partitioner, name, count):
+        """
+        Top (member, score) tuples of a sorted set split over the partitions
+        
+        Each partition returns its own top entries in one pipelined
+        scatter, and a k-way merge keeps the best of them.
+        """
+        if name == TIMELINE and self.bucket_seconds:
+            return self._bucket_entries(partitioner, "+inf", count)
+        partitions = partitioner.partitions
+        if len(partitions) == 1:
+            partition = partitions[0]
+            return partition.client.zrevrange(partition.key(name), 0, count - 1, withscores=True)
+        
+        pipes = partitioner.pipelines()
+        indexes = []
+        for partition in partitions:
+            pipe = pipes(partition)
+            indexes.append((partition, len(pipe)))
+            pipe.zrevrange(partition.key(name), 0, count - 1, withscores=True)
+        pipes.execute()
+        
+        return merge_ranked([pipes.result(partition, index) for partition, index in indexes], count)
+    
+    def _bucket_entries(self, partitioner, max_score, count, min_score="-inf"):
+        """
+        Top (chirp ID, score) tuples of a bucketed timeline, from a maximum score down to a minimum one
+        
+        The buckets of each partition are read newest first, one per
+        pipelined round until every partition has enough chirps or no
+        bucket left, and the partitions are merged.
+        """
+        max_start = max_score if max_score == "+inf" else bucket_start(float(max_score), self.bucket_seconds)
+        min_start = min_score if min_score == "-inf" else bucket_start(float(min_score), self.bucket_seconds)
+        pipes = partitioner.pipelines()
+        indexes = []
+        for partition in partitioner.partitions:
+            pipe = pipes(partition)
+            indexes.append((partition, len(pipe)))
+            pipe.zrevrangebyscore(partition.key(TIMELINE_BUCKETS), max_start, min_start)
+        pipes.execute()
+        walks = [(partition, iter(pipes.result(partition, index)), []) for partition, index in indexes]
+        
+        while True:
+            pipes = partitioner.pipelines()
+            reads = []
+            for partition, buckets, entries in walks:
+                start = next(buckets, None) if len(entries) < count else None
+                if start is None:
+                    continue
+                pipe = pipes(partition)
+                reads.append((partition, len(pipe), entries))
+                pipe.zrevrangebyscore(partition.key(timeline_bucket(start)), max_score, min_score,
+                                      start=0, num=count - len(entries), withscores=True)
+            if not reads:
+                break
+            pipes.execute()
+            for partition, index, entries in reads:
+                entries.extend(pipes.result(partition, index))
+        
+        return merge_ranked([entries for _, _, entries in walks], count)
+    
+    def _ranked(self, name, count, hydrate):
+        """
+        Read the top chirps or users of a sorted set, from its snapshot when enabled
+        
+        Args:
+            name (str): Sorted set
+            count (int): Number of chirps or users to retrieve
+            hydrate (callable): Reads the chirps or users of IDs through a partitioner
+        """
+        def read(partitioner):
+            if self.snapshots is not None and count <= self.snapshots.size:
+                return top_items(self._snapshot(partitioner, name), count)[1]
+            return hydrate(partitioner, self._top_ids(partitioner, name, count))
+        
+        return self._read(read)
+    
+    def _snapshot(self, partitioner, name):
+        """Read the snapshot of a sorted set, rebuilding it if it is missing or expired"""
+        snapshot = self.snapshots.read(partitioner.clients[0], name)
+        if snapshot is None:
+            snapshot = self.materialize(name)
+        return snapshot
+    
+    def materialize(self, name):
+        """
+        Rebuild the snapshot of a sorted set from the live rankings
+        
+        Snapshots are always written to the primary (or the first shard),
+        and replicas serve them once replicated.
+        
+        Args:
+            name (str): Sorted set, one of SNAPSHOTS
+        
+        Returns:
+            dict: Snapshot
+        
+        Raises:
+            ValueError: If snapshots are disabled
+        """
+        if self.snapshots is None:
+            raise ValueError("Snapshots are disabled")
+        entries = self._top_entries(self.partitioner, name, self.snapshots.size)
+        hydrate = self._hydrate_chirps if SNAPSHOTS[name] == "chirp" else self._hydrate_users
+        items = hydrate(self.partitioner, [member for member, _ in entries])
+        return self.snapshots.write(self.redis, name, entries, items)
+    
+    def refresh_snapshots(self):
+        """
+        Rebuild every snapshot, so that readers never have to
+        
+        Returns:
+            int: Number of rebuilt snapshots
+        """
+        for name in SNAPSHOTS:
+            self.materialize(name)
+        return len(SNAPSHOTS)
     
     def get_latest_chirps(self, count=5):
         """
@@ -115,26 +749,177 @@ class ChirpRedisModel:
         Returns:
             list: List of chirps
         """
-        chirp_ids = self.redis.zrevrange("chirps:timeline", 0, count - 1)
-        chirps = []
+        return self._ranked(TIMELINE, count, self._hydrate_chirps)
+    
+    def get_timeline_page(self, before=None, limit=5):
+        """
+        Get a page of the timeline, newest first
+        
+        Pages are addressed by score rather than by offset, so a deep page
+        costs the same as the first one. With snapshots, the first page is
+        served from the snapshot of the timeline.
+        
+        Args:
+            before (str, optional): Cursor returned with the previous page
+            limit (int): Number of chirps to retrieve
         
-        for chirp_id in chirp_ids:
-            chirp_data = self.redis.hgetall(f"chirp:{chirp_id}")
-            if chirp_data:
-                # Ensure favorite_count and retweet_count are integers
-                try:
-                    chirp_data['favorite_count'] = int(chirp_data.get('favorite_count', 0))
-                    chirp_data['retweet_count'] = int(chirp_data.get('retweet_count', 0))
-                except (ValueError, TypeError):
-                    # If conversion fails, assign default values
-                    chirp_data['favorite_count'] = 0
-                    chirp_data['retweet_count'] = 0
-                
-                # Add chirp ID to the data
-                chirp_data['chirp_id'] = chirp_id
-                chirps.append(chirp_data)
-        
-        return chirps
+        Returns:
+            tuple: (list of chirps, cursor of the next page or None)
+        
+        Raises:
+            ValueError: If the limit is not positive or the cursor is malformed
+        """
+        if limit < 1:
+            raise ValueError("The page size must be positive")
+        
+        def read_page(partitioner):
+            if before is None and self.snapshots is not None and limit <= self.snapshots.size:
+                entries, chirps = top_items(self._snapshot(partitioner, TIMELINE), limit)
+                return chirps, next_cursor(entries, "+inf", 0, limit)
+            chirp_ids, cursor = self._timeline_slice(before, limit, partitioner)
+            return self._hydrate_chirps(partitioner, chirp_ids), cursor
+        
+        return self._read(read_page)
+    
+    def iter_timeline(self, chunk_size=500):
+        """
+        Stream the whole timeline, newest first
+        
+        Only one chunk of chirps is held in memory at a time, and each
+        chunk costs one range read plus one pipelined hydrate.
+        
+        Args:
+            chunk_size (int): Number of chirps fetched per chunk
+        
+        Yields:
+            dict: Chirp data
+        
+        Raises:
+            ValueError: If the chunk size is not positive
+        """
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be positive")
+        
+        cursor = None
+        while True:
+            chirp_ids, cursor = self._timeline_slice(cursor, chunk_size)
+            yield from self.get_chirps(chirp_ids)
+            if cursor is None:
+                return
+    
+    def _timeline_slice(self, cursor, limit, partitioner=None):
+        """Read the chirp IDs of one timeline page and the cursor of the next"""
+        max_score, offset = decode_cursor(cursor)
+        partitioner = partitioner or self.partitioner
+        partitions = partitioner.partitions
+        if self.bucket_seconds:
+            # Ties skipped by offset all sit in the bucket of the maximum score
+            entries = self._bucket_entries(partitioner, max_score, offset + limit)[offset:]
+        elif len(partitions) == 1:
+            partition = partitions[0]
+            entries = partition.client.zrevrangebyscore(
+                partition.key(TIMELINE), max_score, "-inf",
+                start=offset, num=limit, withscores=True
+            )
+        else:
+            # Every partition may hold the whole page, ties skipped by offset included
+            pipes = partitioner.pipelines()
+            indexes = []
+            for partition in partitions:
+                pipe = pipes(partition)
+                indexes.append((partition, len(pipe)))
+                pipe.zrevrangebyscore(partition.key(TIMELINE), max_score, "-inf",
+                                      start=0, num=offset + limit, withscores=True)
+            pipes.execute()
+            entries = merge_ranked(
+                [pipes.result(partition, index) for partition, index in indexes], offset + limit
+            )[offset:]
+        
+        chirp_ids = [chirp_id for chirp_id, _ in entries]
+        return chirp_ids, next_cursor(entries, max_score, offset, limit)
+    
+    def get_chirps_between(self, start, end, limit=100):
+        """
+        Get the chirps posted in a time range, newest first
+        
+        The range is read from the timeline scores, so it costs the same
+        wherever it falls. Chirps trimmed out of the timeline, or dropped
+        with their timeline bucket, are not found.
+        
+        Args:
+            start (float): Epoch second the range starts at, included
+            end (float): Epoch second the range ends at, included
+            limit (int): Maximum number of chirps to retrieve
+        
+        Returns:
+            list: List of chirps, the latest of the range if it holds more than limit
+        """
+        def read(partitioner):
+            if self.bucket_seconds:
+                entries = self._bucket_entries(partitioner, end, limit, start)
+            else:
+                pipes = partitioner.pipelines()
+                indexes = []
+                for partition in partitioner.partitions:
+                    pipe = pipes(partition)
+                    indexes.append((partition, len(pipe)))
+                    pipe.zrevrangebyscore(partition.key(TIMELINE), end, start, start=0, num=limit, withscores=True)
+                pipes.execute()
+                entries = merge_ranked([pipes.result(partition, index) for partition, index in indexes], limit)
+            return self._hydrate_chirps(partitioner, [chirp_id for chirp_id, _ in entries])
+        
+        return self._read(read)
+    
+    def chirps_per_interval(self, start, end, interval=3600):
+        """
+        Count the chirps posted in each interval of a time range, without reading any chirp
+        
+        Only the timeline scores of the range are read, one range per
+        partition (or timeline bucket), and they are binned in a single
+        vectorized pass. Like get_chirps_between, only the chirps still in
+        the timeline are counted.
+        
+        Args:
+            start (float): Epoch second the first interval starts at
+            end (float): Epoch second the range ends at, excluded
+            interval (float): Length of the intervals in seconds
+        
+        Returns:
+            pandas.Series: Number of chirps by interval start (UTC), intervals without chirps included
+        
+        Raises:
+            ValueError: If the interval is not positive
+        """
+        if interval <= 0:
+            raise ValueError("The interval must be positive")
+        
+        def read(partitioner):
+            timelines = [(partition, partition.key(TIMELINE)) for partition in partitioner.partitions]
+            if self.bucket_seconds:
+                pipes = partitioner.pipelines()
+                indexes = []
+                for partition in partitioner.partitions:
+                    pipe = pipes(partition)
+                    indexes.append((partition, len(pipe)))
+                    pipe.zrangebyscore(partition.key(TIMELINE_BUCKETS), bucket_start(start, self.bucket_seconds),
+                                       f"({end}")
+                pipes.execute()
+                timelines = [(partition, partition.key(timeline_bucket(bucket)))
+                             for partition, index in indexes for bucket in pipes.result(partition, index)]
+            
+            pipes = partitioner.pipelines()
+            indexes = []
+            for partition, timeline in timelines:
+                pipe = pipes(partition)
+                indexes.append((partition, len(pipe)))
+                pipe.zrangebyscore(timeline, start, f"({end}", withscores=True)
+            pipes.execute()
+            return [pipes.result(partition, index) for partition, index in indexes]
+        
+        scores = np.array([score for entries in self._read(read) for _, score in entries], dtype=float)
+        starts = np.arange(start, end, interval, dtype=float)
+        counts = np.bincount(((scores - start) // interval).astype(int), minlength=len(starts))
+        return pd.Series(counts[:len(starts)], index=pd.to_datetime(starts, unit="s", utc=True), name="chirps")
     
     def get_top_users_by_followers(self, count=5):
         """
@@ -146,15 +931,7 @@ class ChirpRedisModel:
         Returns:
             list: List of users
         """
-        user_ids = self.redis.zrevrange("users:top_followers", 0, count - 1)
-        users = []
-        
-        for user_id in user_ids:
-            user_data = self.redis.hgetall(f"users:{user_id}")
-            if user_data:
-                users.append(user_data)
-        
-        return users
+        return self._ranked(TOP_FOLLOWERS, count, self._hydrate_users)
     
     def get_top_posters(self, count=5):
         """
@@ -166,15 +943,7 @@ class ChirpRedisModel:
         Returns:
             list: List of users
         """
-        user_ids = self.redis.zrevrange("users:top_posters", 0, count - 1)
-        users = []
-        
-        for user_id in user_ids:
-            user_data = self.redis.hgetall(f"users:{user_id}")
-            if user_data:
-                users.append(user_data)
-        
-        return users
+        return self._ranked(TOP_POSTERS, count, self._hydrate_users)
     
     def post_chirp(self, user_id, text):
         """
@@ -186,43 +955,159 @@ class ChirpRedisModel:
         
         Returns:
             str: ID of the created chirp
+        
+        Raises:
+            ValueError: If the user doesn't exist
         """
-        # Check if the user exists
-        if not self.redis.exists(f"users:{user_id}"):
+        # Generate a unique ID, its timestamp is the timeline score
+        chirp_id = self.next_id()
+        timestamp = SnowflakeIdGenerator.timestamp_ms(chirp_id) / 1000
+        now = int(timestamp)
+        
+        user_partition = self.partitioner.for_user(user_id)
+        chirp_partition = self.partitioner.for_chirp(chirp_id)
+        timeline, bucket_keys, bucket_args = self._timeline_keys(chirp_partition, timestamp)
+        if user_partition is chirp_partition and self.codec.name == "hash" and self.user_buckets is None:
+            # Create the chirp, index it and update the poster ranking atomically
+            created = self._post_chirp(
+                keys=[user_partition.user_key(user_id), chirp_partition.chirp_key(chirp_id),
+                      timeline, user_partition.key(TOP_POSTERS),
+                      chirp_partition.key(TOP_LIKED), chirp_partition.key(TOP_RECHIRPED),
+                      chirp_partition.key(STATS), user_partition.key(POSTERS), *bucket_keys],
+                args=[user_id, chirp_id, repr(timestamp), text, now, *bucket_args],
+                client=user_partition.client
+            )
+            if created is None:
+                raise ValueError(f"User {user_id} doesn't exist")
+            self._invalidate([user_partition.user_key(user_id)])
+            self._bucket_written(*bucket_args)
+            return chirp_id
+        
+        # A script cannot span partitions, nor lay out the chirp for another codec:
+        # count the post on the user's partition first, then create and index the chirp
+        if self.user_buckets is None:
+            record_post, user_key = self._record_post, user_partition.user_key(user_id)
+        else:
+            record_post = self._record_bucket_post
+            user_key = user_partition.user_bucket_key(user_id, self.user_buckets)
+        username = record_post(
+            keys=[user_key, user_partition.key(TOP_POSTERS), user_partition.key(POSTERS)],
+            args=[user_id],
+            client=user_partition.client
+        )
+        if username is None:
             raise ValueError(f"User {user_id} doesn't exist")
+        self._invalidate([user_partition.user_key(user_id)])
+        self._prepare_codec([text])
+        stored = self.codec.encode({
+            "text": text, "user_id": user_id, "username": username, "created_at": now,
+            "lang": "en", "favorite_count": 0, "retweet_count": 0,
+        })
+        self._create_chirp(
+            keys=[chirp_partition.chirp_key(chirp_id), timeline, chirp_partition.key(TOP_LIKED),
+                  chirp_partition.key(TOP_RECHIRPED), chirp_partition.key(STATS), *bucket_keys],
+            args=[chirp_id, repr(timestamp), *(bucket_args or [""]),
+                  *(item for field_value in stored.items() for item in field_value)],
+            client=chirp_partition.client
+        )
+        self._bucket_written(*bucket_args)
         
-        # Generate a unique ID
-        chirp_id = str(int(time.time() * 1000))
-        timestamp = time.time()
-        
-        # Get user information
-        username = self.redis.hget(f"users:{user_id}", "username")
-        
-        # Create the chirp
-        now = datetime.now().strftime("%a %b %d %H:%M:%S +0000 %Y")
-        chirp_hash = {
-            "text": text,
-            "user_id": user_id,
-            "username": username,
-            "created_at": now,
-            "lang": "en",
-            "favorite_count": 0,
-            "retweet_count": 0
-        }
-        
-        self.redis.hset(f"chirp:{chirp_id}", mapping=chirp_hash)
+        return chirp_id
+    
+    def _timeline_keys(self, partition, timestamp):
+        """
+        Timeline of a new chirp, and with buckets the bucket index and the bucket start
         
-        # Add to timeline
-        self.redis.zadd("chirps:timeline", {chirp_id: timestamp})
+        Returns:
+            tuple: (timeline key, list of extra script keys, list of extra script arguments)
+        """
+        if self.bucket_seconds is None:
+            return partition.key(TIMELINE), [], []
+        start = bucket_start(timestamp, self.bucket_seconds)
+        return partition.key(timeline_bucket(start)), [partition.key(TIMELINE_BUCKETS)], [start]
+    
+    def _bucket_written(self, start=None):
+        """Drop the expired buckets whenever chirps land in a bucket newer than any seen so far"""
+        if start is None or self.timeline_retention is None:
+            return
+        if self._newest_bucket is None or start > self._newest_bucket:
+            self._newest_bucket = start
+            self.expire_timeline()
+    
+    def expire_timeline(self, batch_size=1000):
+        """
+        Drop the timeline buckets older than the retention window, with their chirps
+        
+        The window is counted back from the newest bucket of the database,
+        so importing an old archive does not expire it at once. The live
+        buckets are never read, but a bucket is not dropped with a single
+        UNLINK: its chirps must also leave the engagement rankings and the
+        chirps counter, which key TTLs would not do. Each expired bucket
+        is therefore read and emptied in batches, unlinking the chirp
+        hashes (freed in the background) and removing their ranking
+        entries, so the cost is one round trip per batch_size expired
+        chirps, paid by the write which moves the window.
         
-        # Increment the user's chirp counter
-        self.redis.hincrby(f"users:{user_id}", "chirp_count", 1)
+        Args:
+            batch_size (int): Number of chirps removed per round trip
         
-        # Update the poster ranking
-        new_count = int(self.redis.hget(f"users:{user_id}", "chirp_count"))
-        self.redis.zadd("users:top_posters", {user_id: new_count})
+        Returns:
+            int: Number of dropped chirps
         
-        return chirp_id
+        Raises:
+            ValueError: If the timeline is not split into buckets
+        """
+        if self.bucket_seconds is None:
+            raise ValueError("The timeline is not split into buckets")
+        if self.timeline_retention is None:
+            return 0
+        
+        pipes = self.partitioner.pipelines()
+        indexes = []
+        for partition in self.partitioner.partitions:
+            pipe = pipes(partition)
+            indexes.append((partition, len(pipe)))
+            pipe.zrevrange(partition.key(TIMELINE_BUCKETS), 0, 0, withscores=True)
+        pipes.execute()
+        newest = [pipes.result(partition, index) for partition, index in indexes]
+        if not any(newest):
+            return 0
+        cutoff = max(entries[0][1] for entries in newest if entries) - self.timeline_retention
+        
+        dropped = 0
+        for partition in self.partitioner.partitions:
+            buckets_key = partition.key(TIMELINE_BUCKETS)
+            for start in partition.client.zrangebyscore(buckets_key, "-inf", cutoff):
+                dropped += self._drop_bucket(partition, start, batch_size)
+        return dropped
+    
+    def _drop_bucket(self, partition, start, batch_size):
+        """Remove a timeline bucket, its chirp hashes and their ranking entries, batch_size chirps per round trip"""
+        client = partition.client
+        bucket = partition.key(timeline_bucket(start))
+        dropped = 0
+        unlinked = 0
+        while True:
+            chirp_ids = client.zrange(bucket, 0, batch_size - 1)
+            if not chirp_ids:
+                break
+            chirp_keys = [partition.chirp_key(chirp_id) for chirp_id in chirp_ids]
+            pipe = client.pipeline(transaction=False)
+            pipe.unlink(*chirp_keys)
+            pipe.zrem(partition.key(TOP_LIKED), *chirp_ids)
+            pipe.zrem(partition.key(TOP_RECHIRPED), *chirp_ids)
+            pipe.zrem(bucket, *chirp_ids)
+            unlinked += pipe.execute()[0]
+            self._invalidate(chirp_keys)
+            dropped += len(chirp_ids)
+        
+        pipe = client.pipeline(transaction=False)
+        pipe.unlink(bucket)
+        pipe.zrem(partition.key(TIMELINE_BUCKETS), start)
+        if unlinked:
+            pipe.hincrby(partition.key(STATS), "chirps", -unlinked)
+        pipe.execute()
+        return dropped
     
     def like_chirp(self, chirp_id):
         """
@@ -237,12 +1122,17 @@ class ChirpRedisModel:
         Raises:
             ValueError: If the chirp doesn't exist
         """
-        # Check if the chirp exists
-        if not self.redis.exists(f"chirp:{chirp_id}"):
+        # Increment the favorite count the chirp is stored with and update the likes ranking
+        partition = self.partitioner.for_chirp(chirp_id)
+        new_count = self._incr_engagement(
+            keys=[partition.chirp_key(chirp_id), partition.key(TOP_LIKED)],
+            args=[*FAVORITE_FIELDS, chirp_id],
+            client=partition.client
+        )
+        if new_count is None:
             raise ValueError(f"Chirp {chirp_id} doesn't exist")
-            
-        # Increment the favorite count
-        new_count = self.redis.hincrby(f"chirp:{chirp_id}", "favorite_count", 1)
+        self._invalidate([partition.chirp_key(chirp_id)])
+        
         return new_count
         
     def rechirp(self, chirp_id):
@@ -258,12 +1148,17 @@ class ChirpRedisModel:
         Raises:
             ValueError: If the chirp doesn't exist
         """
-        # Check if the chirp exists
-        if not self.redis.exists(f"chirp:{chirp_id}"):
+        # Increment the retweet count the chirp is stored with and update the rechirps ranking
+        partition = self.partitioner.for_chirp(chirp_id)
+        new_count = self._incr_engagement(
+            keys=[partition.chirp_key(chirp_id), partition.key(TOP_RECHIRPED)],
+            args=[*RETWEET_FIELDS, chirp_id],
+            client=partition.client
+        )
+        if new_count is None:
             raise ValueError(f"Chirp {chirp_id} doesn't exist")
-            
-        # Increment the retweet count
-        new_count = self.redis.hincrby(f"chirp:{chirp_id}", "retweet_count", 1)
+        self._invalidate([partition.chirp_key(chirp_id)])
+        
         return new_count
     
     def add_user(self, username, name, profile_image=''):
@@ -281,83 +1176,344 @@ class ChirpRedisModel:
         Raises:
             ValueError: If the username already exists
         """
-        # Check if the username already exists
-        if self.redis.hexists("usernames", username):
+        # Generate a unique new ID
+        user_id = self.next_id()
+        now = SnowflakeIdGenerator.timestamp_ms(user_id) // 1000
+        profile_image = self.codec.encode_profile_image(profile_image)
+        
+        username_partition = self.partitioner.for_username(username)
+        user_partition = self.partitioner.for_user(user_id)
+        if username_partition is user_partition and self.user_buckets is None:
+            # Reserve the username, save the user and add it to the rankings atomically
+            created = self._add_user(
+                keys=[user_partition.key(USERNAMES), user_partition.user_key(user_id),
+                      user_partition.key(TOP_FOLLOWERS), user_partition.key(TOP_POSTERS),
+                      user_partition.key(STATS)],
+                args=[username, user_id, name, now, profile_image],
+                client=user_partition.client
+            )
+            if created is None:
+                raise ValueError(f"The username @{username} already exists")
+            return user_id
+        
+        # A script cannot span partitions, nor pack the user: reserve the username
+        # first, so two concurrent sign-ups can never both get it, then create the user
+        if not username_partition.client.hsetnx(username_partition.key(USERNAMES), username, user_id):
             raise ValueError(f"The username @{username} already exists")
-        
-        # Generate a unique new ID (timestamp)
-        user_id = str(int(time.time() * 1000))
-        
-        # Create a new user with default values
-        now = datetime.now().strftime("%a %b %d %H:%M:%S +0000 %Y")
         user_hash = {
-            "username": username,
-            "name": name,
-            "follower_count": 0,
-            "following_count": 0,
-            "chirp_count": 0,
-            "created_at": now,
-            "profile_image": profile_image
+            "username": username, "name": name, "follower_count": 0, "following_count": 0,
+            "chirp_count": 0, "created_at": now, "profile_image": profile_image,
         }
+        if self.user_buckets is None:
+            user_key, stored = user_partition.user_key(user_id), user_hash
+        else:
+            user_key = user_partition.user_bucket_key(user_id, self.user_buckets)
+            stored = {user_id: self.codec.pack_user(user_hash)}
+        self._create_user(
+            keys=[user_key, user_partition.key(TOP_FOLLOWERS),
+                  user_partition.key(TOP_POSTERS), user_partition.key(STATS)],
+            args=[user_id, *(item for field_value in stored.items() for item in field_value)],
+            client=user_partition.client
+        )
         
-        # Save the user in Redis
-        self.redis.hset(f"users:{user_id}", mapping=user_hash)
+        return user_id
+    
+    def set_engagement(self, chirp_id, favorite_count, retweet_count):
+        """
+        Overwrite the engagement metrics of a chirp and its rankings
         
-        # Add to username index
-        self.redis.hset("usernames", username, user_id)
+        The counters are written in the layout the chirp is stored with,
+        whatever the codec of the model. Missing chirps are left alone.
         
-        # Add to rankings (with score 0)
-        self.redis.zadd("users:top_followers", {user_id: 0})
-        self.redis.zadd("users:top_posters", {user_id: 0})
+        Args:
+            chirp_id (str): Chirp ID
+            favorite_count (int): New favorite count
+            retweet_count (int): New retweet count
+        """
+        self.set_engagements({chirp_id: (favorite_count, retweet_count)})
+    
+    def set_engagements(self, engagements):
+        """
+        Overwrite the engagement metrics of a batch of chirps and their rankings
         
-        return user_id
+        Same as set_engagement, with a single round trip per server.
+        
+        Args:
+            engagements (dict): (favorite count, retweet count) by chirp ID
+        """
+        pipes = self.partitioner.pipelines()
+        keys = []
+        for chirp_id, (favorite_count, retweet_count) in engagements.items():
+            partition = self.partitioner.for_chirp(chirp_id)
+            self._set_engagement(
+                keys=[partition.chirp_key(chirp_id), partition.key(TOP_LIKED), partition.key(TOP_RECHIRPED)],
+                args=[chirp_id, favorite_count, retweet_count, FAVORITE_FIELDS[0], RETWEET_FIELDS[0],
+                      FAVORITE_FIELDS[1], RETWEET_FIELDS[1]],
+                client=pipes(partition)
+            )
+            keys.append(partition.chirp_key(chirp_id))
+        pipes.execute()
+        self._invalidate(keys)
     
-    def get_top_liked_chirps(self, count=5):
+    def rebuild_engagement_rankings(self, batch_size=1000):
         """
-        Get chirps with the most likes
+        Backfill the engagement rankings from the existing chirp hashes
+        
+        Reads the counters of each batch of chirps in a single pipeline.
         
         Args:
-            count (int): Number of chirps to retrieve
-            
+            batch_size (int): Number of chirps handled per round trip
+        
         Returns:
-            list: List of chirps
+            int: Number of chirps indexed
         """
-        # Get all chirps
-        chirp_keys = self.redis.keys("chirp:*")
+        indexed = 0
+        for client in self.partitioner.clients:
+            for batch in scan_batches(client, chirp_key("*"), batch_size):
+                indexed += self._index_engagement(batch)
+        return indexed
+    
+    def rebuild_stats(self, batch_size=1000):
+        """
+        Recount the chirps, users and posters from the existing hashes
         
-        # Create temporary sorted set for ranking
-        temp_key = "temp:top_liked"
-        pipe = self.redis.pipeline()
+        For databases created before the counters existed. Writes made
+        while it runs may be missed, run it again once they stopped.
         
-        # Delete existing temporary key if it exists
-        pipe.delete(temp_key)
+        Args:
+            batch_size (int): Number of keys handled per round trip
         
-        # Add each chirp to the temporary sorted set with its favorite count as score
+        Returns:
+            dict: Number of chirps and users counted
+        """
+        partitioner = self.partitioner
+        counts = {partition: {"chirps": 0, "users": 0} for partition in partitioner.partitions}
+        posters = {partition: set() for partition in partitioner.partitions}
+        
+        for client in partitioner.clients:
+            for batch in scan_batches(client, chirp_key("*"), batch_size):
+                self._count_chirps(batch, counts, posters)
+            for batch in scan_batches(client, f"{USER_PREFIX}*", batch_size):
+                for key in batch:
+                    counts[partitioner.for_user(user_id_from_key(key))]["users"] += 1
+            # User buckets are small hashes, their fields are the user IDs
+            for batch in scan_batches(client, f"{USER_BUCKET_PREFIX}*", batch_size):
+                pipe = client.pipeline(transaction=False)
+                for key in batch:
+                    pipe.hkeys(key)
+                for user_ids in pipe.execute():
+                    for user_id in user_ids:
+                        counts[partitioner.for_user(user_id)]["users"] += 1
+        
+        pipes = partitioner.pipelines()
+        for partition in partitioner.partitions:
+            pipe = pipes(partition)
+            pipe.hset(partition.key(STATS), mapping=counts[partition])
+            pipe.delete(partition.key(POSTERS))
+            if posters[partition]:
+                pipe.pfadd(partition.key(POSTERS), *posters[partition])
+        pipes.execute()
+        
+        return {
+            "chirps": sum(count["chirps"] for count in counts.values()),
+            "users": sum(count["users"] for count in counts.values()),
+        }
+    
+    def _count_chirps(self, chirp_keys, counts, posters):
+        """Count a batch of chirp hashes in their partitions, and their authors in theirs"""
+        pipes = self.partitioner.pipelines()
+        indexes = []
         for key in chirp_keys:
-            favorite_count = int(self.redis.hget(key, "favorite_count") or 0)
-            pipe.zadd(temp_key, {key.split(":", 1)[1]: favorite_count})
+            partition = self.partitioner.for_chirp(chirp_id_from_key(key))
+            pipe = pipes(partition)
+            indexes.append((partition, len(pipe)))
+            pipe.hmget(key, AUTHOR_FIELDS)
+        pipes.execute()
+        
+        for partition, index in indexes:
+            counts[partition]["chirps"] += 1
+            user_id = chirp_author(pipes.result(partition, index))
+            if user_id:
+                posters[self.partitioner.for_user(user_id)].add(user_id)
+    
+    def recode_chirps(self, batch_size=1000):
+        """
+        Rewrite the chirp hashes in the layout of the model's codec
         
-        # Execute the pipeline
-        pipe.execute()
+        The fields of the new layout are written before those of the old
+        one are removed, so readers always find a whole chirp. A like or rechirp of
+        a chirp between its read and its rewrite is lost, stop the writers
+        while it runs.
+        
+        Args:
+            batch_size (int): Number of chirps recoded per round trip
+        
+        Returns:
+            int: Number of recoded chirps
+        """
+        recoded = 0
+        for client in self.partitioner.clients:
+            for batch in scan_batches(client, chirp_key("*"), batch_size):
+                recoded += self._recode_chirps(batch)
+        return recoded
+    
+    def _recode_chirps(self, chirp_keys):
+        """Rewrite a batch of chirp hashes which are not in the layout of the model's codec"""
+        pipes = self.partitioner.pipelines()
+        indexes = []
+        for key in chirp_keys:
+            partition = self.partitioner.for_chirp(chirp_id_from_key(key))
+            pipe = pipes(partition)
+            indexes.append((partition, len(pipe)))
+            pipe.hgetall(key)
+        pipes.execute()
         
-        # Get the top chirps by likes
-        top_chirp_ids = self.redis.zrevrange(temp_key, 0, count - 1)
+        chirps = []
+        for key, (partition, index) in zip(chirp_keys, indexes):
+            stored = pipes.result(partition, index)
+            if stored:
+                chirps.append((key, partition, set(stored), self.codec.decode(stored)))
+        self._prepare_codec([chirp_hash.get("text", "") for *_, chirp_hash in chirps])
+        
+        recoded = []
+        for key, partition, fields, chirp_hash in chirps:
+            stored = self.codec.encode(chirp_hash)
+            if set(stored) == fields:
+                continue
+            pipe = pipes(partition)
+            pipe.hset(key, mapping=stored)
+            pipe.hdel(key, *(fields - set(stored)))
+            recoded.append(key)
+        pipes.execute()
+        self._invalidate(recoded)
+        
+        return len(recoded)
+    
+    def convert_dates(self, batch_size=1000):
+        """
+        Rewrite the Twitter dates of the chirp and user hashes as epoch seconds
         
-        # Clean up temporary key
-        self.redis.delete(temp_key)
+        For databases written before dates were stored as epochs. Reads accept
+        both, so the application can keep running, but not the sweeper,
+        which could delete a hash before its date is written back.
         
-        # Get the full chirp data
-        top_chirps = []
-        for chirp_id in top_chirp_ids:
-            chirp_data = self.redis.hgetall(f"chirp:{chirp_id}")
-            if chirp_data:
-                # Convert engagement metrics to integers
-                chirp_data['favorite_count'] = int(chirp_data.get('favorite_count', 0))
-                chirp_data['retweet_count'] = int(chirp_data.get('retweet_count', 0))
-                chirp_data['chirp_id'] = chirp_id
-                top_chirps.append(chirp_data)
+        Args:
+            batch_size (int): Number of hashes handled per round trip
         
-        return top_chirps
+        Returns:
+            int: Number of converted hashes
+        """
+        converted = 0
+        for client in self.partitioner.clients:
+            for pattern in (chirp_key("*"), f"{USER_PREFIX}*"):
+                for batch in scan_batches(client, pattern, batch_size):
+                    converted += self._convert_dates(client, batch)
+        return converted
+    
+    def _convert_dates(self, client, keys):
+        """Rewrite the created_at fields of a batch of hashes of a server which hold a Twitter date"""
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hget(key, "created_at")
+        dates = pipe.execute()
+        
+        converted = []
+        pipe = client.pipeline(transaction=False)
+        for key, created_at in zip(keys, dates):
+            # The compact and packed layouts always hold epochs
+            if created_at is None or created_at.isdigit():
+                continue
+            try:
+                pipe.hset(key, "created_at", created_at_epoch(created_at))
+            except ValueError:
+                continue
+            converted.append(key)
+        if converted:
+            pipe.execute()
+            self._invalidate(converted)
+        return len(converted)
+    
+    def split_timeline(self, batch_size=1000):
+        """
+        Move the chirps of a single timeline into time buckets
+        
+        The oldest chirps are moved first, each batch being added to its
+        buckets before it is removed from the timeline, so an interrupted
+        migration can simply be run again. Buckets beyond the retention
+        window are then dropped.
+        
+        Args:
+            batch_size (int): Number of chirps moved per round trip
+        
+        Returns:
+            int: Number of chirps moved
+        
+        Raises:
+            ValueError: If the timeline is not split into buckets
+        """
+        if self.bucket_seconds is None:
+            raise ValueError("The timeline is not split into buckets")
+        moved = 0
+        
+        for partition in self.partitioner.partitions:
+            client = partition.client
+            timeline = partition.key(TIMELINE)
+            while True:
+                entries = client.zrange(timeline, 0, batch_size - 1, withscores=True)
+                if not entries:
+                    break
+                buckets = {}
+                for chirp_id, timestamp in entries:
+                    buckets.setdefault(bucket_start(timestamp, self.bucket_seconds), {})[chirp_id] = timestamp
+                pipe = client.pipeline(transaction=False)
+                for start, bucket in buckets.items():
+                    pipe.zadd(partition.key(timeline_bucket(start)), bucket)
+                pipe.zadd(partition.key(TIMELINE_BUCKETS), {start: start for start in buckets})
+                pipe.zrem(timeline, *(chirp_id for chirp_id, _ in entries))
+                pipe.execute()
+                moved += len(entries)
+        
+        if self.timeline_retention is not None:
+            self.expire_timeline(batch_size)
+        return moved
+    
+    def _index_engagement(self, chirp_keys):
+        """Add a batch of chirp hashes to the engagement rankings"""
+        pipes = self.partitioner.pipelines()
+        indexes = []
+        for key in chirp_keys:
+            partition = self.partitioner.for_chirp(chirp_id_from_key(key))
+            pipe = pipes(partition)
+            indexes.append((partition, len(pipe)))
+            pipe.hmget(key, ENGAGEMENT_FIELDS)
+        pipes.execute()
+        
+        liked = {}
+        rechirped = {}
+        for key, (partition, index) in zip(chirp_keys, indexes):
+            chirp_id = chirp_id_from_key(key)
+            favorite_count, retweet_count = chirp_engagement(pipes.result(partition, index))
+            liked.setdefault(partition, {})[chirp_id] = favorite_count
+            rechirped.setdefault(partition, {})[chirp_id] = retweet_count
+        
+        for partition in liked:
+            pipes(partition).zadd(partition.key(TOP_LIKED), liked[partition])
+            pipes(partition).zadd(partition.key(TOP_RECHIRPED), rechirped[partition])
+        pipes.execute()
+        
+        return len(chirp_keys)
+    
+    def get_top_liked_chirps(self, count=5):
+        """
+        Get chirps with the most likes
+        
+        Args:
+            count (int): Number of chirps to retrieve
+            
+        Returns:
+            list: List of chirps
+        """
+        return self._ranked(TOP_LIKED, count, self._hydrate_chirps)
 
     def get_top_rechirped_chirps(self, count=5):
         """
@@ -369,39 +1525,4 @@ class ChirpRedisModel:
         Returns:
             list: List of chirps
         """
-        # Get all chirps
-        chirp_keys = self.redis.keys("chirp:*")
-        
-        # Create temporary sorted set for ranking
-        temp_key = "temp:top_rechirped"
-        pipe = self.redis.pipeline()
-        
-        # Delete existing temporary key if it exists
-        pipe.delete(temp_key)
-        
-        # Add each chirp to the temporary sorted set with its retweet count as score
-        for key in chirp_keys:
-            retweet_count = int(self.redis.hget(key, "retweet_count") or 0)
-            pipe.zadd(temp_key, {key.split(":", 1)[1]: retweet_count})
-        
-        # Execute the pipeline
-        pipe.execute()
-        
-        # Get the top chirps by retweets
-        top_chirp_ids = self.redis.zrevrange(temp_key, 0, count - 1)
-        
-        # Clean up temporary key
-        self.redis.delete(temp_key)
-        
-        # Get the full chirp data
-        top_chirps = []
-        for chirp_id in top_chirp_ids:
-            chirp_data = self.redis.hgetall(f"chirp:{chirp_id}")
-            if chirp_data:
-                # Convert engagement metrics to integers
-                chirp_data['favorite_count'] = int(chirp_data.get('favorite_count', 0))
-                chirp_data['retweet_count'] = int(chirp_data.get('retweet_count', 0))
-                chirp_data['chirp_id'] = chirp_id
-                top_chirps.append(chirp_data)
-        
-        return top_chirps
\ No newline at end of file
+        return self._ranked(TOP_RECHIRPED, count, self._hydrate_chirps)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Mass insertion of chirps with the Redis protocol (RESP)
+
+Cold loads can skip the Python client entirely: tweets are turned into
+the raw RESP commands the pipelined import would send, written to a file
+which is then streamed to the server by redis-cli --pipe or load_resp.
+"""
+
+import os
+import socket
+import threading
+
+from .schema import (
+    TIMELINE, TIMELINE_MAX_SIZE, TIMELINE_TRIMMED_SIZE, chirp_record, queue_records, user_record,
+)
+
+def _to_bytes(value):
+    """Encode a command argument like redis-py does"""
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float):
+        return repr(value).encode()
+    return str(value).encode('utf-8')
+
+def encode_command(*args):
+    """
+    Encode a command as a RESP array of bulk strings
+
+    Returns:
+        bytes: Command ready to be sent to the server
+    """
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        arg = _to_bytes(arg)
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+def iter_commands(f):
+    """
+    Decode the commands of a RESP stream
+
+    Args:
+        f (file): Binary file holding RESP arrays of bulk strings
+
+    Yields:
+        list: Command arguments, as bytes
+    """
+    while True:
+        header = f.readline()
+        if not header:
+            return
+        if not header.startswith(b"*"):
+            raise ValueError(f"Invalid RESP command header: {header!r}")
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(f.readline()[1:])
+            args.append(f.read(length + 2)[:-2])
+        yield args
+
+class RespWriter:
+    """
+    Write commands to a RESP file
+
+    Exposes the hset, zadd, hincrby, pfadd and zremrangebyrank methods of a
+    pipeline, so the model can queue its writes into it.
+    """
+
+    def __init__(self, f):
+        """
+        Initialize the writer
+
+        Args:
+            f (file): Binary file receiving the commands
+        """
+        self.f = f
+        self.commands = 0
+
+    def command(self, *args):
+        """Write one command"""
+        self.f.write(encode_command(*args))
+        self.commands += 1
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        items = [] if key is None else [key, value]
+        for field, field_value in (mapping or {}).items():
+            items.extend((field, field_value))
+        self.command("HSET", name, *items)
+
+    def zadd(self, name, mapping):
+        items = []
+        for member, score in mapping.items():
+            items.extend((score, member))
+        self.command("ZADD", name, *items)
+
+    def hincrby(self, name, key, amount=1):
+        self.command("HINCRBY", name, key, amount)
+
+    def pfadd(self, name, *values):
+        self.command("PFADD", name, *values)
+
+    def zremrangebyrank(self, name, start, end):
+        self.command("ZREMRANGEBYRANK", name, start, end)
+
+class RespExporter:
+    """
+    Turn tweets into the RESP commands of a cold import
+
+    The database is assumed empty when the file is loaded, so the existence
+    checks of the pipelined import are answered from the IDs exported so
+    far and the timeline is trimmed at the same points.
+    """
+
+    def __init__(self, f):
+        """
+        Initialize the exporter
+
+        Args:
+            f (file): Binary file receiving the commands
+        """
+        self.writer = RespWriter(f)
+        self._users = set()
+        self._chirps = set()
+        self._timeline_size = 0
+
+    @property
+    def commands(self):
+        """Number of commands written"""
+        return self.writer.commands
+
+    def export_chirps(self, chirps, chunk_size=1000):
+        """
+        Export many chirps (and their users), like ChirpRedisModel.import_chirps
+
+        Args:
+            chirps (iterable): Chirp data dictionaries
+            chunk_size (int): Number of chirps per chunk, as in the import
+
+        Returns:
+            list: IDs of the exported chirps
+        """
+        exported = []
+        users = {}
+        records = {}
+
+        for chirp_data in chirps:
+            try:
+                user_id, user_hash = user_record(chirp_data['user'])
+                chirp_id, record = chirp_record(chirp_data)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+            users[user_id] = user_hash
+            records[chirp_id] = record
+            exported.append(chirp_id)
+
+            if len(records) >= chunk_size:
+                self._write_records(users, records)
+                users = {}
+                records = {}
+
+        if records:
+            self._write_records(users, records)
+
+        return exported
+
+    def _write_records(self, users, chirps):
+        """Write one chunk of projected users and chirps"""
+        existing_users = [user_id in self._users for user_id in users]
+        chirps = {
+            chirp_id: record for chirp_id, record in chirps.items() if chirp_id not in self._chirps
+        }
+        queue_records(self.writer, users, chirps, existing_users)
+        self._users.update(users)
+        self._chirps.update(chirps)
+
+        self._timeline_size += len(chirps)
+        if self._timeline_size > TIMELINE_MAX_SIZE:
+            self.writer.zremrangebyrank(
+                TIMELINE, 0, self._timeline_size - TIMELINE_TRIMMED_SIZE - 1
+            )
+            self._timeline_size = TIMELINE_TRIMMED_SIZE
+
+def _read_reply(f):
+    """Read one reply from the server, errors are returned as exceptions"""
+    line = f.readline()
+    if not line:
+        raise ConnectionError("Connection closed by the server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"-":
+        return ValueError(payload.decode('utf-8', 'replace'))
+    if kind == b"$":
+        length = int(payload)
+        return None if length < 0 else f.read(length + 2)[:-2]
+    if kind == b"*":
+        return [_read_reply(f) for _ in range(max(int(payload), 0))]
+    return payload
+
+def load_resp(file_path, host='localhost', port=6379, db=0, chunk_size=1 << 16):
+    """
+    Stream a RESP file into a Redis server, like redis-cli --pipe
+
+    The file is sent in chunks without waiting for replies, which are read
+    by a separate thread and only counted. A final ECHO marks the end of
+    the replies.
+
+    Args:
+        file_path (str): RESP file written by RespExporter
+        host (str): Redis host
+        port (int): Redis port
+        db (int): Redis database
+        chunk_size (int): Number of bytes sent at a time
+
+    Returns:
+        tuple: (number of replies, list of error messages)
+    """
+    marker = os.urandom(20).hex().encode()
+    replies = 0
+    errors = []
+    failure = []
+
+    with socket.create_connection((host, port)) as sock:
+        def read_replies():
+            nonlocal replies
+            try:
+                with sock.makefile('rb') as f:
+                    while True:
+                        reply = _read_reply(f)
+                        if reply == marker:
+                            return
+                        replies += 1
+                        if isinstance(reply, Exception):
+                            errors.append(str(reply))
+            except Exception as e:
+                failure.append(e)
+
+        reader = threading.Thread(target=read_replies)
+        reader.start()
+
+        if db:
+            sock.sendall(encode_command("SELECT", db))
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                sock.sendall(chunk)
+        sock.sendall(encode_command("ECHO", marker))
+
+        reader.join()
+
+    if failure:
+        raise failure[0]
+    # Do not count the reply of SELECT
+    return replies - (1 if db else 0), errors
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Redis key schema of the Chirp data model
+
+The synchronous and asynchronous models, the RESP export and the scripts
+all build their keys, records and cursors here, so they cannot drift apart.
+Nothing in this module talks to Redis.
+"""
+
+import base64
+import hashlib
+from datetime import datetime, timezone
+
+# Hashes
+CHIRP_PREFIX = "chirp:"
+USER_PREFIX = "users:"
+USER_BUCKET_PREFIX = "ubucket:"
+USERNAMES = "usernames"
+
+# Sorted sets
+TIMELINE = "chirps:timeline"
+TIMELINE_BUCKETS = "chirps:timeline:buckets"
+TOP_LIKED = "chirps:top_liked"
+TOP_RECHIRPED = "chirps:top_rechirped"
+TOP_FOLLOWERS = "users:top_followers"
+TOP_POSTERS = "users:top_posters"
+
+# Counter of the ID generator workers
+ID_WORKERS = "ids:workers"
+
+# Hash counting the stored chirps and users, and HyperLogLog of the users who posted
+STATS = "stats"
+POSTERS = "stats:posters"
+
+# Strings holding pre-rendered snapshots of the rankings and the timeline
+SNAPSHOT_PREFIX = "snapshots:"
+
+# String holding the deflate dictionary of the zlib storage codec
+DICTIONARY = "codecs:dictionary"
+
+# Hash fields coerced to integers when chirps and users are read back
+CHIRP_INT_FIELDS = ("favorite_count", "retweet_count")
+USER_INT_FIELDS = ("follower_count", "following_count", "chirp_count")
+
+# Once the timeline grows past the maximum size, only the latest chirps are kept
+TIMELINE_MAX_SIZE = 100000
+TIMELINE_TRIMMED_SIZE = 1000
+
+# Sizes of the timeline buckets, in seconds, when the timeline is split by time
+BUCKET_SIZES = {"hour": 3600, "day": 86400}
+
+# Format of the dates of the Twitter archives, created_at fields are stored as epoch seconds
+CREATED_AT_FORMAT = "%a %b %d %H:%M:%S +0000 %Y"
+
+def chirp_key(chirp_id):
+    """Key of the hash of a chirp"""
+    return f"{CHIRP_PREFIX}{chirp_id}"
+
+def user_key(user_id):
+    """Key of the hash of a user"""
+    return f"{USER_PREFIX}{user_id}"
+
+def user_bucket(user_id, buckets):
+    """
+    Name of the hash holding a user among a number of user buckets
+
+    Hashed with MD5 rather than the CRC32 locating partitions, so that the
+    users of a partition are spread over every bucket.
+    """
+    digest = hashlib.md5(str(user_id).encode()).digest()
+    return f"{USER_BUCKET_PREFIX}{int.from_bytes(digest[:4], 'big') % buckets}"
+
+def timeline_bucket(start):
+    """Name of the timeline bucket starting at an epoch second"""
+    return f"{TIMELINE}:{start}"
+
+def created_at_epoch(created_at):
+    """
+    Epoch second of a created_at value, stored as one or as a Twitter archive date
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    try:
+        return int(created_at)
+    except (TypeError, ValueError):
+        pass
+    return int(datetime.strptime(str(created_at), CREATED_AT_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+
+def format_created_at(created_at):
+    """Twitter archive date of an epoch second, for display (empty if unknown)"""
+    if created_at is None:
+        return ""
+    return datetime.fromtimestamp(created_at, timezone.utc).strftime(CREATED_AT_FORMAT)
+
+def bucket_start(timestamp, bucket_seconds):
+    """Epoch second starting the timeline bucket of a timestamp in seconds"""
+    return int(timestamp // bucket_seconds * bucket_seconds)
+
+def snapshot_key(name):
+    """Key of the snapshot of a sorted set"""
+    return f"{SNAPSHOT_PREFIX}{name}"
+
+def chirp_id_from_key(key):
+    """ID of the chirp stored at a chirp hash key, tagged or not"""
+    return key.rpartition(":")[2]
+
+def user_id_from_key(key):
+    """ID of the user stored at a user hash key, tagged or not"""
+    return key.rpartition(":")[2]
+
+class Partition:
+    """
+    A slice of the keyspace with its own timeline, rankings and username index
+
+    Untagged partitions use the plain keys above. A tag such as p3 puts
+    a chirp or user hash and the sorted sets indexing it in the same
+    Redis Cluster slot ({p3}), so scripts and pipelines can use them
+    together.
+    """
+
+    def __init__(self, client=None, tag=None):
+        """
+        Args:
+            client: Redis client holding the partition
+            tag (str, optional): Hash tag of the keys of the partition
+        """
+        self.client = client
+        self.tag = tag
+
+    def key(self, name):
+        """Key of a sorted set or index of the partition"""
+        return name if self.tag is None else f"{name}:{{{self.tag}}}"
+
+    def chirp_key(self, chirp_id):
+        """Key of the hash of a chirp of the partition"""
+        return chirp_key(chirp_id if self.tag is None else f"{{{self.tag}}}:{chirp_id}")
+
+    def user_key(self, user_id):
+        """Key of the hash of a user of the partition"""
+        return user_key(user_id if self.tag is None else f"{{{self.tag}}}:{user_id}")
+
+    def user_bucket_key(self, user_id, buckets):
+        """Key of the user bucket of the partition holding a user"""
+        return self.key(user_bucket(user_id, buckets))
+
+def _to_int(value, default=0):
+    """Convert a Redis value to an integer, falling back to a default"""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return default
+
+def _to_epoch(value):
+    """Convert a stored created_at field to an epoch second, None if it is not a date"""
+    try:
+        return created_at_epoch(value)
+    except ValueError:
+        return None
+
+def parse_chirp(chirp_id, chirp_data):
+    """Turn a chirp hash into a chirp, or None if the hash was missing"""
+    if not chirp_data:
+        return None
+    # Ensure engagement metrics are integers
+    for field in CHIRP_INT_FIELDS:
+        chirp_data[field] = _to_int(chirp_data.get(field))
+    # Databases written before dates were epochs hold Twitter dates
+    chirp_data['created_at'] = _to_epoch(chirp_data.get('created_at'))
+    chirp_data['chirp_id'] = chirp_id
+    return chirp_data
+
+def parse_user(user_id, user_data):
+    """Turn a user hash into a user, or None if the hash was missing"""
+    if not user_data:
+        return None
+    # Ensure counters are integers
+    for field in USER_INT_FIELDS:
+        user_data[field] = _to_int(user_data.get(field))
+    user_data['created_at'] = _to_epoch(user_data.get('created_at'))
+    user_data['user_id'] = user_id
+    return user_data
+
+def user_record(user_data):
+    """
+    Project the user data of a tweet onto a user hash
+
+    Returns:
+        tuple: (user ID, user hash)
+    """
+    user_hash = {
+        "username": user_data['screen_name'],
+        "name": user_data['name'],
+        "follower_count": int(user_data['followers_count']),
+        "following_count": int(user_data['friends_count']),
+        "chirp_count": int(user_data['statuses_count']),
+        "created_at": created_at_epoch(user_data['created_at']),
+        "profile_image": user_data.get('profile_image_url_https', '')
+    }
+    return str(user_data['id']), user_hash
+
+def chirp_record(chirp_data):
+    """
+    Project a tweet onto a chirp hash and its timeline score
+
+    Returns:
+        tuple: (chirp ID, (chirp hash, timestamp in seconds))
+    """
+    chirp_hash = {
+        "text": chirp_data['text'],
+        "user_id": str(chirp_data['user']['id']),
+        "username": chirp_data['user']['screen_name'],
+        "created_at": created_at_epoch(chirp_data['created_at']),
+        "lang": chirp_data['lang'],
+        # Ensure favorite_count and retweet_count have values and are integers
+        "favorite_count": int(chirp_data.get('favorite_count', 0)),
+        "retweet_count": int(chirp_data.get('retweet_count', 0))
+    }
+    timestamp = int(chirp_data['timestamp_ms']) / 1000  # Convert to seconds
+    return str(chirp_data['id']), (chirp_hash, timestamp)
+
+def queue_records(pipe, users, chirps, existing_users, partition=None, new_usernames=None,
+                  bucket_seconds=None, new_posters=None, codec=None, user_buckets=None):
+    """
+    Queue the writes of projected users and chirps
+
+    Shared by the pipelined imports and the RESP export, so they all write
+    exactly the same keys.
+
+    Args:
+        pipe: Pipeline, or any object with the same hset and zadd methods
+        users (dict): User hashes by user ID
+        chirps (dict): (chirp hash, timestamp) tuples by chirp ID, all new
+        existing_users (list): Whether each user of users already exists, or with user
+            buckets its stored value (None if it does not exist)
+        partition (Partition, optional): Partition of the users and chirps (default: plain keys)
+        new_usernames (dict, optional): Collects the IDs of new users by username instead of
+            indexing them in the partition, when usernames are partitioned on their own
+        bucket_seconds (int, optional): Size of the timeline buckets, if the timeline is split by time
+        new_posters (set, optional): Collects the authors of the chirps instead of counting them
+            in the partition, when users are partitioned on their own
+        codec (ChirpCodec, optional): Storage codec of the hashes (default: plain hashes)
+        user_buckets (int, optional): Number of user buckets, if users are packed into them
+            by the codec
+    """
+    partition = partition or Partition()
+    for (user_id, user_hash), exists in zip(users.items(), existing_users):
+        if user_buckets is not None:
+            # The whole user is one field, keep what the counters do not cover
+            if exists:
+                counters = {field: user_hash[field] for field in USER_INT_FIELDS}
+                user_hash = dict(codec.unpack_user(exists), **counters)
+            pipe.hset(partition.user_bucket_key(user_id, user_buckets), user_id, codec.pack_user(user_hash))
+            if exists:
+                continue
+        elif exists:
+            # Update counters only
+            pipe.hset(partition.user_key(user_id), mapping={
+                field: user_hash[field] for field in USER_INT_FIELDS
+            })
+        else:
+            # Create a new user and add it to the username index
+            stored = user_hash if codec is None else codec.encode_user(user_hash)
+            pipe.hset(partition.user_key(user_id), mapping=stored)
+        if not exists:
+            if new_usernames is None:
+                pipe.hset(partition.key(USERNAMES), user_hash['username'], user_id)
+            else:
+                new_usernames[user_hash['username']] = user_id
+
+    # Update user rankings
+    if users:
+        pipe.zadd(partition.key(TOP_FOLLOWERS), {
+            user_id: user_hash['follower_count'] for user_id, user_hash in users.items()
+        })
+        pipe.zadd(partition.key(TOP_POSTERS), {
+            user_id: user_hash['chirp_count'] for user_id, user_hash in users.items()
+        })
+
+    if chirps:
+        for chirp_id, (chirp_hash, _) in chirps.items():
+            stored = chirp_hash if codec is None else codec.encode(chirp_hash)
+            pipe.hset(partition.chirp_key(chirp_id), mapping=stored)
+
+        # Add to timeline and engagement rankings
+        if bucket_seconds is None:
+            pipe.zadd(partition.key(TIMELINE), {
+                chirp_id: timestamp for chirp_id, (_, timestamp) in chirps.items()
+            })
+        else:
+            buckets = {}
+            for chirp_id, (_, timestamp) in chirps.items():
+                buckets.setdefault(bucket_start(timestamp, bucket_seconds), {})[chirp_id] = timestamp
+            for start, bucket in buckets.items():
+                pipe.zadd(partition.key(timeline_bucket(start)), bucket)
+            pipe.zadd(partition.key(TIMELINE_BUCKETS), {start: start for start in buckets})
+        pipe.zadd(partition.key(TOP_LIKED), {
+            chirp_id: chirp_hash['favorite_count'] for chirp_id, (chirp_hash, _) in chirps.items()
+        })
+        pipe.zadd(partition.key(TOP_RECHIRPED), {
+            chirp_id: chirp_hash['retweet_count'] for chirp_id, (chirp_hash, _) in chirps.items()
+        })
+
+    # Count the new records, so that statistics never scan the keyspace
+    new_users = sum(1 for exists in existing_users if not exists)
+    if new_users:
+        pipe.hincrby(partition.key(STATS), "users", new_users)
+    if chirps:
+        pipe.hincrby(partition.key(STATS), "chirps", len(chirps))
+        posters = {chirp_hash['user_id'] for chirp_hash, _ in chirps.values()}
+        if new_posters is None:
+            pipe.pfadd(partition.key(POSTERS), *posters)
+        else:
+            new_posters.update(posters)
+
+def users_created_elsewhere(replies, existing_users, usernames_indexed=True):
+    """
+    Number of the users queue_records counted as new which another writer created first
+
+    Concurrent writers may all find the same new user missing, and only
+    the first HSET creates its fields (or its user bucket field), so the
+    others must take it back from the users counter.
+
+    Args:
+        replies (list): Replies of the commands queued by queue_records, from the first one
+        existing_users (list): Existing users, as given to queue_records
+        usernames_indexed (bool): Whether the usernames of new users were indexed in the
+            partition, that is whether queue_records got no new_usernames
+
+    Returns:
+        int: Number of users counted twice
+    """
+    duplicates = index = 0
+    for exists in existing_users:
+        if not exists:
+            duplicates += replies[index] == 0
+        index += 2 if not exists and usernames_indexed else 1
+    return duplicates
+
+def encode_cursor(score, offset):
+    """Build an opaque timeline cursor"""
+    return base64.urlsafe_b64encode(f"{score!r}:{offset}".encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    Decode a timeline cursor into a maximum score and an offset
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    if cursor is None:
+        return "+inf", 0
+    try:
+        score, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return repr(float(score)), int(offset)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError(f"Invalid timeline cursor: {cursor}")
+
+def next_cursor(entries, max_score, offset, limit):
+    """
+    Cursor of the page following a timeline slice
+
+    Chirps sharing the last score are skipped by offset on the next page.
+
+    Args:
+        entries (list): (chirp ID, score) tuples of the slice
+        max_score (str): Maximum score the slice was read from
+        offset (int): Offset the slice was read from
+        limit (int): Requested number of chirps
+
+    Returns:
+        str: Cursor, or None if the timeline is exhausted
+    """
+    if len(entries) < limit:
+        return None
+
+    last_score = entries[-1][1]
+    ties = sum(1 for _, score in entries if score == last_score)
+    if max_score != "+inf" and last_score == float(max_score):
+        ties += offset
+
+    return encode_cursor(last_score, ties)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Materialized snapshots of the rankings and of the first timeline page
+
+Every read of a leaderboard or of the latest chirps ranges a sorted set
+and hydrates the hashes of its members. A snapshot stores the top entries
+of a sorted set together with their rendered chirps or users as one JSON
+string, so a reader needs a single GET. Snapshots expire after a maximum
+age, which bounds how stale a reader can be, and are rebuilt by the first
+reader which misses them or ahead of time by a refresher.
+"""
+
+import json
+import time
+
+from .schema import TIMELINE, TOP_FOLLOWERS, TOP_LIKED, TOP_POSTERS, TOP_RECHIRPED, snapshot_key
+
+# Entries kept per snapshot, the largest count served from it
+SNAPSHOT_SIZE = 100
+
+# Seconds a snapshot is served for before it is rebuilt
+SNAPSHOT_MAX_AGE = 5.0
+
+# Sorted sets with a snapshot, and the kind of their members
+SNAPSHOTS = {
+    TIMELINE: "chirp",
+    TOP_LIKED: "chirp",
+    TOP_RECHIRPED: "chirp",
+    TOP_FOLLOWERS: "user",
+    TOP_POSTERS: "user",
+}
+
+class SnapshotStore:
+    """Read and write the snapshots of the sorted sets"""
+
+    def __init__(self, size=SNAPSHOT_SIZE, max_age=SNAPSHOT_MAX_AGE):
+        """
+        Args:
+            size (int): Entries kept per snapshot
+            max_age (float): Seconds a snapshot is served for
+
+        Raises:
+            ValueError: If the size or the maximum age is not positive
+        """
+        if size < 1 or max_age <= 0:
+            raise ValueError("Snapshots need a positive size and maximum age")
+        self.size = size
+        self.max_age = max_age
+
+    def read(self, client, name):
+        """
+        Read the snapshot of a sorted set
+
+        Args:
+            client (redis.Redis): Client of the server holding the snapshots
+            name (str): Sorted set, one of SNAPSHOTS
+
+        Returns:
+            dict: Snapshot, or None if it is missing or expired
+        """
+        blob = client.get(snapshot_key(name))
+        return json.loads(blob) if blob is not None else None
+
+    def write(self, client, name, entries, items):
+        """
+        Store the snapshot of a sorted set, expiring after the maximum age
+
+        Args:
+            client (redis.Redis): Client of the server holding the snapshots
+            name (str): Sorted set, one of SNAPSHOTS
+            entries (list): Top (member, score) tuples of the sorted set
+            items (list): Chirps or users of the members (missing ones skipped)
+
+        Returns:
+            dict: Snapshot
+        """
+        id_field = f"{SNAPSHOTS[name]}_id"
+        snapshot = {
+            "built_at": time.time(),
+            "entries": [[member, score] for member, score in entries],
+            "items": {item[id_field]: item for item in items},
+        }
+        client.set(snapshot_key(name), json.dumps(snapshot), px=int(self.max_age * 1000))
+        return snapshot
+
+def top_items(snapshot, count):
+    """
+    Top entries of a snapshot and their chirps or users
+
+    Returns:
+        tuple: (list of [member, score] entries, list of chirps or users)
+    """
+    entries = snapshot["entries"][:count]
+    items = snapshot["items"]
+    return entries, [items[member] for member, _ in entries if member in items]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Garbage collection of orphaned chirp and user hashes
+
+Trimming the timeline only removes chirp IDs from it, so the hashes of
+the trimmed chirps stay behind, and so do the users none of whose chirps
+remain. The sweeper walks the keyspace with SCAN, checks the timeline
+membership of each batch in one pipelined round trip, and deletes the
+orphans with UNLINK, at a bounded number of keys per second so that it
+never competes with the application for the server.
+"""
+
+import time
+import redis
+
+from .codecs import AUTHOR_FIELDS, chirp_author
+from .lua_scripts import DELETE_ORPHAN_CHIRP, DELETE_ORPHAN_USER
+from .schema import (
+    CHIRP_PREFIX, STATS, TIMELINE, TOP_FOLLOWERS, TOP_LIKED, TOP_POSTERS, TOP_RECHIRPED,
+    USER_PREFIX, USERNAMES, chirp_id_from_key, user_id_from_key,
+)
+
+class RateLimiter:
+    """Pace work to at most a number of keys per second"""
+
+    def __init__(self, rate=None):
+        """
+        Args:
+            rate (float, optional): Keys per second (default: unlimited)
+        """
+        self.rate = rate
+        self._start = time.monotonic()
+        self._count = 0
+
+    def wait(self, count):
+        """Account for handled keys, sleeping if they came in faster than the rate"""
+        self._count += count
+        if self.rate:
+            delay = self._count / self.rate - (time.monotonic() - self._start)
+            if delay > 0:
+                time.sleep(delay)
+
+def sweep_orphans(model, rate=None, batch_size=500, users=False, dry_run=False):
+    """
+    Delete the chirp hashes missing from the timeline, and optionally the users without chirps
+
+    A chirp is checked again and deleted in one server-side script, so a
+    chirp added back to the timeline in the meantime is kept. With
+    timeline buckets, chirps are dropped with their buckets and only
+    users are swept.
+
+    Users are swept after every chirp has been seen, and a user is an
+    orphan when none of the remaining chirps is theirs, which includes
+    users who never posted. Only enable it on imported datasets. Each
+    user is deleted by a script which keeps it if its chirp count changed
+    since it was checked or if it signed up after the sweep started, so
+    users posting or signing up meanwhile are kept. Users packed into
+    user buckets are left alone.
+
+    Args:
+        model (ChirpRedisModel): Model of the database to sweep
+        rate (float, optional): Keys scanned per second (default: unlimited)
+        batch_size (int): Number of keys checked per round trip
+        users (bool): Also delete the users none of whose chirps remain
+        dry_run (bool): Only count the orphans
+
+    Returns:
+        dict: Number of scanned and deleted chirps and users, and the reclaimed
+            bytes (None when the server does not report memory usage)
+    """
+    limiter = RateLimiter(rate)
+    started = int(time.time())
+    delete_chirp = model.redis.register_script(DELETE_ORPHAN_CHIRP)
+    delete_user = model.redis.register_script(DELETE_ORPHAN_USER)
+    report = {"scanned_chirps": 0, "chirps": 0, "scanned_users": 0, "users": 0, "bytes": 0}
+    authors = set()
+
+    # With buckets, chirps are only read to find out which users still have some
+    chirp_clients = model.partitioner.clients if users or model.bucket_seconds is None else []
+    for client in chirp_clients:
+        for batch in scan_batches(client, f"{CHIRP_PREFIX}*", batch_size):
+            _sweep_chirps(model, batch, delete_chirp, authors if users else None, report, dry_run)
+            limiter.wait(len(batch))
+
+    if users:
+        for client in model.partitioner.clients:
+            for batch in scan_batches(client, f"{USER_PREFIX}*", batch_size):
+                _sweep_users(model, batch, authors, delete_user, started, report, dry_run)
+                limiter.wait(len(batch))
+
+    return report
+
+def scan_batches(client, pattern, batch_size):
+    """
+    Batches of the hash keys of a server matching a pattern
+
+    Shared by every walk of the keyspace (sweeps, migrations and
+    rebalancing). Keys are walked with SCAN, so the server is never
+    blocked, and only hashes are kept since the rankings share the users:
+    prefix of the user hashes.
+    """
+    batch = []
+    for key in client.scan_iter(match=pattern, count=batch_size, _type="hash"):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _sweep_chirps(model, keys, delete_chirp, authors, report, dry_run):
+    """Delete the orphans of a batch of chirp hashes, collecting the authors of the others"""
+    partitioner = model.partitioner
+    bucketed = model.bucket_seconds is not None
+    pipes = partitioner.pipelines()
+    checks = []
+    for key in keys:
+        chirp_id = chirp_id_from_key(key)
+        partition = partitioner.for_chirp(chirp_id)
+        pipe = pipes(partition)
+        checks.append((key, chirp_id, partition, len(pipe)))
+        pipe.zscore(partition.key(TIMELINE), chirp_id)
+        pipe.hmget(key, AUTHOR_FIELDS)
+    pipes.execute()
+    report["scanned_chirps"] += len(keys)
+
+    orphans = []
+    for key, chirp_id, partition, index in checks:
+        if bucketed or pipes.result(partition, index) is not None:
+            if authors is not None:
+                authors.add(chirp_author(pipes.result(partition, index + 1)))
+        else:
+            orphans.append((key, chirp_id, partition))
+    sizes = _memory_usage(partitioner, [(partition, key) for key, _, partition in orphans])
+
+    for (key, chirp_id, partition), size in zip(orphans, sizes):
+        if dry_run:
+            deleted = True
+        else:
+            deleted = delete_chirp(
+                keys=[key, partition.key(TIMELINE), partition.key(TOP_LIKED),
+                      partition.key(TOP_RECHIRPED), partition.key(STATS)],
+                args=[chirp_id],
+                client=partition.client
+            )
+        if deleted:
+            report["chirps"] += 1
+            _add_bytes(report, size)
+        elif authors is not None:
+            # Added back to the timeline since it was checked
+            authors.add(chirp_author(partition.client.hmget(key, AUTHOR_FIELDS)))
+    if not dry_run:
+        model._invalidate([key for key, _, _ in orphans])
+
+def _sweep_users(model, keys, authors, delete_user, started, report, dry_run):
+    """Delete the users of a batch of user hashes none of whose chirps remain"""
+    partitioner = model.partitioner
+    report["scanned_users"] += len(keys)
+    orphans = []
+    for key in keys:
+        user_id = user_id_from_key(key)
+        if user_id not in authors:
+            orphans.append((key, user_id, partitioner.for_user(user_id)))
+    if not orphans:
+        return
+
+    reads = partitioner.pipelines()
+    indexes = []
+    for key, _, partition in orphans:
+        pipe = reads(partition)
+        indexes.append(len(pipe))
+        pipe.hmget(key, "username", "chirp_count")
+    reads.execute()
+    sizes = _memory_usage(partitioner, [(partition, key) for key, _, partition in orphans])
+
+    deletes = partitioner.pipelines()
+    deleted = []
+    for (key, user_id, partition), index, size in zip(orphans, indexes, sizes):
+        username, chirp_count = reads.result(partition, index)
+        if dry_run:
+            report["users"] += 1
+            _add_bytes(report, size)
+            continue
+        if chirp_count is None or not delete_user(
+                keys=[key, partition.key(TOP_FOLLOWERS), partition.key(TOP_POSTERS), partition.key(STATS)],
+                args=[user_id, chirp_count, started],
+                client=partition.client):
+            # Deleted, posted or signed up since it was checked
+            continue
+        report["users"] += 1
+        _add_bytes(report, size)
+        deleted.append(key)
+        # The username index may live on another partition, it is released once the user is gone
+        if username is not None:
+            index_partition = partitioner.for_username(username)
+            deletes(index_partition).hdel(index_partition.key(USERNAMES), username)
+    deletes.execute()
+    model._invalidate(deleted)
+
+def _memory_usage(partitioner, keys):
+    """Bytes used by (partition, key) pairs, None for each when MEMORY USAGE is not supported"""
+    if not keys:
+        return []
+    pipes = partitioner.pipelines()
+    indexes = []
+    for partition, key in keys:
+        pipe = pipes(partition)
+        indexes.append((partition, len(pipe)))
+        pipe.memory_usage(key)
+    try:
+        pipes.execute()
+    except redis.ResponseError:
+        return [None] * len(keys)
+    return [pipes.result(partition, index) for partition, index in indexes]
+
+def _add_bytes(report, size):
+    """Add reclaimed bytes to a report, which stays None once a size is unknown"""
+    if report["bytes"] is None or size is None:
+        report["bytes"] = None
+    else:
+        report["bytes"] += size
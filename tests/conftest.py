@@ -4,6 +4,121 @@ Configuration file for pytest
 
 import sys
 import os
+import pytest
+import redis
+import fakeredis
+from unittest.mock import patch
+from redis.crc import key_slot
 
 # Add the parent directory to the path to import modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
\ No newline at end of file
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.redis_model import ChirpRedisModel
+from src.models.schema import format_created_at
+
+# 2024-04-01 12:00:00 UTC, when the sample tweets start by default
+TWEETS_START_MS = 1711972800000
+
+# Commands taking several keys, by where their keys are in the arguments
+ALL_KEYS_COMMANDS = {
+    "DEL", "UNLINK", "EXISTS", "TOUCH", "MGET", "WATCH", "PFCOUNT", "PFMERGE",
+    "SINTER", "SUNION", "SDIFF", "SINTERSTORE", "SUNIONSTORE", "SDIFFSTORE",
+}
+TWO_KEYS_COMMANDS = {"RENAME", "RENAMENX", "SMOVE", "RPOPLPUSH", "LMOVE", "COPY"}
+NUMKEYS_COMMANDS = {"EVAL", "EVALSHA", "FCALL", "ZUNION", "ZINTER", "ZDIFF"}
+STORE_NUMKEYS_COMMANDS = {"ZUNIONSTORE", "ZINTERSTORE", "ZDIFFSTORE"}
+
+def command_keys(args):
+    """Keys of a command, for the multi-key commands a cluster checks"""
+    name = args[0].decode() if isinstance(args[0], bytes) else str(args[0])
+    name, rest = name.upper(), list(args[1:])
+    if name in ALL_KEYS_COMMANDS:
+        return rest
+    if name in TWO_KEYS_COMMANDS:
+        return rest[:2]
+    if name in ("MSET", "MSETNX"):
+        return rest[::2]
+    if name in NUMKEYS_COMMANDS:
+        return rest[2:2 + int(rest[1])]
+    if name in STORE_NUMKEYS_COMMANDS:
+        return [rest[0]] + rest[2:2 + int(rest[1])]
+    return rest[:1]
+
+def check_slots(args):
+    """Refuse a command whose keys span several slots, as a cluster node does"""
+    keys = command_keys(args)
+    if len({key_slot(key if isinstance(key, bytes) else str(key).encode()) for key in keys}) > 1:
+        raise redis.ResponseError(f"CROSSSLOT Keys in request don't hash to the same slot: {keys}")
+
+class ClusterConnection(fakeredis.FakeConnection):
+    """Fake connection checking the slots of every command, sent alone or pipelined"""
+
+    def send_command(self, *args, **kwargs):
+        check_slots(args)
+        return super().send_command(*args, **kwargs)
+
+    def pack_commands(self, commands):
+        for args in commands:
+            check_slots(args)
+        return super().pack_commands(commands)
+
+@pytest.fixture
+def make_tweet():
+    """Build English tweets by index, rotating over a few users"""
+    def factory(i, timestamp_ms=None, favorite_count=None, users=5, **fields):
+        """
+        Args:
+            i (int): Index of the tweet, whose ID is 5000 + i
+            timestamp_ms (int, optional): Post time (default: one second per index from TWEETS_START_MS)
+            favorite_count (int, optional): Likes (default: the index)
+            users (int): Number of users the tweets rotate over, user n has the ID 100 + n
+            **fields: Other tweet fields, such as text or retweet_count
+        """
+        if timestamp_ms is None:
+            timestamp_ms = TWEETS_START_MS + 1000 * i
+        user = i % users
+        return {
+            "id": 5000 + i,
+            "text": f"Chirp {i}",
+            "user": {
+                "id": 100 + user, "name": f"User {user}", "screen_name": f"user{user}",
+                "followers_count": 10 * user, "friends_count": 0, "statuses_count": i,
+                "created_at": "Mon Apr 01 12:00:00 +0000 2024",
+                "profile_image_url_https": f"https://pbs.twimg.com/profile_images/{user}/photo.jpg",
+            },
+            "created_at": format_created_at(timestamp_ms // 1000),
+            "timestamp_ms": str(timestamp_ms),
+            "favorite_count": i if favorite_count is None else favorite_count,
+            "lang": "en",
+            **fields,
+        }
+    return factory
+
+@pytest.fixture
+def make_client():
+    """Create fake Redis clients, each over its own server"""
+    def factory():
+        return fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    return factory
+
+@pytest.fixture
+def client(make_client):
+    """Fake Redis client of the database under test"""
+    return make_client()
+
+def cluster_client(client):
+    """Fake Redis client over the server of another, checking the slots of every command as a cluster does"""
+    checked = fakeredis.FakeStrictRedis(server=client.connection_pool.connection_kwargs["server"],
+                                        decode_responses=True)
+    checked.connection_pool.connection_class = ClusterConnection
+    return checked
+
+@pytest.fixture
+def make_model(client):
+    """Create models over a fake Redis (the client fixture by default), standing for a cluster as well"""
+    def factory(client=client, **options):
+        # Created before patching, fakeredis clients are redis.Redis subclasses
+        cluster = cluster_client(client)
+        with patch('src.models.connections.redis.Redis', return_value=client), \
+                patch('src.models.connections.redis.RedisCluster', return_value=cluster):
+            return ChirpRedisModel(**options)
+    return factory
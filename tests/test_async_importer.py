@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the asyncio bulk importer
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ingest.async_importer import BatchJob, ImportStats, OffsetTracker, import_batches
+
+class FakeCheckpoints:
+    """Record the checkpoint writes"""
+    
+    def __init__(self):
+        self.commits = []
+        self.completed = []
+    
+    def commit(self, source, offset):
+        self.commits.append((source, offset))
+    
+    def complete(self, source):
+        self.completed.append(source)
+
+class SlowModel:
+    """Async model stub whose writes take a while"""
+    
+    def __init__(self, delay):
+        self.delay = delay
+        self.written = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def import_chirps(self, chirps, chunk_size=1000):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Later batches finish first
+        await asyncio.sleep(self.delay / (1 + chirps[0]["id"] % 3))
+        self.in_flight -= 1
+        self.written += len(chirps)
+        return [str(chirp["id"]) for chirp in chirps]
+
+def tweet(i):
+    return {"id": i, "user": {"id": i % 4}}
+
+class TestAsyncImporter:
+    """Test class for the asyncio bulk importer"""
+    
+    def test_offset_tracker_commits_contiguous_batches(self):
+        """Test that out of order batches only commit their contiguous prefix"""
+        tracker = OffsetTracker()
+        tracker.start("a", 10)
+        
+        assert tracker.done("a", 20, 10) is None
+        assert tracker.done("a", 40, 5) is None
+        assert tracker.done("a", 10, 10) == 30
+        
+        tracker.finish("a", 45)
+        assert not tracker.complete("a")
+        assert tracker.done("a", 30, 10) == 45
+        assert tracker.complete("a")
+    
+    def test_import_stats_count_duplicates_apart(self):
+        """Test that tweets repeated within a batch are not reported as missing data"""
+        stats = ImportStats()
+        tweets = [tweet(1), tweet(2), tweet(1), tweet(1), {"id": 3}]
+        
+        assert stats.add(tweets, ["1", "2", "1", "1"]) == 1
+        assert (stats.english_count, stats.imported_count, stats.duplicate_count) == (5, 2, 2)
+    
+    def test_import_batches_backpressure(self):
+        """Test that reading stays a bounded number of batches ahead of writing"""
+        model = SlowModel(delay=0.01)
+        pulled = []
+        ahead = []
+        
+        def jobs():
+            for start in range(0, 200, 5):
+                pulled.append(start)
+                ahead.append(len(pulled) * 5 - model.written)
+                yield BatchJob("a", start, [tweet(i) for i in range(start, start + 5)])
+            yield BatchJob("a", 200, None)
+        
+        checkpoints = FakeCheckpoints()
+        stats, timings = asyncio.run(
+            import_batches(model, jobs(), checkpoints, writers=3, queue_size=2)
+        )
+        
+        assert stats.imported_count == 200
+        assert model.max_in_flight == 3
+        # At most the queue, the batches being written and the one being read
+        assert max(ahead) <= (2 + 3 + 1) * 5
+        
+        offsets = [offset for _, offset in checkpoints.commits]
+        assert offsets == sorted(offsets) and offsets[-1] == 200
+        assert checkpoints.completed == ["a"]
+        assert timings.write > 0
+    
+    def test_import_batches_stops_on_error(self):
+        """Test that a failing write stops the import without checkpointing past it"""
+        class FailingModel(SlowModel):
+            async def import_chirps(self, chirps, chunk_size=1000):
+                if chirps[0]["id"] == 20:
+                    raise ConnectionError("Connection lost")
+                return await super().import_chirps(chirps, chunk_size)
+        
+        jobs = (BatchJob("a", start, [tweet(i) for i in range(start, start + 10)])
+                for start in range(0, 100, 10))
+        checkpoints = FakeCheckpoints()
+        
+        with pytest.raises(ConnectionError):
+            asyncio.run(import_batches(FailingModel(0.001), jobs, checkpoints, writers=2))
+        
+        assert all(offset <= 20 for _, offset in checkpoints.commits)
+        assert checkpoints.completed == []
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the AsyncChirpRedisModel class
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.async_redis_model import AsyncChirpRedisModel
+from src.models.redis_model import ChirpRedisModel
+
+def run(coroutine):
+    """Run a coroutine to completion"""
+    return asyncio.run(coroutine)
+
+class TestAsyncChirpRedisModel:
+    """Test class for AsyncChirpRedisModel"""
+
+    @pytest.fixture
+    def sync_model(self):
+        """Create a ChirpRedisModel on a flushed test database"""
+        # fakeredis.aioredis does not support the connection reuse of redis 5,
+        # so both models talk to the local Redis server
+        model = ChirpRedisModel(db=15)
+        try:
+            model.redis.ping()
+        except Exception:
+            pytest.skip("No Redis server on localhost:6379")
+        model.redis.flushdb()
+        yield model
+        model.redis.flushdb()
+
+    @pytest.fixture
+    def model_factory(self, sync_model):
+        """Create AsyncChirpRedisModel instances on the same database"""
+        def factory(**kwargs):
+            return AsyncChirpRedisModel(db=15, **kwargs)
+        return factory
+
+    @pytest.fixture
+    def sample_tweets(self):
+        """Create tweets from two users"""
+        return [
+            {
+                "id": 1000 + i,
+                "text": f"Tweet number {i}",
+                "user": {
+                    "id": 100 + i % 2,
+                    "name": f"User {i % 2}",
+                    "screen_name": f"user{i % 2}",
+                    "followers_count": 10 * (i % 2),
+                    "friends_count": 5,
+                    "statuses_count": 20 + i,
+                    "created_at": "Mon Apr 01 12:00:00 +0000 2025"
+                },
+                "created_at": "Mon Apr 01 12:30:00 +0000 2025",
+                "timestamp_ms": str(1712055000000 + i * 1000),
+                "favorite_count": i,
+                "retweet_count": 2 * i,
+                "lang": "en"
+            }
+            for i in range(12)
+        ]
+
+    def test_import_matches_sync_model(self, model_factory, sync_model, sample_tweets):
+        """Test that both models write the same keys and read the same data"""
+        async def scenario():
+            async with model_factory() as model:
+                imported = await model.import_chirps(sample_tweets, chunk_size=5)
+                return imported, await model.get_latest_chirps(12), await model.get_top_posters(2)
+
+        imported, latest, top_posters = run(scenario())
+
+        assert imported == [str(tweet["id"]) for tweet in sample_tweets]
+        assert latest == sync_model.get_latest_chirps(12)
+        assert top_posters == sync_model.get_top_posters(2)
+        assert latest[0]["chirp_id"] == "1011"
+        assert latest[0]["favorite_count"] == 11
+
+    def test_concurrent_hydration_keeps_order(self, model_factory, sync_model, sample_tweets):
+        """Test that chunks hydrated concurrently come back in order, without missing chirps"""
+        sync_model.import_chirps(sample_tweets)
+        chirp_ids = ["1007", "missing", "1002", "1011", "1000"]
+
+        async def scenario():
+            async with model_factory(hydrate_chunk_size=2) as model:
+                return await model.get_chirps(chirp_ids)
+
+        chirps = run(scenario())
+        assert [chirp["chirp_id"] for chirp in chirps] == ["1007", "1002", "1011", "1000"]
+        assert chirps == sync_model.get_chirps(chirp_ids)
+
+    def test_write_paths(self, model_factory, sync_model):
+        """Test posting, liking and rechirping from concurrent tasks"""
+        async def scenario():
+            async with model_factory() as model:
+                user_id = await model.add_user("asyncuser", "Async User")
+                chirp_ids = await asyncio.gather(*(
+                    model.post_chirp(user_id, f"Chirp {i}") for i in range(5)
+                ))
+                await asyncio.gather(*(model.like_chirp(chirp_ids[0]) for _ in range(20)))
+                await model.rechirp(chirp_ids[1])
+
+                with pytest.raises(ValueError):
+                    await model.add_user("asyncuser", "Duplicate")
+                with pytest.raises(ValueError):
+                    await model.post_chirp("missing", "Nobody")
+                with pytest.raises(ValueError):
+                    await model.like_chirp("missing")
+
+                return user_id, chirp_ids
+
+        user_id, chirp_ids = run(scenario())
+
+        assert len(set(chirp_ids)) == 5
+        assert sync_model.get_users([user_id])[0]["chirp_count"] == 5
+        assert sync_model.get_top_liked_chirps(1)[0]["favorite_count"] == 20
+        assert sync_model.get_top_rechirped_chirps(1)[0]["chirp_id"] == chirp_ids[1]
+        assert [chirp["chirp_id"] for chirp in sync_model.get_latest_chirps(5)] == chirp_ids[::-1]
+
+    def test_timeline_pages(self, model_factory, sync_model, sample_tweets):
+        """Test cursor pagination and streaming of the whole timeline"""
+        sync_model.import_chirps(sample_tweets)
+
+        async def scenario():
+            async with model_factory() as model:
+                first, cursor = await model.get_timeline_page(limit=5)
+                second, _ = await model.get_timeline_page(before=cursor, limit=5)
+                streamed = [chirp async for chirp in model.iter_timeline(chunk_size=5)]
+                return first, second, streamed
+
+        first, second, streamed = run(scenario())
+
+        assert [chirp["chirp_id"] for chirp in first + second] == [str(i) for i in range(1011, 1001, -1)]
+        assert second == sync_model.get_timeline_page(sync_model.get_timeline_page(limit=5)[1], 5)[0]
+        assert len(streamed) == 12
+
+    def test_timeline_pages_invalid_limit(self, model_factory):
+        """Test that pages and chunks which are not positive are rejected"""
+        async def scenario():
+            async with model_factory() as model:
+                with pytest.raises(ValueError):
+                    await model.get_timeline_page(limit=0)
+                with pytest.raises(ValueError):
+                    await model.iter_timeline(chunk_size=-1).__anext__()
+
+        run(scenario())
+
+    def test_chirps_between(self, model_factory, sync_model, sample_tweets):
+        """Test reading a time range of the timeline, as the sync model does"""
+        sync_model.import_chirps(sample_tweets)
+        start, end = 1712055003, 1712055007
+
+        async def scenario():
+            async with model_factory() as model:
+                return await model.get_chirps_between(start, end, limit=3)
+
+        chirps = run(scenario())
+        assert [chirp["chirp_id"] for chirp in chirps] == ["1007", "1006", "1005"]
+        assert chirps == sync_model.get_chirps_between(start, end, limit=3)
+
+    @pytest.mark.parametrize("codec", ["compact", "packed", "zlib"])
+    def test_reads_other_layouts(self, model_factory, sync_model, sample_tweets, codec):
+        """Test that chirps written by any codec read back and count as plain hashes do"""
+        sync_model.import_chirps(sample_tweets)
+        expected = sync_model.get_latest_chirps(12)
+        sync_model.redis.flushdb()
+        ChirpRedisModel(db=15, codec=codec).import_chirps(sample_tweets)
+        sync_model.redis.delete("chirps:top_liked")
+
+        async def scenario():
+            async with model_factory() as model:
+                assert await model.rebuild_engagement_rankings() == 12
+                assert await model.like_chirp("1003") == 4
+                return await model.get_latest_chirps(12)
+
+        latest = run(scenario())
+        assert latest == [dict(chirp, favorite_count=4) if chirp["chirp_id"] == "1003" else chirp
+                          for chirp in expected]
+        assert sync_model.redis.zscore("chirps:top_liked", "1003") == 4
+
+    def test_unsupported_layouts(self):
+        """Test that the keyspace layouts of ChirpRedisModel only are refused"""
+        for options in ({"codec": "packed"}, {"cluster": True}, {"timeline_buckets": "hour"}, {"user_buckets": 8}):
+            with pytest.raises(ValueError):
+                AsyncChirpRedisModel(**options)
+
+    def test_engagement_rankings(self, model_factory, sync_model, sample_tweets):
+        """Test overwriting engagement and rebuilding the rankings"""
+        sync_model.import_chirps(sample_tweets)
+        sync_model.redis.delete("chirps:top_liked", "chirps:top_rechirped")
+
+        async def scenario():
+            async with model_factory() as model:
+                indexed = await model.rebuild_engagement_rankings(batch_size=5)
+                await model.set_engagement("1003", 500, 1)
+                return indexed, await model.get_top_liked_chirps(2)
+
+        indexed, top_liked = run(scenario())
+
+        assert indexed == 12
+        assert [chirp["chirp_id"] for chirp in top_liked] == ["1003", "1011"]
+        assert sync_model.redis.zscore("chirps:top_rechirped", "1003") == 1
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the client-side cache of chirp and user hashes
+"""
+
+import sys
+import os
+import time
+import pytest
+import redis
+import fakeredis
+from unittest.mock import patch
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.cache import CACHED_PREFIXES, INVALIDATE_CHANNEL, HashCache, InvalidationListener
+from src.models.redis_model import ChirpRedisModel
+from src.models.schema import TOP_FOLLOWERS, TOP_POSTERS, Partition
+
+# Database of the local Redis server used by the invalidation test
+TEST_DB = 15
+
+class TestCache:
+    """Test class for HashCache and the cached reads of ChirpRedisModel"""
+
+    @pytest.fixture
+    def client(self):
+        """Fake Redis client of the cached model"""
+        return fakeredis.FakeStrictRedis(decode_responses=True)
+
+    @pytest.fixture
+    def model(self, client):
+        """Create a cached model over fake Redis, which only supports keyspace notifications"""
+        with patch('src.models.connections.redis.Redis', return_value=client):
+            model = ChirpRedisModel(cache=True, cache_invalidation="keyspace")
+        yield model
+        model.close()
+
+    def test_lru_eviction_within_budget(self):
+        """Test that the least recently used hashes are evicted beyond the memory budget"""
+        cache = HashCache(max_bytes=10 ** 6)
+        cache.put("chirp:1", {"text": "x" * 100}, cache.token())
+        entry_size = cache.stats()["bytes"]
+        cache.max_bytes = 2 * entry_size
+
+        cache.put("chirp:2", {"text": "y" * 100}, cache.token())
+        assert cache.get("chirp:1") is not None  # chirp:2 is now the least recently used
+        cache.put("chirp:3", {"text": "z" * 100}, cache.token())
+
+        assert cache.get("chirp:2") is None
+        assert cache.get("chirp:3") == {"text": "z" * 100}
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes"] <= cache.max_bytes
+        assert (stats["hits"], stats["misses"]) == (2, 1)
+
+    def test_ttl_and_stale_puts(self, mocker):
+        """Test that entries expire, and that replies read before an invalidation are not stored"""
+        cache = HashCache(ttl=10.0)
+        clock = mocker.patch("src.models.cache.time.monotonic", return_value=100.0)
+        cache.put("users:1", {"name": "Old"}, cache.token())
+        assert cache.get("users:1") == {"name": "Old"}
+
+        clock.return_value = 111.0
+        assert cache.get("users:1") is None
+
+        token = cache.token()
+        cache.invalidate(["users:1"])
+        cache.put("users:1", {"name": "Stale"}, token)
+        assert cache.get("users:1") is None
+
+    def test_invalidation_messages(self):
+        """Test applying tracking and keyspace invalidation messages"""
+        cache = HashCache()
+        listener = InvalidationListener.__new__(InvalidationListener)
+        listener.cache = cache
+        for key in ("chirp:1", "chirp:2", "users:3"):
+            cache.put(key, {"text": key}, cache.token())
+
+        listener.handle({"type": "message", "channel": INVALIDATE_CHANNEL, "data": ["chirp:1"]})
+        listener.handle({"type": "pmessage", "channel": "__keyspace@0__:users:3", "data": "hset"})
+        assert [cache.get(key) is None for key in ("chirp:1", "chirp:2", "users:3")] == [True, False, True]
+
+        # A flush is reported without keys
+        listener.handle({"type": "message", "channel": INVALIDATE_CHANNEL, "data": None})
+        assert cache.stats()["entries"] == 0
+
+    def test_cached_reads_skip_the_network(self, model, client, mocker):
+        """Test that repeated reads are served from the cache and that own writes invalidate it"""
+        user_id = model.add_user("cached", "Cached User")
+        chirp_id = model.post_chirp(user_id, "Cache me")
+        assert model.get_latest_chirps(1)[0]["favorite_count"] == 0
+
+        spy = mocker.spy(client.connection_pool, "get_connection")
+        assert model.get_chirps([chirp_id])[0]["text"] == "Cache me"
+        assert model.get_users([user_id])[0]["chirp_count"] == 1
+        assert spy.call_count == 1  # Only the user hash, read for the first time
+
+        model.like_chirp(chirp_id)
+        assert model.get_chirps([chirp_id])[0]["favorite_count"] == 1
+
+        stats = model.cache.stats()
+        assert stats["hits"] == 1
+        assert stats["invalidations"] == 1
+
+    def test_rankings_are_not_tracked(self, model, client):
+        """Test that the tracked prefixes cover the user hashes but not the rankings sharing their prefix"""
+        for partition in (Partition(client), Partition(client, tag="3")):
+            for ranking in (TOP_FOLLOWERS, TOP_POSTERS):
+                assert not partition.key(ranking).startswith(CACHED_PREFIXES)
+            assert partition.user_key(model.next_id()).startswith(CACHED_PREFIXES)
+            assert partition.chirp_key(model.next_id()).startswith(CACHED_PREFIXES)
+
+    def test_tracking_requires_server_support(self, client):
+        """Test that tracking invalidation is refused by a server without CLIENT TRACKING"""
+        with patch('src.models.connections.redis.Redis', return_value=client):
+            with pytest.raises(ValueError):
+                ChirpRedisModel(cache=True)
+            with pytest.raises(ValueError):
+                ChirpRedisModel(cache=True, cache_invalidation="polling")
+
+    def test_writes_of_other_processes_invalidate(self):
+        """Test that a write from another client drops the cached hash (local Redis server)"""
+        try:
+            model = ChirpRedisModel(db=TEST_DB, cache=True, cache_invalidation="keyspace")
+        except (redis.ConnectionError, ValueError):
+            pytest.skip("No local Redis server with keyspace notifications")
+        other = redis.Redis(db=TEST_DB, decode_responses=True)
+        try:
+            model.reset_db()
+            user_id = model.add_user("watched", "Watched User")
+            chirp_id = model.post_chirp(user_id, "Watch me")
+            assert model.get_chirps([chirp_id])[0]["favorite_count"] == 0
+
+            other.hset(f"chirp:{chirp_id}", "favorite_count", 42)
+            deadline = time.monotonic() + 5
+            while model.get_chirps([chirp_id])[0]["favorite_count"] != 42:
+                assert time.monotonic() < deadline, "The cached chirp was never invalidated"
+                time.sleep(0.05)
+        finally:
+            model.close()
+            other.flushdb()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the storage codecs of the chirp hashes
+"""
+
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.codecs import CODECS, get_codec, train_dictionary
+from src.models.schema import DICTIONARY, TOP_LIKED, chirp_record
+
+class TestCodecs:
+    """Test class for the storage codecs and the model reads and writes through them"""
+
+    @pytest.fixture
+    def make_tweet(self, make_tweet):
+        """Build tweets with texts sharing words, and a few rechirps"""
+        def factory(i):
+            text = f"Chirp {i} about the weather in the city today, what a sunny day for a walk #chirp"
+            return make_tweet(i, text=text, retweet_count=i % 3)
+        return factory
+
+    @pytest.fixture
+    def expected(self, make_model, make_client, make_tweet):
+        """Chirps and users as read from plain hashes"""
+        model = make_model(make_client())
+        model.import_chirps([make_tweet(i) for i in range(20)])
+        return model.get_latest_chirps(20), model.get_top_users_by_followers(5)
+
+    @pytest.mark.parametrize("codec", sorted(CODECS))
+    def test_reads_match_plain_hashes(self, make_model, make_tweet, expected, codec):
+        """Test that every codec reads back what plain hashes hold, in every keyspace layout"""
+        model = make_model(codec=codec)
+        model.import_chirps([make_tweet(i) for i in range(20)])
+        assert model.get_latest_chirps(20) == expected[0]
+        assert model.get_top_users_by_followers(5) == expected[1]
+
+        model = make_model(codec=codec, cluster=True, partitions=4)
+        user_id = model.add_user("poster", "Poster", "https://pbs.twimg.com/profile_images/9/me.jpg")
+        chirp_id = model.post_chirp(user_id, "Hello codecs")
+        model.like_chirp(chirp_id)
+        model.rechirp(chirp_id)
+        chirp = model.get_chirps([chirp_id])[0]
+        assert (chirp["text"], chirp["username"], chirp["favorite_count"], chirp["retweet_count"]) == \
+            ("Hello codecs", "poster", 1, 1)
+        assert model.get_users([user_id])[0]["profile_image"] == "https://pbs.twimg.com/profile_images/9/me.jpg"
+
+    @pytest.mark.parametrize("written, writer", [("packed", "hash"), ("hash", "compact")])
+    def test_engagement_of_other_layouts(self, make_model, make_tweet, client, written, writer):
+        """Test that likes, rechirps and fixes go to the counters the chirp is stored with"""
+        make_model(codec=written).import_chirps([make_tweet(4)])
+        fields = set(client.hgetall("chirp:5004"))
+
+        model = make_model(codec=writer)
+        assert model.like_chirp("5004") == 5
+        assert model.rechirp("5004") == 2
+        assert set(client.hgetall("chirp:5004")) == fields
+        chirp = model.get_chirps(["5004"])[0]
+        assert (chirp["favorite_count"], chirp["retweet_count"]) == (5, 2)
+
+        model.set_engagement("5004", 40, 30)
+        assert set(client.hgetall("chirp:5004")) == fields
+        chirp = model.get_chirps(["5004"])[0]
+        assert (chirp["favorite_count"], chirp["retweet_count"]) == (40, 30)
+        assert client.zscore(TOP_LIKED, "5004") == 40
+
+        # Fixing a missing chirp leaves no stray counters behind
+        model.set_engagement("42", 1, 1)
+        assert not client.exists("chirp:42")
+
+    def test_layouts(self, make_tweet):
+        """Test the fields written by each codec"""
+        _, (chirp_hash, _) = chirp_record(make_tweet(0))
+        assert set(get_codec("hash").encode(chirp_hash)) == set(chirp_hash)
+        assert get_codec("compact").encode(chirp_hash)["c"] == 1711972800
+        assert set(get_codec("packed").encode(chirp_hash)) == {"d", "f", "r"}
+
+        zlib = get_codec("zlib", lambda: train_dictionary([chirp_hash["text"]] * 5))
+        assert set(zlib.encode(chirp_hash)) == {"z", "f", "r"}
+        # Packed fields come back as strings, as Redis returns them
+        assert zlib.decode(zlib.encode(chirp_hash)) == dict(chirp_hash, created_at="1711972800",
+                                                            favorite_count=0, retweet_count=0)
+        # Texts deflating to more bytes than they hold are only packed
+        assert set(zlib.encode(dict(chirp_hash, text="x"))) == {"d", "f", "r"}
+
+        with pytest.raises(ValueError):
+            get_codec("zlib").encode(chirp_hash)
+        with pytest.raises(ValueError):
+            get_codec("msgpack")
+
+    def test_dictionary_is_trained_once(self, make_model, make_tweet, client):
+        """Test that the zlib codec trains its dictionary on the first import and keeps it"""
+        model = make_model(codec="zlib")
+        model.import_chirps([make_tweet(i) for i in range(10)])
+        dictionary = client.get(DICTIONARY)
+        assert b"the weather" in model.codec.dictionary
+
+        make_model(codec="zlib").import_chirps([make_tweet(i) for i in range(10, 20)])
+        assert client.get(DICTIONARY) == dictionary
+        assert all("z" in client.hgetall(f"chirp:{5000 + i}") for i in range(20))
+
+        # Readers configured with another codec load it when they meet a deflated chirp
+        assert len(make_model().get_latest_chirps(20)) == 20
+
+    def test_recode_chirps(self, make_model, make_tweet, client, expected):
+        """Test migrating plain hashes to another codec, with the rankings untouched"""
+        make_model().import_chirps([make_tweet(i) for i in range(20)])
+        liked = client.zrange(TOP_LIKED, 0, -1, withscores=True)
+
+        model = make_model(codec="packed")
+        assert model.recode_chirps(batch_size=7) == 20
+        assert model.recode_chirps() == 0
+        assert set(client.hgetall("chirp:5003")) == {"d", "f", "r"}
+        assert model.get_latest_chirps(20) == expected[0]
+
+        # The engagement backfill and the counters of the sweeper read every layout
+        client.delete(TOP_LIKED)
+        model.rebuild_engagement_rankings()
+        assert client.zrange(TOP_LIKED, 0, -1, withscores=True) == liked
+        assert model.rebuild_stats() == {"chirps": 20, "users": 5}
+        assert model.get_stats()["posters"] == 5
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the connection pools and the read-replica routing
+"""
+
+import sys
+import os
+import pytest
+import fakeredis
+from unittest.mock import patch
+from redis.connection import _RESP2Parser
+from redis.utils import HIREDIS_AVAILABLE
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.connections import ReplicaRouter, create_client, parse_endpoint, parser_class
+from src.models.redis_model import ChirpRedisModel
+
+class TestConnections:
+    """Test class for the connection pools and the read-replica routing"""
+
+    @pytest.fixture
+    def servers(self):
+        """Fake Redis servers by port: a primary on 7000 and replicas on 7001 and 7002"""
+        return {port: fakeredis.FakeServer() for port in (7000, 7001, 7002)}
+
+    @pytest.fixture
+    def model_factory(self, servers):
+        """Create models whose clients connect to the fake server of their port"""
+        # Created before patching, fakeredis clients are redis.Redis subclasses
+        clients = {
+            port: fakeredis.FakeStrictRedis(server=server, decode_responses=True)
+            for port, server in servers.items()
+        }
+
+        def fake_client(connection_pool):
+            return clients[connection_pool.connection_kwargs["port"]]
+
+        def factory(**kwargs):
+            with patch('src.models.connections.redis.Redis', side_effect=fake_client):
+                return ChirpRedisModel(port=7000, replicas=["localhost:7001", "localhost:7002"], **kwargs)
+        return factory
+
+    def seed(self, server, chirp_id, text):
+        """Write a chirp directly on a server"""
+        client = fakeredis.FakeStrictRedis(server=server, decode_responses=True)
+        client.hset(f"chirp:{chirp_id}", mapping={"text": text, "favorite_count": 1, "retweet_count": 0})
+        client.zadd("chirps:timeline", {chirp_id: 1})
+        client.zadd("chirps:top_liked", {chirp_id: 1})
+
+    def test_parse_endpoint(self):
+        """Test the accepted replica endpoint formats"""
+        assert parse_endpoint("replica:6380") == ("replica", 6380)
+        assert parse_endpoint("replica") == ("replica", 6379)
+        assert parse_endpoint(("replica", "6381")) == ("replica", 6381)
+
+    def test_parser_selection(self):
+        """Test resolving reply parsers"""
+        assert parser_class("python") is _RESP2Parser
+        with pytest.raises(ValueError):
+            parser_class("fast")
+        if not HIREDIS_AVAILABLE:
+            with pytest.raises(ValueError):
+                parser_class("hiredis")
+
+    def test_pool_options(self):
+        """Test that the pool options reach the connections"""
+        client = create_client(port=7000, max_connections=5, socket_timeout=0.5,
+                               socket_connect_timeout=0.2, socket_keepalive=True, parser="python")
+        pool = client.connection_pool
+
+        assert pool.max_connections == 5
+        assert pool.connection_kwargs["socket_timeout"] == 0.5
+        assert pool.connection_kwargs["socket_connect_timeout"] == 0.2
+        assert pool.connection_kwargs["socket_keepalive"] is True
+        assert pool.connection_kwargs["parser_class"] is _RESP2Parser
+        assert pool.connection_kwargs["decode_responses"] is True
+
+    def test_reads_round_robin_across_replicas(self, model_factory, servers):
+        """Test that feed reads alternate between replicas and writes go to the primary"""
+        model = model_factory()
+        self.seed(servers[7001], "1", "from replica 1")
+        self.seed(servers[7002], "2", "from replica 2")
+
+        user_id = model.add_user("writer", "Writer")
+        chirp_id = model.post_chirp(user_id, "from the primary")
+
+        texts = [model.get_latest_chirps(1)[0]["text"] for _ in range(4)]
+        assert texts == ["from replica 1", "from replica 2"] * 2
+        assert model.get_top_liked_chirps(1)[0]["text"] == "from replica 1"
+
+        # Writes and direct lookups stay on the primary
+        assert model.get_chirps([chirp_id])[0]["text"] == "from the primary"
+        assert not fakeredis.FakeStrictRedis(server=servers[7001]).exists(f"chirp:{chirp_id}")
+
+    def test_replica_reads_are_not_cached(self, model_factory, servers):
+        """Test that hashes read on a lagging replica never fill the cache"""
+        model = model_factory(cache=True, cache_invalidation="keyspace")
+        self.seed(servers[7000], "1", "edited on the primary")
+        self.seed(servers[7001], "1", "stale on replica 1")
+        self.seed(servers[7002], "1", "stale on replica 2")
+
+        assert model.get_latest_chirps(1)[0]["text"] == "stale on replica 1"
+        assert model.cache.stats()["entries"] == 0
+        # Direct lookups read the primary and are cached
+        assert model.get_chirps(["1"])[0]["text"] == "edited on the primary"
+        assert model.cache.stats()["entries"] == 1
+        model.close()
+
+    def test_unreachable_replica_falls_back_to_primary(self, model_factory, servers):
+        """Test that a read on a replica which is down is served by the primary"""
+        model = model_factory()
+        self.seed(servers[7000], "0", "from the primary")
+        self.seed(servers[7002], "2", "from replica 2")
+        servers[7001].connected = False
+
+        texts = [model.get_latest_chirps(1)[0]["text"] for _ in range(2)]
+        assert texts == ["from the primary", "from replica 2"]
+
+    def test_least_latency_skips_unreachable_replicas(self, model_factory, servers):
+        """Test that least latency routing only picks replicas which answer"""
+        model = model_factory(replica_strategy="least_latency")
+        self.seed(servers[7002], "2", "from replica 2")
+        servers[7001].connected = False
+
+        assert [chirp["text"] for chirp in model.get_latest_chirps(1)] == ["from replica 2"]
+        assert model.replicas.latencies[0] == float("inf")
+
+        # Without any reachable replica, the primary serves the reads
+        servers[7002].connected = False
+        model.replicas._probed_at = None
+        assert model.get_latest_chirps(1) == []
+
+    def test_unknown_strategy(self):
+        """Test that an unknown routing strategy is rejected"""
+        with pytest.raises(ValueError):
+            ReplicaRouter([create_client(port=7001)], strategy="random")
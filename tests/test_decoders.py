@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the tweet decoders
+"""
+
+import sys
+import os
+import json
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ingest.decoders import TweetDecoder, available_backends, project_tweet
+
+class TestTweetDecoder:
+    """Test class for TweetDecoder"""
+    
+    @pytest.fixture
+    def raw_tweet(self):
+        """Create a raw tweet with more fields than the model reads"""
+        return {
+            "id": 1000001,
+            "text": "This is a test tweet",
+            "lang": "en",
+            "source": "web",
+            "entities": {"hashtags": []},
+            "user": {
+                "id": 101,
+                "name": "User One",
+                "screen_name": "user1",
+                "followers_count": 100,
+                "friends_count": 50,
+                "statuses_count": 200,
+                "created_at": "Mon Apr 01 12:00:00 +0000 2025",
+                "description": "A long biography"
+            },
+            "created_at": "Mon Apr 01 12:00:00 +0000 2025",
+            "timestamp_ms": "1712055000000",
+            "favorite_count": 10,
+            "retweet_count": 5
+        }
+    
+    def test_project_tweet(self, raw_tweet):
+        """Test that projected tweets keep only the fields read by the model"""
+        record = project_tweet(raw_tweet)
+        
+        assert "entities" not in record and "source" not in record
+        assert "description" not in record["user"]
+        assert record["user"]["screen_name"] == "user1"
+        assert record["timestamp_ms"] == "1712055000000"
+    
+    @pytest.mark.parametrize("backend", available_backends())
+    def test_backends_agree(self, raw_tweet, backend):
+        """Test that every installed backend produces the same record"""
+        compact = json.dumps(raw_tweet, separators=(',', ':')).encode()
+        spaced = json.dumps(raw_tweet).encode()
+        decoder = TweetDecoder(backend)
+        
+        assert decoder.decode(compact) == project_tweet(raw_tweet)
+        assert decoder.decode(spaced) == project_tweet(raw_tweet)
+    
+    def test_skips_other_languages_before_parsing(self, raw_tweet, mocker):
+        """Test that lines without an English marker are never parsed"""
+        decoder = TweetDecoder("json")
+        spy = mocker.spy(decoder, "_loads")
+        
+        assert decoder.decode(json.dumps(dict(raw_tweet, lang="fr")).encode()) is None
+        assert spy.call_count == 0
+    
+    def test_nested_english_marker(self, raw_tweet):
+        """Test that a French tweet quoting an English one is rejected after parsing"""
+        tweet = dict(raw_tweet, lang="fr", quoted_status=dict(raw_tweet))
+        
+        assert TweetDecoder().decode(json.dumps(tweet).encode()) is None
+    
+    def test_invalid_json(self):
+        """Test that invalid lines are skipped"""
+        assert TweetDecoder().decode(b'{"lang":"en", "id": ') is None
+    
+    def test_unknown_backend(self):
+        """Test that unknown backends are rejected"""
+        with pytest.raises(ValueError):
+            TweetDecoder("yaml")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the chirp and user ID generator
+"""
+
+import sys
+import os
+import threading
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.id_generator import SnowflakeIdGenerator
+
+class TestSnowflakeIdGenerator:
+    """Test class for SnowflakeIdGenerator"""
+    
+    def test_ids_are_unique_and_increasing(self):
+        """Test that a burst of IDs is collision-free and sorted"""
+        generator = SnowflakeIdGenerator(worker_id=1)
+        
+        ids = [generator.next_id() for _ in range(100000)]
+        
+        assert len(set(ids)) == len(ids)
+        assert ids == sorted(ids)
+    
+    def test_workers_never_collide(self):
+        """Test that two workers issuing IDs in the same millisecond do not collide"""
+        first = SnowflakeIdGenerator(worker_id=1)
+        second = SnowflakeIdGenerator(worker_id=2)
+        first._now_ms = second._now_ms = lambda: 1712055000000
+        
+        first_ids = {first.next_id() for _ in range(100)}
+        second_ids = {second.next_id() for _ in range(100)}
+        
+        assert not first_ids & second_ids
+    
+    def test_thread_safety(self):
+        """Test that threads sharing a generator get distinct IDs"""
+        generator = SnowflakeIdGenerator(worker_id=3)
+        results = []
+        
+        def worker():
+            results.extend(generator.next_id() for _ in range(10000))
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(set(results)) == 40000
+    
+    def test_sequence_overflow_waits_for_next_millisecond(self):
+        """Test that the 4097th ID of a millisecond moves to the next one"""
+        generator = SnowflakeIdGenerator(worker_id=0)
+        clock = iter([1000] * 4097 + [1001])
+        generator._now_ms = lambda: next(clock)
+        
+        ids = [generator.next_id() for _ in range(4097)]
+        
+        assert SnowflakeIdGenerator.timestamp_ms(ids[4095]) == 1000
+        assert SnowflakeIdGenerator.timestamp_ms(ids[4096]) == 1001
+    
+    def test_timestamp_roundtrip(self):
+        """Test extracting the creation time of an ID"""
+        generator = SnowflakeIdGenerator(worker_id=5)
+        generator._now_ms = lambda: 1712055000123
+        
+        assert SnowflakeIdGenerator.timestamp_ms(generator.next_id()) == 1712055000123
+    
+    def test_invalid_worker_id(self):
+        """Test that out-of-range worker IDs are rejected"""
+        with pytest.raises(ValueError):
+            SnowflakeIdGenerator(worker_id=1024)
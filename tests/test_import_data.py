@@ -5,6 +5,8 @@ Unit tests for the data import functionality
 
 import sys
 import os
+import io
+import bz2
 import json
 import pytest
 import tempfile
@@ -13,8 +15,23 @@ from unittest.mock import patch, MagicMock
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from scripts.import_data import import_data
+from scripts.import_data import export_resp, import_data
+from scripts.process_jsonl import process_jsonl_bz2_files
+from src.ingest.tweet_files import iter_json_array
 from src.models.redis_model import ChirpRedisModel
+from src.models.resp import encode_command, iter_commands, load_resp
+
+def keyspace(client, ignore=("import:checkpoints", "ids:workers")):
+    """Snapshot the content of every key of a database"""
+    readers = {
+        "hash": client.hgetall,
+        "zset": lambda key: client.zrange(key, 0, -1, withscores=True),
+        "set": client.smembers,  # Fake Redis stores HyperLogLogs as sets
+    }
+    return {
+        key: (client.type(key), readers[client.type(key)](key))
+        for key in client.keys("*") if key not in ignore
+    }
 
 class TestDataImport:
     """Test class for the data import functionality"""
@@ -102,7 +119,7 @@ class TestDataImport:
             }
         ]
     
-    def test_import_english_tweets_only(self, fake_redis, sample_tweets, monkeypatch):
+    def test_import_english_tweets_only(self, fake_redis, sample_tweets, monkeypatch, capsys):
         """Test that only English tweets are imported"""
         # Create a temporary file with the sample tweets
         with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
@@ -130,6 +147,9 @@ class TestDataImport:
                 assert fake_redis.exists("chirp:1000001")
                 assert fake_redis.exists("chirp:1000002")
                 assert fake_redis.exists("chirp:1000003")
+                
+                # New users are read from the users counter
+                assert "New users: 3" in capsys.readouterr().out
         finally:
             # Clean up the temporary file
             os.unlink(temp_file)
@@ -199,4 +219,267 @@ class TestDataImport:
                 assert fake_redis.zcard("chirps:timeline") == 0
         finally:
             # Clean up the temporary file
-            os.unlink(temp_file)
\ No newline at end of file
+            os.unlink(temp_file)
+    
+    def test_import_bz2_json_lines(self, fake_redis, sample_tweets):
+        """Test importing a BZ2 compressed line-by-line JSON file"""
+        with tempfile.NamedTemporaryFile(suffix='.json.bz2', delete=False) as f:
+            temp_file = f.name
+        with bz2.open(temp_file, 'wt', encoding='utf-8') as f:
+            for tweet in sample_tweets:
+                f.write(json.dumps(tweet) + "\n")
+            f.write("not json\n")
+        
+        try:
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(temp_file, batch_size=2)
+                
+                assert fake_redis.zcard("chirps:timeline") == 3
+                assert not fake_redis.exists("chirp:1000004")
+        finally:
+            os.unlink(temp_file)
+    
+    def test_iter_json_array_streams_items(self, sample_tweets):
+        """Test decoding a JSON array with chunks smaller than a tweet"""
+        f = io.StringIO(json.dumps(sample_tweets, indent=2))
+        
+        tweets = list(iter_json_array(f, chunk_size=16))
+        
+        assert tweets == sample_tweets
+    
+    def test_limit_stops_reading_early(self, fake_redis, sample_tweets):
+        """Test that the limit is applied lazily while reading"""
+        read = []
+        
+        def fake_read_tweets(file_path, decoder=None):
+            for tweet in sample_tweets * 1000:
+                read.append(tweet)
+                yield tweet
+        
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
+            temp_file = f.name
+        
+        try:
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                with patch('scripts.import_data.read_tweets', side_effect=fake_read_tweets):
+                    import_data(temp_file, limit=2, batch_size=1)
+            
+            assert len(read) == 2
+            assert fake_redis.zcard("chirps:timeline") == 2
+        finally:
+            os.unlink(temp_file)
+    
+    def test_import_directory_in_parallel(self, fake_redis, sample_tweets):
+        """Test importing every .json.bz2 file of a directory with worker processes"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i, tweets in enumerate((sample_tweets[:2], sample_tweets[2:])):
+                with bz2.open(os.path.join(temp_dir, f"{i:02d}.json.bz2"), 'wt', encoding='utf-8') as f:
+                    for tweet in tweets:
+                        f.write(json.dumps(tweet) + "\n")
+            
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(temp_dir, workers=2)
+            
+            assert fake_redis.zcard("chirps:timeline") == 3
+            assert not fake_redis.exists("chirp:1000004")
+    
+    def test_import_directory_with_limit(self, fake_redis, sample_tweets):
+        """Test that the limit keeps the first tweets in file order"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i, tweet in enumerate(sample_tweets):
+                with bz2.open(os.path.join(temp_dir, f"{i:02d}.json.bz2"), 'wt', encoding='utf-8') as f:
+                    f.write(json.dumps(tweet) + "\n")
+            
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(temp_dir, limit=2, workers=2)
+            
+            assert fake_redis.zrange("chirps:timeline", 0, -1) == ["1000001", "1000002"]
+    
+    def test_import_chunked_jsonl_output(self, fake_redis, sample_tweets):
+        """Test importing the compact part files written by process_jsonl"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_dir = os.path.join(temp_dir, "raw")
+            os.makedirs(input_dir)
+            with bz2.open(os.path.join(input_dir, "00.json.bz2"), 'wt', encoding='utf-8') as f:
+                for tweet in sample_tweets:
+                    f.write(json.dumps(tweet) + "\n")
+            
+            process_jsonl_bz2_files(input_dir, temp_dir, workers=1, chunk_size=2)
+            
+            parts_dir = os.path.join(temp_dir, "english_tweets")
+            assert sorted(os.listdir(parts_dir)) == ["part-00000.jsonl", "part-00001.jsonl"]
+            
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(parts_dir, workers=2)
+            
+            assert fake_redis.zrange("chirps:timeline", 0, -1) == ["1000001", "1000002", "1000003"]
+            assert fake_redis.hget("users:101", "username") == "user1"
+    
+    def test_resume_after_failure(self, fake_redis, sample_tweets):
+        """Test that --resume continues after the last committed batch"""
+        tweets = [dict(tweet, lang="en", id=1000001 + i) for i, tweet in enumerate(sample_tweets * 2)]
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            for tweet in tweets:
+                f.write(json.dumps(tweet) + "\n")
+            temp_file = f.name
+        
+        try:
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                # Crash while writing the third batch
+                original = ChirpRedisModel.import_chirps
+                calls = []
+                
+                def flaky_import_chirps(self, chirps, chunk_size=1000):
+                    calls.append(chirps)
+                    if len(calls) == 3:
+                        raise ConnectionError("Connection lost")
+                    return original(self, chirps, chunk_size)
+                
+                with patch.object(ChirpRedisModel, 'import_chirps', flaky_import_chirps):
+                    import_data(temp_file, batch_size=3)
+                
+                assert fake_redis.zcard("chirps:timeline") == 6
+                assert fake_redis.hget("import:checkpoints", os.path.abspath(temp_file)) == "6"
+                
+                # Resuming only reads the remaining tweets
+                with patch.object(ChirpRedisModel, 'import_chirps', autospec=True,
+                                  side_effect=original) as spy:
+                    import_data(temp_file, batch_size=3, resume=True)
+                
+                assert [len(call.args[1]) for call in spy.call_args_list] == [2]
+                assert fake_redis.zcard("chirps:timeline") == 8
+                assert fake_redis.hget("import:checkpoints", os.path.abspath(temp_file)) == "done"
+        finally:
+            os.unlink(temp_file)
+    
+    def test_resume_skips_completed_files(self, fake_redis, sample_tweets):
+        """Test that files fully imported are not read again"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i, tweet in enumerate(sample_tweets[:2]):
+                with bz2.open(os.path.join(temp_dir, f"{i:02d}.json.bz2"), 'wt', encoding='utf-8') as f:
+                    f.write(json.dumps(tweet) + "\n")
+            
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(temp_dir, workers=1)
+                fake_redis.delete("chirp:1000001")
+                
+                import_data(temp_dir, workers=1, resume=True)
+            
+            # The first file was not imported again
+            assert not fake_redis.exists("chirp:1000001")
+            assert fake_redis.exists("chirp:1000002")
+    
+    def test_reimport_is_idempotent(self, fake_redis, sample_tweets):
+        """Test that importing the same tweets twice changes nothing"""
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
+            json.dump(sample_tweets, f)
+            temp_file = f.name
+        
+        try:
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(temp_file)
+                model = ChirpRedisModel()
+                model.like_chirp("1000001")
+                snapshot = {key: fake_redis.dump(key) for key in fake_redis.keys("*")}
+                
+                import_data(temp_file)
+            
+            assert {key: fake_redis.dump(key) for key in fake_redis.keys("*")} == snapshot
+            assert fake_redis.hget("chirp:1000001", "favorite_count") == "11"
+            assert fake_redis.zscore("chirps:top_liked", "1000001") == 11
+        finally:
+            os.unlink(temp_file)
+    
+    def test_encode_command(self):
+        """Test the RESP encoding of a command"""
+        assert encode_command("HSET", "chirp:1", "text", "héllo", "score", 1.5) == (
+            b"*6\r\n$4\r\nHSET\r\n$7\r\nchirp:1\r\n$4\r\ntext\r\n"
+            b"$6\r\nh\xc3\xa9llo\r\n$5\r\nscore\r\n$3\r\n1.5\r\n"
+        )
+        assert list(iter_commands(io.BytesIO(encode_command("SET", "a\r\nb", 1)))) == [
+            [b"SET", b"a\r\nb", b"1"]
+        ]
+    
+    def test_emit_resp_matches_import(self, fake_redis, sample_tweets):
+        """Test that loading the RESP export gives the same keyspace as the import"""
+        # A user posting several times and a duplicated tweet, across chunks
+        again = dict(sample_tweets[0], id=1000005, timestamp_ms="1712062200000",
+                     user=dict(sample_tweets[0]["user"], name="Renamed", followers_count=150))
+        tweets = sample_tweets + [again, sample_tweets[1], {"id": 1000006, "lang": "en"}]
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "tweets.json")
+            with open(input_file, 'w') as f:
+                json.dump(tweets, f)
+            
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(input_file, batch_size=2)
+            
+            output_file = os.path.join(temp_dir, "tweets.resp")
+            export_resp(input_file, output_file, batch_size=2)
+            
+            loaded = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+            with open(output_file, 'rb') as f:
+                for command in iter_commands(f):
+                    loaded.execute_command(*command)
+        
+        assert keyspace(loaded) == keyspace(fake_redis)
+        assert loaded.hget("users:101", "name") == "User One"
+        assert loaded.hget("users:101", "follower_count") == "150"
+    
+    def test_load_resp(self, sample_tweets):
+        """Test streaming a RESP file into a Redis server"""
+        client = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        try:
+            server = ChirpRedisModel(db=15).redis
+            server.ping()
+        except Exception:
+            pytest.skip("No Redis server on localhost:6379")
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "tweets.json")
+            with open(input_file, 'w') as f:
+                json.dump(sample_tweets, f)
+            output_file = os.path.join(temp_dir, "tweets.resp")
+            export_resp(input_file, output_file)
+            
+            server.flushdb()
+            try:
+                replies, errors = load_resp(output_file, db=15, chunk_size=7)
+                
+                with open(output_file, 'rb') as f:
+                    for command in iter_commands(f):
+                        client.execute_command(*command)
+                
+                assert replies == 17
+                assert errors == []
+                assert keyspace(server) == keyspace(client)
+            finally:
+                server.flushdb()
+    
+    def test_async_import_matches_sync_import(self, fake_redis, sample_tweets):
+        """Test that the async importer writes the same keyspace as the sync one"""
+        server = ChirpRedisModel(db=15).redis
+        try:
+            server.ping()
+        except Exception:
+            pytest.skip("No Redis server on localhost:6379")
+        
+        tweets = [dict(tweet, lang="en", id=2000000 + i) for i, tweet in enumerate(sample_tweets * 5)]
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            json.dump(tweets, f)
+            temp_file = f.name
+        
+        server.flushdb()
+        try:
+            with patch('src.models.redis_model.redis.Redis', return_value=fake_redis):
+                import_data(temp_file, batch_size=3)
+            
+            import_data(temp_file, db=15, batch_size=3, use_async=True, writers=3)
+            
+            assert keyspace(server) == keyspace(fake_redis)
+            assert server.zcard("chirps:timeline") == 20
+            assert server.hget("import:checkpoints", os.path.abspath(temp_file)) == "done"
+        finally:
+            server.flushdb()
+            os.unlink(temp_file)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the model options shared by the entry points
+"""
+
+import sys
+import os
+import argparse
+import inspect
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.options import add_model_arguments, env_options, model_options
+from src.models.redis_model import ChirpRedisModel
+
+class TestOptions:
+    """Test class for the command-line and environment options of ChirpRedisModel"""
+
+    def test_defaults_match_the_model(self):
+        """Test that unset options keep the defaults of the constructor"""
+        parser = argparse.ArgumentParser()
+        add_model_arguments(parser)
+        from_args = model_options(parser.parse_args([]))
+        from_env = env_options({})
+        defaults = {name: parameter.default
+                    for name, parameter in inspect.signature(ChirpRedisModel).parameters.items()}
+        assert all(from_args[name] == defaults[name] for name in from_args)
+        assert all(from_env[name] == defaults[name] for name in from_env)
+
+    def test_command_line(self):
+        """Test the conversions of the command line, and the parsers without the read options"""
+        parser = argparse.ArgumentParser()
+        add_model_arguments(parser)
+        args = parser.parse_args(["--shard", "a:1", "--shard", "b:2", "--retention-days", "2",
+                                  "--cache", "--cache-mb", "0.5", "--user-buckets", "3"])
+        options = model_options(args)
+        assert options["shards"] == ["a:1", "b:2"]
+        assert options["timeline_retention"] == 2 * 86400
+        assert (options["cache"], options["cache_max_bytes"]) == (True, 512 * 1024)
+        assert options["user_buckets"] == 3
+
+        parser = argparse.ArgumentParser()
+        add_model_arguments(parser, reads=False)
+        options = model_options(parser.parse_args(["--codec", "packed"]))
+        assert options["codec"] == "packed"
+        assert "replicas" not in options and "cache" not in options
+        with pytest.raises(SystemExit):
+            parser.parse_args(["--cache"])
+
+    def test_environment(self):
+        """Test reading the CHIRP_REDIS_* variables"""
+        options = env_options({
+            "CHIRP_REDIS_PORT": "6380",
+            "CHIRP_REDIS_REPLICAS": "a:1,,b:2",
+            "CHIRP_REDIS_CACHE": "keyspace",
+            "CHIRP_REDIS_SNAPSHOTS": "5",
+            "CHIRP_REDIS_TIMELINE_BUCKETS": "hour",
+            "CHIRP_REDIS_RETENTION_DAYS": "1",
+            "CHIRP_REDIS_USER_BUCKETS": "",
+        })
+        assert (options["host"], options["port"], options["db"]) == ("localhost", 6380, 0)
+        assert options["replicas"] == ["a:1", "b:2"]
+        assert (options["cache"], options["cache_invalidation"]) == (True, "keyspace")
+        assert (options["snapshots"], options["snapshot_max_age"]) == (True, 5.0)
+        assert (options["timeline_buckets"], options["timeline_retention"]) == ("hour", 86400)
+        assert options["user_buckets"] is None
+        assert options["cluster"] is False
+
+        options = env_options({"CHIRP_REDIS_CLUSTER": "true", "CHIRP_REDIS_PARTITIONS": "4"})
+        assert (options["cluster"], options["partitions"]) == (True, 4)
+
+    def test_constructors(self, mocker):
+        """Test that from_args and from_env pass their options, with the overrides taking precedence"""
+        init = mocker.patch.object(ChirpRedisModel, "__init__", return_value=None)
+        parser = argparse.ArgumentParser()
+        add_model_arguments(parser)
+        ChirpRedisModel.from_args(parser.parse_args(["--codec", "zlib"]), socket_keepalive=True)
+        assert init.call_args.kwargs["codec"] == "zlib"
+        assert init.call_args.kwargs["socket_keepalive"] is True
+
+        ChirpRedisModel.from_env({"CHIRP_REDIS_CODEC": "packed"}, codec="compact")
+        assert init.call_args.kwargs["codec"] == "compact"
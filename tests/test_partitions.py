@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the partitioned keyspace of the cluster and sharded modes
+"""
+
+import sys
+import os
+import pytest
+import redis
+from unittest.mock import patch
+from redis.crc import key_slot
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.partitions import ConsistentHashPartitioner, HashTagPartitioner, merge_ranked
+from src.models.rebalance import rebalance
+from src.models.redis_model import ChirpRedisModel
+from src.models.schema import TIMELINE, TOP_LIKED, TOP_POSTERS, USERNAMES
+
+class TestPartitions:
+    """Test class for the cluster and sharded modes of ChirpRedisModel"""
+
+    @pytest.fixture
+    def cluster_model(self, make_model):
+        """Create a cluster mode model over the fake Redis, which refuses commands spanning slots"""
+        return make_model(cluster=True, partitions=4)
+
+    @pytest.fixture
+    def single_model(self, make_model, make_client):
+        """Create a single-node model over its own fake Redis"""
+        return make_model(make_client())
+
+    @pytest.fixture
+    def shard_clients(self, make_client):
+        """Fake Redis servers by port, standing in for four standalone shards"""
+        return {port: make_client() for port in (7100, 7101, 7102, 7103)}
+
+    @pytest.fixture
+    def sharded_factory(self, shard_clients):
+        """Create sharded models whose clients connect to the fake server of their port"""
+        def fake_client(connection_pool):
+            return shard_clients[connection_pool.connection_kwargs["port"]]
+
+        def factory(ports):
+            with patch('src.models.connections.redis.Redis', side_effect=fake_client):
+                return ChirpRedisModel(shards=[f"localhost:{port}" for port in ports])
+        return factory
+
+    @pytest.fixture
+    def tweets(self, make_tweet):
+        """Tweets with shared timestamps and like counts, to exercise ties across partitions"""
+        return [make_tweet(i, 1712000000000 + 1000 * (i // 3), favorite_count=i % 4) for i in range(30)]
+
+    def test_merge_ranked(self):
+        """Test that merged rankings order ties by member, as a single sorted set does"""
+        merged = merge_ranked([[("b", 5.0), ("a", 1.0)], [("c", 5.0), ("d", 2.0)]], 3)
+        assert merged == [("c", 5.0), ("b", 5.0), ("d", 2.0)]
+
+    def test_partition_keys_share_a_slot(self):
+        """Test that the keys of a partition are all in the slot of its hash tag"""
+        partitioner = HashTagPartitioner(client=None, count=8)
+        partition = partitioner.for_chirp("42")
+
+        keys = [partition.chirp_key("42"), partition.user_key("7"), partition.key(TIMELINE),
+                partition.key(TOP_LIKED), partition.key(TOP_POSTERS)]
+        assert len({key_slot(key.encode()) for key in keys}) == 1
+        assert partition.chirp_key("42") == f"chirp:{{{partition.tag}}}:42"
+        assert len({p.tag for p in partitioner.partitions}) == 8
+
+    def test_fake_cluster_refuses_cross_slot_commands(self, cluster_model):
+        """Test that the fake cluster checks the slots of plain, pipelined and scripted commands"""
+        first, second = cluster_model.partitioner.partitions[:2]
+        keys = [first.chirp_key("1"), second.chirp_key("2")]
+        with pytest.raises(redis.ResponseError, match="CROSSSLOT"):
+            cluster_model.redis.unlink(*keys)
+        with pytest.raises(redis.ResponseError, match="CROSSSLOT"):
+            cluster_model.redis.pipeline(transaction=False).exists(*keys).execute()
+        with pytest.raises(redis.ResponseError, match="CROSSSLOT"):
+            cluster_model.redis.eval("return 1", 2, *keys)
+        assert cluster_model.redis.unlink(first.chirp_key("1"), first.key(TIMELINE)) == 0
+
+    def test_reads_match_single_node(self, cluster_model, single_model, tweets):
+        """Test that gathered and merged reads return what a single node returns"""
+        for model in (cluster_model, single_model):
+            model.import_chirps(tweets, chunk_size=7)
+
+        def ids(items, field):
+            return [item[field] for item in items]
+
+        for count in (1, 5, 30):
+            assert ids(cluster_model.get_latest_chirps(count), "chirp_id") == \
+                ids(single_model.get_latest_chirps(count), "chirp_id")
+            assert ids(cluster_model.get_top_liked_chirps(count), "chirp_id") == \
+                ids(single_model.get_top_liked_chirps(count), "chirp_id")
+            assert ids(cluster_model.get_top_users_by_followers(count), "user_id") == \
+                ids(single_model.get_top_users_by_followers(count), "user_id")
+
+        # Pages end in the middle of ties, which the cursor offset skips
+        assert ids(cluster_model.iter_timeline(chunk_size=4), "chirp_id") == \
+            ids(single_model.iter_timeline(chunk_size=4), "chirp_id")
+        assert sorted(cluster_model.get_usernames()) == sorted(single_model.get_usernames())
+
+    def test_keys_are_spread_over_partitions(self, cluster_model, client, tweets):
+        """Test that imported chirps land in several partitions, each with its own timeline"""
+        cluster_model.import_chirps(tweets)
+
+        timelines = [client.zcard(p.key(TIMELINE)) for p in cluster_model.partitioner.partitions]
+        assert sum(timelines) == len(tweets)
+        assert sum(1 for size in timelines if size) > 1
+        assert not client.exists(TIMELINE)
+
+    def test_write_paths(self, cluster_model):
+        """Test posting, liking and signing up across partitions"""
+        user_ids = [cluster_model.add_user(f"writer{i}", f"Writer {i}") for i in range(8)]
+        chirp_ids = [cluster_model.post_chirp(user_id, "Hello cluster") for user_id in user_ids]
+
+        for chirp_id in chirp_ids[:3]:
+            assert cluster_model.like_chirp(chirp_id) == 1
+        assert cluster_model.rechirp(chirp_ids[0]) == 1
+
+        assert cluster_model.get_user_id("writer3") == user_ids[3]
+        assert cluster_model.get_chirps([chirp_ids[3]])[0]["username"] == "writer3"
+        assert {user["chirp_count"] for user in cluster_model.get_top_posters(8)} == {1}
+        assert {c["chirp_id"] for c in cluster_model.get_top_liked_chirps(3)} == set(chirp_ids[:3])
+
+        with pytest.raises(ValueError):
+            cluster_model.add_user("writer0", "Duplicate")
+        with pytest.raises(ValueError):
+            cluster_model.post_chirp("unknown", "Nobody")
+        with pytest.raises(ValueError):
+            cluster_model.like_chirp("unknown")
+
+    def test_rebuild_engagement_rankings(self, cluster_model, client, tweets):
+        """Test that rankings are rebuilt into the partitions of the chirps"""
+        cluster_model.import_chirps(tweets)
+        expected = [c["chirp_id"] for c in cluster_model.get_top_liked_chirps(10)]
+        for partition in cluster_model.partitioner.partitions:
+            client.delete(partition.key(TOP_LIKED))
+
+        assert cluster_model.rebuild_engagement_rankings(batch_size=7) == len(tweets)
+        assert [c["chirp_id"] for c in cluster_model.get_top_liked_chirps(10)] == expected
+
+    def test_backends_cannot_be_combined(self):
+        """Test that replicas, the cluster mode and shards are exclusive"""
+        with pytest.raises(ValueError):
+            ChirpRedisModel(cluster=True, replicas=["localhost:6380"])
+        with pytest.raises(ValueError):
+            ChirpRedisModel(cluster=True, shards=["localhost:6380"])
+
+    def test_sharded_reads_match_single_node(self, sharded_factory, shard_clients, single_model, tweets):
+        """Test that reads gathered from the shards in parallel return what a single node returns"""
+        sharded_model = sharded_factory([7100, 7101, 7102])
+        for model in (sharded_model, single_model):
+            model.import_chirps(tweets, chunk_size=7)
+
+        assert [c["chirp_id"] for c in sharded_model.get_latest_chirps(30)] == \
+            [c["chirp_id"] for c in single_model.get_latest_chirps(30)]
+        assert [c["chirp_id"] for c in sharded_model.get_top_liked_chirps(10)] == \
+            [c["chirp_id"] for c in single_model.get_top_liked_chirps(10)]
+        assert [c["chirp_id"] for c in sharded_model.iter_timeline(chunk_size=4)] == \
+            [c["chirp_id"] for c in single_model.iter_timeline(chunk_size=4)]
+
+        # Each shard holds its share of the chirps, with plain keys
+        sizes = [shard_clients[port].zcard(TIMELINE) for port in (7100, 7101, 7102)]
+        assert sum(sizes) == len(tweets) and all(sizes)
+
+        # Posting works whether or not the author and the chirp share a shard
+        user_ids = [sharded_model.add_user(f"writer{i}", f"Writer {i}") for i in range(6)]
+        for user_id in user_ids:
+            sharded_model.post_chirp(user_id, "Hello shards")
+        assert {user["chirp_count"] for user in sharded_model.get_users(user_ids)} == {1}
+
+    def test_adding_a_shard_only_moves_keys_to_it(self):
+        """Test that a larger ring only reassigns keys to the new shard, about a quarter of them"""
+        old = ConsistentHashPartitioner({f"node{i}": f"client{i}" for i in range(3)})
+        new = ConsistentHashPartitioner({f"node{i}": f"client{i}" for i in range(4)})
+
+        ids = [str(1000000 + i) for i in range(4000)]
+        moved = [i for i in ids if old.for_chirp(i).client != new.for_chirp(i).client]
+        assert {new.for_chirp(i).client for i in moved} == {"client3"}
+        assert 0.15 < len(moved) / len(ids) < 0.35
+
+    def test_rebalance(self, sharded_factory, shard_clients, tweets):
+        """Test that rebalancing onto a new shard keeps every read intact"""
+        model = sharded_factory([7100, 7101, 7102])
+        model.import_chirps(tweets)
+        expected = [c["chirp_id"] for c in model.get_latest_chirps(30)]
+        liked = [c["chirp_id"] for c in model.get_top_liked_chirps(10)]
+
+        old_nodes = {f"localhost:{port}": shard_clients[port] for port in (7100, 7101, 7102)}
+        new_nodes = {**old_nodes, "localhost:7103": shard_clients[7103]}
+        assert rebalance(old_nodes, new_nodes, dry_run=True)["chirps"] > 0
+        assert not shard_clients[7103].keys()
+
+        moved = rebalance(old_nodes, new_nodes, batch_size=4)
+        # Fake Redis cursors skip keys when earlier ones are deleted, real ones do not
+        again = rebalance(old_nodes, new_nodes, batch_size=4)
+        moved = {kind: moved[kind] + again[kind] for kind in moved}
+        assert moved["chirps"] == shard_clients[7103].zcard(TIMELINE) > 0
+        assert moved["usernames"] == shard_clients[7103].hlen(USERNAMES)
+
+        model = sharded_factory([7100, 7101, 7102, 7103])
+        assert [c["chirp_id"] for c in model.get_latest_chirps(30)] == expected
+        assert [c["chirp_id"] for c in model.get_top_liked_chirps(10)] == liked
+        assert sorted(model.get_usernames()) == [f"user{i}" for i in range(5)]
+        assert all(model.get_user_id(f"user{i}") == str(100 + i) for i in range(5))
+
+        # A second run has nothing left to move
+        assert rebalance(old_nodes, new_nodes) == {"chirps": 0, "users": 0, "usernames": 0}
+
+        # A moved user posting is counted on its new shard too, until the stats are recounted
+        mover = next(str(100 + i) for i in range(5) if model.partitioner.for_user(str(100 + i)).client
+                     is shard_clients[7103])
+        model.post_chirp(mover, "Moved")
+        assert model.get_stats()["posters"] == 6
+        assert model.rebuild_stats() == {"chirps": 31, "users": 5}
+        assert model.get_stats()["posters"] == 5
+
+    def test_rebalance_keeps_writes_made_during_a_copy(self, sharded_factory, shard_clients, tweets, mocker):
+        """Test that a chirp liked between its copy and its removal is copied again"""
+        model = sharded_factory([7100, 7101, 7102])
+        model.import_chirps(tweets)
+        old_nodes = {f"localhost:{port}": shard_clients[port] for port in (7100, 7101, 7102)}
+        new_nodes = {**old_nodes, "localhost:7103": shard_clients[7103]}
+        ring = ConsistentHashPartitioner(new_nodes)
+        chirp_id = next(str(tweet["id"]) for tweet in tweets
+                        if ring.for_chirp(str(tweet["id"])).client is shard_clients[7103])
+        likes = model.get_chirps([chirp_id])[0]["favorite_count"]
+
+        target = shard_clients[7103]
+        new_pipeline = target.pipeline
+        liked = []
+
+        def pipeline(*args, **kwargs):
+            pipe = new_pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def copy_then_like():
+                copying = any(f"chirp:{chirp_id}" in args for args, _ in pipe.command_stack)
+                replies = execute()
+                if copying and not liked:
+                    liked.append(model.like_chirp(chirp_id))
+                return replies
+            pipe.execute = copy_then_like
+            return pipe
+
+        mocker.patch.object(target, "pipeline", side_effect=pipeline)
+        rebalance(old_nodes, new_nodes)
+        rebalance(old_nodes, new_nodes)
+
+        model = sharded_factory([7100, 7101, 7102, 7103])
+        assert liked == [likes + 1]
+        assert model.get_chirps([chirp_id])[0]["favorite_count"] == likes + 1
+        assert target.zscore(TOP_LIKED, chirp_id) == likes + 1
+        assert not any(shard_clients[port].exists(f"chirp:{chirp_id}") for port in (7100, 7101, 7102))
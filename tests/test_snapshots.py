@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the materialized snapshots of the rankings and the timeline
+"""
+
+import sys
+import os
+import json
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.schema import TIMELINE, TOP_LIKED, snapshot_key
+from src.models.snapshots import SNAPSHOTS, SnapshotStore
+from scripts.materialize import create_model, parse_args
+
+class TestSnapshots:
+    """Test class for the snapshot reads of ChirpRedisModel"""
+
+    @pytest.fixture
+    def models(self, make_model, make_tweet):
+        """A live model and a snapshot model over the same fake Redis"""
+        live = make_model()
+        snapshot = make_model(snapshots=True, snapshot_size=20, snapshot_max_age=60)
+        live.import_chirps([make_tweet(i, 1712000000000 + 1000 * (i // 3), i % 4) for i in range(30)])
+        return live, snapshot
+
+    def test_snapshot_reads_match_live_reads(self, models):
+        """Test that every read served from a snapshot returns what the live path returns"""
+        live, snapshot = models
+        for read in ("get_latest_chirps", "get_top_liked_chirps", "get_top_rechirped_chirps",
+                     "get_top_users_by_followers", "get_top_posters"):
+            for count in (1, 5, 20):
+                assert getattr(snapshot, read)(count) == getattr(live, read)(count)
+
+        # The cursor of the first page leads to the same second page
+        page, cursor = snapshot.get_timeline_page(limit=4)
+        assert (page, cursor) == live.get_timeline_page(limit=4)
+        assert snapshot.get_timeline_page(cursor, 4) == live.get_timeline_page(cursor, 4)
+
+        # Counts beyond the snapshot size are read live
+        assert snapshot.get_latest_chirps(25) == live.get_latest_chirps(25)
+
+    def test_reads_cost_one_get(self, models, client, mocker):
+        """Test that a fresh snapshot is served by a single GET"""
+        _, snapshot = models
+        snapshot.refresh_snapshots()
+        assert all(client.exists(snapshot_key(name)) for name in SNAPSHOTS)
+
+        spy = mocker.spy(client.connection_pool, "get_connection")
+        snapshot.get_top_liked_chirps(10)
+        snapshot.get_top_posters(5)
+        assert spy.call_count == 2
+
+    def test_staleness_is_bounded(self, models, client):
+        """Test that writes show up once the snapshot expires, and not before"""
+        live, snapshot = models
+        top = snapshot.get_top_liked_chirps(1)[0]
+        assert 0 < client.pttl(snapshot_key(TOP_LIKED)) <= 60000
+
+        underdog = live.get_latest_chirps(1)[0]["chirp_id"]
+        live.set_engagement(underdog, 1000, 0)
+        assert snapshot.get_top_liked_chirps(1)[0] == top
+
+        client.delete(snapshot_key(TOP_LIKED))  # As if max_age had passed
+        assert snapshot.get_top_liked_chirps(1)[0]["chirp_id"] == underdog
+
+    def test_snapshot_blob(self, models, client):
+        """Test that a snapshot holds the ranked entries and their rendered chirps"""
+        live, snapshot = models
+        snapshot.materialize(TIMELINE)
+
+        blob = json.loads(client.get(snapshot_key(TIMELINE)))
+        assert [member for member, _ in blob["entries"]] == \
+            [chirp["chirp_id"] for chirp in live.get_latest_chirps(20)]
+        assert set(blob["items"]) == {member for member, _ in blob["entries"]}
+
+        with pytest.raises(ValueError):
+            live.materialize(TIMELINE)
+        with pytest.raises(ValueError):
+            SnapshotStore(max_age=0)
+
+    def test_refresher_reads_the_layout(self, make_model, make_tweet, client):
+        """Test that the refresher renders the snapshots of a database with timeline and user buckets"""
+        options = {"timeline_buckets": "hour", "user_buckets": 3}
+        live = make_model(**options)
+        live.import_chirps([make_tweet(i, 1712000000000 + 600000 * i) for i in range(30)])
+
+        args = parse_args(["--timeline-buckets", "hour", "--user-buckets", "3", "--max-age", "60", "--once"])
+        with patch('src.models.connections.redis.Redis', return_value=client):
+            refresher = create_model(args)
+        assert refresher.refresh_snapshots() == len(SNAPSHOTS)
+
+        snapshot = make_model(snapshots=True, snapshot_max_age=60, **options)
+        client.delete(*client.keys("users:*"), *client.keys("chirp:*"))  # Only the snapshots can answer
+        assert len(snapshot.get_latest_chirps(3)) == 3
+        assert len(snapshot.get_top_users_by_followers(3)) == 3
+        assert len(snapshot.get_timeline_page(limit=3)[0]) == 3
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the maintained chirp, user and poster counters
+"""
+
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.schema import POSTERS, STATS, TIMELINE
+from src.models.sweeper import sweep_orphans
+
+# 2024-04-01 00:00:00 UTC, the start of an hour
+BASE_MS = 1711929600000
+HOUR_MS = 3600 * 1000
+
+class TestStats:
+    """Test class for ChirpRedisModel.get_stats"""
+
+    @pytest.fixture(params=[{}, {"cluster": True, "partitions": 4}], ids=["single", "cluster"])
+    def options(self, request):
+        """Keyspace layouts the counters are checked in"""
+        return request.param
+
+    def test_imports_are_counted_once(self, make_model, make_tweet, options):
+        """Test that re-importing the same chirps leaves the counters untouched"""
+        model = make_model(**options)
+        model.import_chirps([make_tweet(i) for i in range(20)], chunk_size=7)
+        assert model.get_stats() == {"chirps": 20, "users": 5, "posters": 5}
+
+        model.import_chirps([make_tweet(i) for i in range(25)])
+        assert model.get_stats() == {"chirps": 25, "users": 5, "posters": 5}
+
+    def test_writes_are_counted(self, make_model, options):
+        """Test that new users and posts are counted, and an existing username is not"""
+        model = make_model(**options)
+        user_ids = [model.add_user(f"poster{i}", f"Poster {i}") for i in range(3)]
+        with pytest.raises(ValueError):
+            model.add_user("poster0", "Poster 0")
+        assert model.get_stats() == {"chirps": 0, "users": 3, "posters": 0}
+
+        model.post_chirp(user_ids[0], "Hello")
+        model.post_chirp(user_ids[0], "Hello again")
+        model.post_chirp(user_ids[1], "Hello")
+        assert model.get_stats() == {"chirps": 3, "users": 3, "posters": 2}
+
+    @pytest.mark.parametrize("layout", [{}, {"user_buckets": 3}], ids=["hashes", "buckets"])
+    def test_concurrent_imports_count_a_user_once(self, make_model, make_tweet, options, layout):
+        """Test that two writers finding the same new user missing only count it once"""
+        first = make_model(**options, **layout)
+        second = make_model(**options, **layout)
+        pipelines = second.partitioner.pipelines
+
+        def checked_then_raced():
+            # The first writer imports the user right after the second one checked it is missing
+            pipes = pipelines()
+            execute = pipes.execute
+
+            def execute_then_race():
+                execute()
+                pipes.execute = execute
+                first.import_chirps([make_tweet(0)])
+            pipes.execute = execute_then_race
+            second.partitioner.pipelines = pipelines
+            return pipes
+
+        second.partitioner.pipelines = checked_then_raced
+        second.import_chirps([make_tweet(5)])
+        assert second.get_stats() == {"chirps": 2, "users": 1, "posters": 1}
+
+    def test_reads_cost_no_scan(self, make_model, make_tweet, client, mocker):
+        """Test that the counters are read without walking the keyspace"""
+        model = make_model()
+        model.import_chirps([make_tweet(i) for i in range(10)])
+
+        keys = mocker.spy(client, "keys")
+        scan = mocker.spy(client, "scan")
+        model.get_stats()
+        assert keys.call_count == scan.call_count == 0
+
+    def test_deletes_are_counted(self, make_model, make_tweet, make_client, client):
+        """Test that dropped buckets and swept orphans decrement the counters"""
+        model = make_model(make_client(), timeline_buckets="hour", timeline_retention=3600)
+        model.import_chirps([make_tweet(i, BASE_MS + i * HOUR_MS) for i in range(4)])
+        assert model.get_stats()["chirps"] == 1
+
+        model = make_model()
+        model.import_chirps([make_tweet(i) for i in range(20)])
+        client.zrem(TIMELINE, *(str(5000 + i) for i in range(0, 20, 5)))  # All chirps of user0
+        sweep_orphans(model, users=True)
+        assert model.get_stats() == {"chirps": 16, "users": 4, "posters": 5}
+
+    def test_rebuild_stats(self, make_model, make_tweet, client, options):
+        """Test recounting the counters of a database created before they existed"""
+        model = make_model(**options)
+        model.import_chirps([make_tweet(i) for i in range(20)])
+        model.add_user("lurker", "Lurker")
+        expected = model.get_stats()
+
+        for key in client.keys(f"{STATS}*") + client.keys(f"{POSTERS}*"):
+            client.delete(key)
+        assert model.get_stats() == {"chirps": 0, "users": 0, "posters": 0}
+
+        assert model.rebuild_stats(batch_size=6) == {"chirps": 20, "users": 6}
+        assert model.get_stats() == expected == {"chirps": 20, "users": 6, "posters": 5}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the garbage collection of orphaned chirp and user hashes
+"""
+
+import sys
+import os
+import time
+import pytest
+from unittest.mock import patch
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.lua_scripts import DELETE_ORPHAN_CHIRP
+from src.models.schema import TIMELINE, TOP_FOLLOWERS, TOP_LIKED, USERNAMES
+from src.models.sweeper import RateLimiter, sweep_orphans
+
+class TestSweeper:
+    """Test class for sweep_orphans"""
+
+    @pytest.fixture
+    def model(self, make_model, make_tweet):
+        """Create a model over the fake Redis, with 20 chirps of 5 users"""
+        model = make_model()
+        model.import_chirps([make_tweet(i) for i in range(20)])
+        return model
+
+    def test_trimmed_chirps_are_deleted(self, model, client):
+        """Test that chirps trimmed out of the timeline are deleted with their ranking entries"""
+        trimmed = client.zrange(TIMELINE, 0, 7)
+        client.zrem(TIMELINE, *trimmed)
+
+        report = sweep_orphans(model, batch_size=6, dry_run=True)
+        assert (report["scanned_chirps"], report["chirps"]) == (20, 8)
+        assert len(client.keys("chirp:*")) == 20
+
+        # A single SCAN page, fake Redis cursors skip keys when earlier ones are deleted
+        report = sweep_orphans(model)
+        assert report["chirps"] == 8
+        assert report["bytes"] is None  # No MEMORY USAGE on fake Redis
+        assert not any(client.exists(f"chirp:{chirp_id}") for chirp_id in trimmed)
+        assert not set(trimmed) & set(client.zrange(TOP_LIKED, 0, -1))
+        assert len(model.get_latest_chirps(20)) == 12
+
+        # Users are only swept when asked
+        assert report["scanned_users"] == 0
+        assert sweep_orphans(model)["chirps"] == 0
+
+    def test_users_without_chirps_are_deleted(self, model, client):
+        """Test that users none of whose chirps remain are deleted with their username"""
+        client.zrem(TIMELINE, *(str(5000 + i) for i in range(0, 20, 5)))  # All chirps of user0
+
+        with patch('src.models.sweeper._memory_usage', side_effect=lambda _, keys: [100] * len(keys)):
+            report = sweep_orphans(model, users=True)
+        assert (report["chirps"], report["scanned_users"], report["users"]) == (4, 5, 1)
+        assert report["bytes"] == 500
+        assert not client.exists("users:100")
+        assert not client.hexists(USERNAMES, "user0")
+        assert "100" not in client.zrange(TOP_FOLLOWERS, 0, -1)
+        assert model.get_user_id("user1") == "101"
+
+    def test_users_posting_or_signing_up_during_the_sweep_are_kept(self, model, client):
+        """Test that the user delete script checks the chirp count and the signup date again"""
+        client.zrem(TIMELINE, *(str(5000 + i) for i in range(0, 20, 5)))  # All chirps of user0
+        early = model.add_user("early", "Early")
+        client.hset(f"users:{early}", "created_at", 1712000000)
+        late = model.add_user("late", "Late")
+        client.hset(f"users:{late}", "created_at", int(time.time()) + 60)  # Signed up once the sweep started
+
+        def post_meanwhile(partitioner, keys):
+            # user0 posts between the check and the delete
+            if any(key == "users:100" for _, key in keys):
+                model.post_chirp("100", "Still here")
+            return [None] * len(keys)
+
+        with patch('src.models.sweeper._memory_usage', side_effect=post_meanwhile):
+            report = sweep_orphans(model, users=True)
+        assert report["users"] == 1
+        assert not client.exists(f"users:{early}")
+        assert model.get_user_id("early") is None
+        assert client.exists("users:100", f"users:{late}") == 2
+        assert model.get_user_id("user0") == "100"
+
+    def test_chirps_back_in_the_timeline_are_kept(self, model, client):
+        """Test that the delete script checks the timeline again"""
+        delete_chirp = client.register_script(DELETE_ORPHAN_CHIRP)
+        keys = ["chirp:5000", TIMELINE, TOP_LIKED, "chirps:top_rechirped", "stats"]
+
+        assert delete_chirp(keys=keys, args=["5000"]) == 0
+        assert client.exists("chirp:5000")
+        client.zrem(TIMELINE, "5000")
+        assert delete_chirp(keys=keys, args=["5000"]) == 1
+        assert not client.exists("chirp:5000")
+
+    def test_rate_limit(self, mocker):
+        """Test that the limiter sleeps when keys come in faster than the rate"""
+        clock = mocker.patch("src.models.sweeper.time.monotonic", return_value=10.0)
+        sleep = mocker.patch("src.models.sweeper.time.sleep")
+        limiter = RateLimiter(rate=100)
+
+        limiter.wait(50)
+        sleep.assert_called_once_with(pytest.approx(0.5))
+        clock.return_value = 12.0
+        limiter.wait(50)
+        assert sleep.call_count == 1
+
+        RateLimiter().wait(10 ** 6)
+        assert sleep.call_count == 1
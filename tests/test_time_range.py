@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the epoch created_at fields and the time-range reads of the timeline
+"""
+
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.schema import created_at_epoch
+
+# 2024-04-01 00:00:00 UTC, the start of a day
+BASE = 1711929600
+HOUR = 3600
+
+class TestTimeRange:
+    """Test class for the epoch dates, ChirpRedisModel.get_chirps_between and chirps_per_interval"""
+
+    @pytest.fixture(params=[{}, {"cluster": True, "partitions": 4}, {"timeline_buckets": "hour"}],
+                    ids=["single", "cluster", "buckets"])
+    def model(self, request, make_model, make_tweet):
+        """Model with 24 chirps, three per hour from 00:00 to 08:00, in each timeline layout"""
+        model = make_model(**request.param)
+        model.import_chirps([make_tweet(i, (BASE + i * 20 * 60) * 1000) for i in range(24)])
+        return model
+
+    def test_dates_are_epochs(self, make_model, make_tweet, client):
+        """Test that imported and posted chirps and users hold epoch seconds"""
+        model = make_model()
+        model.import_chirps([make_tweet(0, BASE * 1000)])
+        assert client.hget("chirp:5000", "created_at") == str(BASE)
+        assert client.hget("users:100", "created_at") == "1711972800"
+        assert model.get_chirps(["5000"])[0]["created_at"] == BASE
+
+        user_id = model.add_user("poster", "Poster")
+        chirp_id = model.post_chirp(user_id, "Hello")
+        chirp = model.get_chirps([chirp_id])[0]
+        assert isinstance(chirp["created_at"], int)
+        assert abs(chirp["created_at"] - model.get_users([user_id])[0]["created_at"]) <= 1
+
+    def test_twitter_dates_are_converted(self, make_model, make_tweet, client):
+        """Test that hashes written with Twitter dates are read as epochs, and migrated"""
+        model = make_model()
+        model.import_chirps([make_tweet(0, BASE * 1000)])
+        client.hset("chirp:5000", "created_at", "Mon Apr 01 00:00:00 +0000 2024")
+        client.hset("users:100", "created_at", "Mon Apr 01 12:00:00 +0000 2024")
+        assert model.get_chirps(["5000"])[0]["created_at"] == BASE
+
+        assert model.convert_dates(batch_size=1) == 2
+        assert model.convert_dates() == 0
+        assert client.hget("chirp:5000", "created_at") == str(BASE)
+        assert client.hget("users:100", "created_at") == "1711972800"
+
+        assert created_at_epoch("1711972800") == 1711972800
+        with pytest.raises(ValueError):
+            created_at_epoch("yesterday")
+
+    def test_chirps_between(self, model):
+        """Test reading a time range, newest first, with both ends included"""
+        chirps = model.get_chirps_between(BASE + HOUR, BASE + 2 * HOUR)
+        assert [chirp["chirp_id"] for chirp in chirps] == ["5006", "5005", "5004", "5003"]
+
+        chirps = model.get_chirps_between(BASE + HOUR, BASE + 5 * HOUR, limit=2)
+        assert [chirp["chirp_id"] for chirp in chirps] == ["5015", "5014"]
+        assert model.get_chirps_between(BASE - HOUR, BASE - 1) == []
+
+    def test_chirps_per_interval(self, model, mocker):
+        """Test the volume histogram, computed without reading any chirp hash"""
+        hydrate = mocker.spy(model, "_hydrate")
+        counts = model.chirps_per_interval(BASE, BASE + 10 * HOUR, interval=2 * HOUR)
+        assert counts.tolist() == [6, 6, 6, 6, 0]
+        assert str(counts.index[1]) == "2024-04-01 02:00:00+00:00"
+        assert hydrate.call_count == 0
+
+        # The end is excluded, and a partial last interval is kept
+        assert model.chirps_per_interval(BASE + HOUR, BASE + 2 * HOUR + 1).tolist() == [3, 1]
+        with pytest.raises(ValueError):
+            model.chirps_per_interval(BASE, BASE + HOUR, interval=0)
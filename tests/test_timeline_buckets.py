@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the time-bucketed timeline and its retention window
+"""
+
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.schema import TIMELINE, TIMELINE_BUCKETS, TOP_LIKED, timeline_bucket
+
+# 2024-04-01 00:00:00 UTC, the start of an hour and of a day
+BASE_MS = 1711929600000
+HOUR_MS = 3600 * 1000
+
+class TestTimelineBuckets:
+    """Test class for the bucketed timeline of ChirpRedisModel"""
+
+    @pytest.fixture
+    def tweets(self, make_tweet):
+        """Tweets over six hours, three per second so that pages end in the middle of ties"""
+        return [make_tweet(i, BASE_MS + (i // 3) * 1000 + (i // 6) * HOUR_MS, i % 4) for i in range(36)]
+
+    def test_reads_match_single_timeline(self, make_model, make_client, client, tweets):
+        """Test that reads merged across buckets return what a single timeline returns"""
+        bucketed = make_model(timeline_buckets="hour")
+        single = make_model(make_client())
+        for model in (bucketed, single):
+            model.import_chirps(tweets, chunk_size=5)
+
+        assert client.zcard(TIMELINE_BUCKETS) == 6
+        assert not client.exists(TIMELINE)
+        for count in (1, 5, 36, 50):
+            assert bucketed.get_latest_chirps(count) == single.get_latest_chirps(count)
+        for chunk_size in (1, 4, 7):
+            assert [c["chirp_id"] for c in bucketed.iter_timeline(chunk_size=chunk_size)] == \
+                [c["chirp_id"] for c in single.iter_timeline(chunk_size=chunk_size)]
+
+    def test_posts_are_indexed_in_their_bucket(self, make_model, make_client):
+        """Test that posted chirps land in the bucket of their timestamp, in every keyspace layout"""
+        for options in ({}, {"cluster": True, "partitions": 4}):
+            client = make_client()
+            model = make_model(client, timeline_buckets="day", **options)
+            user_ids = [model.add_user(f"poster{i}", f"Poster {i}") for i in range(4)]
+            chirp_ids = [model.post_chirp(user_id, "Hello buckets") for user_id in user_ids]
+
+            assert [c["chirp_id"] for c in model.get_latest_chirps(4)] == chirp_ids[::-1]
+            buckets = [key for key in client.keys(f"{TIMELINE}:*") if TIMELINE_BUCKETS not in key]
+            assert sum(client.zcard(key) for key in buckets) == 4
+
+    def test_retention_drops_whole_buckets(self, make_model, client, tweets):
+        """Test that buckets beyond the window are dropped with their chirps and ranking entries"""
+        model = make_model(timeline_buckets="hour", timeline_retention=2 * 3600)
+        model.import_chirps(tweets[:12])  # Hours 0 and 1
+        assert client.zcard(TIMELINE_BUCKETS) == 2
+
+        model.import_chirps(tweets[12:])  # Hours 2 to 5, only 4 and 5 are kept
+        assert sorted(map(int, client.zrange(TIMELINE_BUCKETS, 0, -1))) == \
+            [BASE_MS // 1000 + 4 * 3600, BASE_MS // 1000 + 5 * 3600]
+        kept = {str(5000 + i) for i in range(24, 36)}
+        assert {c["chirp_id"] for c in model.iter_timeline()} == kept
+        assert set(client.zrange(TOP_LIKED, 0, -1)) == kept
+        assert len(client.keys("chirp:*")) == len(kept)
+        assert not client.exists(timeline_bucket(BASE_MS // 1000))
+
+    def test_posting_into_an_old_archive_keeps_it(self, make_model, client, tweets):
+        """Test that without a retention window, a new post does not drop the imported buckets"""
+        model = make_model(timeline_buckets="hour")
+        model.import_chirps(tweets)
+        user_id = model.add_user("poster", "Poster")
+        chirp_id = model.post_chirp(user_id, "Hello archive")
+
+        assert client.zcard(TIMELINE_BUCKETS) == 7
+        assert len(client.keys("chirp:*")) == len(tweets) + 1
+        assert model.get_latest_chirps(1)[0]["chirp_id"] == chirp_id
+        assert model.expire_timeline() == 0
+
+    def test_split_timeline(self, make_model, client, tweets):
+        """Test migrating a single timeline into buckets"""
+        single = make_model()
+        single.import_chirps(tweets)
+        expected = [c["chirp_id"] for c in single.iter_timeline()]
+
+        bucketed = make_model(timeline_buckets="hour")
+        assert bucketed.split_timeline(batch_size=7) == len(tweets)
+        assert not client.exists(TIMELINE)
+        assert [c["chirp_id"] for c in bucketed.iter_timeline(chunk_size=5)] == expected
+
+        with pytest.raises(ValueError):
+            single.expire_timeline()
+
+    def test_invalid_buckets(self, make_model):
+        """Test that unknown bucket sizes and windows shorter than a bucket are refused"""
+        with pytest.raises(ValueError):
+            make_model(timeline_buckets="week")
+        with pytest.raises(ValueError):
+            make_model(timeline_buckets="day", timeline_retention=3600)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the users packed into user buckets
+"""
+
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.schema import TOP_POSTERS, user_bucket
+
+class TestUserBuckets:
+    """Test class for ChirpRedisModel with user buckets"""
+
+    @pytest.fixture
+    def make_tweet(self, make_tweet):
+        """Build tweets of one of ten users"""
+        return lambda i: make_tweet(i, users=10)
+
+    @pytest.fixture(params=[{}, {"cluster": True, "partitions": 4}], ids=["single", "cluster"])
+    def options(self, request):
+        """Keyspace layouts the buckets are checked in"""
+        return request.param
+
+    def test_reads_match_user_hashes(self, make_model, make_client, make_tweet, client, options):
+        """Test that bucketed users read back as user hashes do, with no hash per user"""
+        expected = make_model(make_client())
+        expected.import_chirps([make_tweet(i) for i in range(30)])
+
+        model = make_model(user_buckets=3, **options)
+        model.import_chirps([make_tweet(i) for i in range(30)])
+        assert model.get_top_users_by_followers(10) == expected.get_top_users_by_followers(10)
+        assert model.get_top_posters(10) == expected.get_top_posters(10)
+        assert model.get_users(["105", "999"]) == expected.get_users(["105"])
+        assert model.get_user_id("user5") == "105"
+        assert not client.keys("users:1*")
+        assert model.get_stats() == {"chirps": 30, "users": 10, "posters": 10}
+
+    def test_reimport_updates_counters(self, make_model, make_tweet):
+        """Test that importing a user again only updates its counters"""
+        model = make_model(user_buckets=3)
+        model.import_chirps([make_tweet(1)])
+        tweet = make_tweet(11)
+        tweet["user"]["name"] = "Renamed"
+        model.import_chirps([tweet])
+
+        user = model.get_users(["101"])[0]
+        assert (user["name"], user["chirp_count"], user["follower_count"]) == ("User 1", 11, 10)
+        assert model.get_stats()["users"] == 1
+
+    def test_writes(self, make_model, options):
+        """Test signing up and posting, with the packed chirp count updated by the script"""
+        model = make_model(user_buckets=3, **options)
+        image = "https://pbs.twimg.com/profile_images/9/me.jpg"
+        user_id = model.add_user("poster", "Poster | \x1f odd name", image)
+        with pytest.raises(ValueError):
+            model.add_user("poster", "Poster")
+        model.post_chirp(user_id, "Hello")
+        chirp_id = model.post_chirp(user_id, "Hello again")
+
+        user = model.get_users([user_id])[0]
+        assert (user["username"], user["name"], user["chirp_count"]) == ("poster", "Poster | \x1f odd name", 2)
+        assert user["profile_image"] == image
+        assert model.get_chirps([chirp_id])[0]["username"] == "poster"
+        assert model.get_top_posters(1)[0]["user_id"] == user_id
+        assert model.get_stats() == {"chirps": 2, "users": 1, "posters": 1}
+        with pytest.raises(ValueError):
+            model.post_chirp("42", "Nobody")
+
+    def test_bucket_layout(self, make_model, make_tweet, client):
+        """Test that users are spread over the buckets, as short packed values"""
+        model = make_model(user_buckets=3)
+        model.import_chirps([make_tweet(i) for i in range(30)])
+
+        buckets = sorted(client.keys("ubucket:*"))
+        assert buckets == sorted({user_bucket(100 + i, 3) for i in range(10)})
+        assert sum(client.hlen(bucket) for bucket in buckets) == 10
+        assert client.zscore(TOP_POSTERS, "109") == 29
+        # Under the hash-max-listpack-value advised in the README (no OBJECT ENCODING on fake Redis)
+        assert all(len(value) <= 128 for bucket in buckets for value in client.hvals(bucket))
+
+    def test_rebuild_stats(self, make_model, make_tweet, client):
+        """Test recounting the users of the buckets"""
+        model = make_model(user_buckets=3)
+        model.import_chirps([make_tweet(i) for i in range(30)])
+        model.add_user("lurker", "Lurker")
+        client.delete("stats")
+        assert model.rebuild_stats() == {"chirps": 30, "users": 11}
+
+        with pytest.raises(ValueError):
+            make_model(user_buckets=0)